@@ -8,12 +8,17 @@
 ################################################################
 ################################################################
 
+from array import array
+
 BCn_formats = [
     0x31, 0x431, 0x32, 0x432,
     0x33, 0x433, 0x34, 0x234,
     0x35, 0x235,
 ]
 
+# Array typecodes of the units the data is moved as, by size in bytes
+UnitTypecodes = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
 
 def getDefaultGX2TileMode(dim, width, height, depth, format_, aa, use):
     """
@@ -58,6 +63,75 @@ def GX2TileModeToAddrTileMode(tileMode):
     return tileMode
 
 
+# Address tables of the last few surface layouts, see getAddressTable()
+AddressTables = {}
+MaxAddressTables = 8
+
+
+def getAddressTable(width, height, depth, aa, use, tileMode, pipeSwizzle, bankSwizzle,
+                    pitch, bitsPerPixel, slice, sample, dataSize):
+
+    """
+    Returns (unit, linear, swizzled) for a surface layout, where `unit` is the
+    size in bytes of the array items the data is moved as, `linear[i]` is the
+    swizzled unit the i-th linear unit comes from, and `swizzled[i]` is the
+    linear unit the i-th swizzled unit comes from.
+    Units outside of the data point to the unit right after its end.
+    The address of every element is only computed once per layout.
+    """
+    key = (width, height, depth, aa, use & 4, tileMode, pipeSwizzle, bankSwizzle,
+           pitch, bitsPerPixel, slice, sample, dataSize)
+
+    tables = AddressTables.get(key)
+    if tables is not None:
+        return tables
+
+    bytesPerPixel = bitsPerPixel // 8
+
+    addrs = []
+    align = bytesPerPixel | dataSize
+    for y in range(height):
+        for x in range(width):
+            if tileMode in [0, 1]:
+                pos = computeSurfaceAddrFromCoordLinear(x, y, slice, sample, bytesPerPixel, pitch, height, depth)
+
+            elif tileMode in [2, 3]:
+                pos = computeSurfaceAddrFromCoordMicroTiled(x, y, slice, bitsPerPixel, pitch, height, tileMode, bool(use & 4))
+
+            else:
+                pos = computeSurfaceAddrFromCoordMacroTiled(x, y, slice, sample, bitsPerPixel, pitch, height, 1 << aa,
+                                                            tileMode, bool(use & 4), pipeSwizzle, bankSwizzle)
+
+            addrs.append(pos)
+            align |= pos
+
+    # Move the data in the largest units every address is aligned to
+    unit = 8
+    while align % unit:
+        unit >>= 1
+
+    units = bytesPerPixel // unit
+    end = dataSize // unit
+
+    linear = array('I', [end]) * end
+    swizzled = array('I', [end]) * end
+
+    for i, pos in enumerate(addrs):
+        pos_ = i * bytesPerPixel
+        if pos_ + bytesPerPixel <= dataSize and pos + bytesPerPixel <= dataSize:
+            pos //= unit
+            pos_ //= unit
+            for n in range(units):
+                linear[pos_ + n] = pos + n
+                swizzled[pos + n] = pos_ + n
+
+    if len(AddressTables) >= MaxAddressTables:
+        del AddressTables[next(iter(AddressTables))]
+
+    tables = AddressTables[key] = (unit, linear, swizzled)
+    return tables
+
+
 def swizzleSurf(width, height, depth, format_, aa, use, tileMode, swizzle_,
                 pitch, bitsPerPixel, slice, sample, data, dataSize, swizzle):
 
@@ -76,9 +150,6 @@ def swizzleSurf(width, height, depth, format_, aa, use, tileMode, swizzle_,
     swizzle: boolen where the data will be swizzled if true, otherwise unswizzled
     """
 
-    bytesPerPixel = bitsPerPixel // 8
-    result = bytearray(len(data))
-
     if format_ in BCn_formats:
         width = (width + 3) // 4
         height = (height + 3) // 4
@@ -88,28 +159,17 @@ def swizzleSurf(width, height, depth, format_, aa, use, tileMode, swizzle_,
 
     tileMode = GX2TileModeToAddrTileMode(tileMode)
 
-    for y in range(height):
-        for x in range(width):
-            if tileMode in [0, 1]:
-                pos = computeSurfaceAddrFromCoordLinear(x, y, slice, sample, bytesPerPixel, pitch, height, depth)
-
-            elif tileMode in [2, 3]:
-                pos = computeSurfaceAddrFromCoordMicroTiled(x, y, slice, bitsPerPixel, pitch, height, tileMode, bool(use & 4))
-
-            else:
-                pos = computeSurfaceAddrFromCoordMacroTiled(x, y, slice, sample, bitsPerPixel, pitch, height, 1 << aa,
-                                                            tileMode, bool(use & 4), pipeSwizzle, bankSwizzle)
-
-            pos_ = (y * width + x) * bytesPerPixel
-
-            if pos_ + bytesPerPixel <= len(data) and pos + bytesPerPixel <= len(data):
-                if swizzle == 0:
-                    result[pos_:pos_ + bytesPerPixel] = data[pos:pos + bytesPerPixel]
+    unit, linear, swizzled = getAddressTable(width, height, depth, aa, use, tileMode, pipeSwizzle, bankSwizzle,
+                                             pitch, bitsPerPixel, slice, sample, dataSize)
 
-                else:
-                    result[pos:pos + bytesPerPixel] = data[pos_:pos_ + bytesPerPixel]
+    # Gather every unit of the result at once, the units outside
+    # of the data come from a zeroed unit appended to it
+    source = array(UnitTypecodes[unit])
+    source.frombytes(bytes(data[:len(linear) * unit]))
+    source.append(0)
 
-    return bytes(result)
+    result = array(UnitTypecodes[unit], map(source.__getitem__, swizzled if swizzle else linear))
+    return result.tobytes() + bytes(dataSize - len(result) * unit)
 
 
 def deswizzle(width, height, depth, format_, aa, use, tileMode, swizzle_,
@@ -9,6 +9,8 @@
 ################################################################
 
 from cpython cimport array
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize
+from libc.string cimport memcpy, memset
 
 
 ctypedef unsigned char u8
@@ -68,6 +70,52 @@ cdef u32 GX2TileModeToAddrTileMode(u32 tileMode):
     return tileMode
 
 
+# Address tables of the last few surface layouts, see getAddressTable()
+cdef dict AddressTables = {}
+cdef u32 MaxAddressTables = 8
+
+
+cdef array.array getAddressTable(u32 width, u32 height, u32 depth, u32 aa, u32 use, u32 tileMode, u32 pipeSwizzle,
+                                 u32 bankSwizzle, u32 pitch, u32 bitsPerPixel, u32 slice, u32 sample):
+
+    """
+    Returns the swizzled address of every element of a surface layout, in linear order.
+    The address of every element is only computed once per layout.
+    """
+
+    key = (width, height, depth, aa, use & 4, tileMode, pipeSwizzle, bankSwizzle, pitch, bitsPerPixel, slice, sample)
+
+    cdef array.array table = AddressTables.get(key)
+    if table is not None:
+        return table
+
+    cdef:
+        u32 bytesPerPixel = bitsPerPixel // 8
+        u32 y, x
+        u32 *addrs
+
+    table = array.clone(array.array('I'), width * height, False)
+    addrs = table.data.as_uints
+
+    for y in range(height):
+        for x in range(width):
+            if tileMode in [0, 1]:
+                addrs[y * width + x] = <u32>computeSurfaceAddrFromCoordLinear(x, y, slice, sample, bytesPerPixel, pitch, height, depth)
+
+            elif tileMode in [2, 3]:
+                addrs[y * width + x] = <u32>computeSurfaceAddrFromCoordMicroTiled(x, y, slice, bitsPerPixel, pitch, height, tileMode, use & 4)
+
+            else:
+                addrs[y * width + x] = <u32>computeSurfaceAddrFromCoordMacroTiled(x, y, slice, sample, bitsPerPixel, pitch, height, 1 << aa,
+                                                                                  tileMode, use & 4, pipeSwizzle, bankSwizzle)
+
+    if len(AddressTables) >= MaxAddressTables:
+        del AddressTables[next(iter(AddressTables))]
+
+    AddressTables[key] = table
+    return table
+
+
 cdef bytes swizzleSurf(u32 width, u32 height, u32 depth, u32 format_, u32 aa, u32 use, u32 tileMode, u32 swizzle_,
                        u32 pitch, u32 bitsPerPixel, u32 slice, u32 sample, u8 *data, u32 dataSize, int swizzle):
 
@@ -88,9 +136,12 @@ cdef bytes swizzleSurf(u32 width, u32 height, u32 depth, u32 format_, u32 aa, u3
 
     cdef:
         u32 bytesPerPixel = bitsPerPixel // 8
-        bytearray result = bytearray(dataSize)
+        bytes result = PyBytes_FromStringAndSize(NULL, dataSize)
+        u8 *output = <u8 *>PyBytes_AS_STRING(result)
 
-        u32 pipeSwizzle, bankSwizzle, y, x, pos, pos_, n
+        u32 pipeSwizzle, bankSwizzle, i, pos, pos_, count
+        array.array table
+        u32 *addrs
 
     if format_ in BCn_formats:
         width = (width + 3) // 4
@@ -101,48 +152,47 @@ cdef bytes swizzleSurf(u32 width, u32 height, u32 depth, u32 format_, u32 aa, u3
 
     tileMode = GX2TileModeToAddrTileMode(tileMode)
 
-    for y in range(height):
-        for x in range(width):
-            if tileMode in [0, 1]:
-                pos = <u32>computeSurfaceAddrFromCoordLinear(x, y, slice, sample, bytesPerPixel, pitch, height, depth)
+    table = getAddressTable(width, height, depth, aa, use, tileMode, pipeSwizzle, bankSwizzle,
+                            pitch, bitsPerPixel, slice, sample)
+    addrs = table.data.as_uints
+    count = width * height
 
-            elif tileMode in [2, 3]:
-                pos = <u32>computeSurfaceAddrFromCoordMicroTiled(x, y, slice, bitsPerPixel, pitch, height, tileMode, use & 4)
+    # Move the elements in bulk, following the address table
+    with nogil:
+        memset(output, 0, dataSize)
 
-            else:
-                pos = <u32>computeSurfaceAddrFromCoordMacroTiled(x, y, slice, sample, bitsPerPixel, pitch, height, 1 << aa,
-                                                                 tileMode, use & 4, pipeSwizzle, bankSwizzle)
-
-            pos_ = (y * width + x) * bytesPerPixel
+        for i in range(count):
+            pos = addrs[i]
+            pos_ = i * bytesPerPixel
 
             if pos_ + bytesPerPixel <= dataSize and pos + bytesPerPixel <= dataSize:
                 if swizzle == 0:
-                    for n in range(bytesPerPixel):
-                        result[pos_ + n] = <u8>data[pos + n]
+                    memcpy(output + pos_, data + pos, bytesPerPixel)
 
                 else:
-                    for n in range(bytesPerPixel):
-                        result[pos + n] = <u8>data[pos_ + n]
+                    memcpy(output + pos, data + pos_, bytesPerPixel)
 
-    return bytes(result)
+    return result
 
 
 cpdef bytes deswizzle(u32 width, u32 height, u32 depth, u32 format_, u32 aa, u32 use, u32 tileMode, u32 swizzle_,
-                      u32 pitch, u32 bpp, u32 slice, u32 sample, bytes data):
+                      u32 pitch, u32 bpp, u32 slice, u32 sample, const u8[::1] data):
 
-    cdef array.array dataArr = array.array('B', data)
+    if not len(data):
+        return b''
 
     return swizzleSurf(width, height, depth, format_, aa, use, tileMode, swizzle_, pitch, bpp,
-                       slice, sample, dataArr.data.as_uchars, len(data), 0)
+                       slice, sample, <u8 *>&data[0], len(data), 0)
 
 
 cpdef bytes swizzle(u32 width, u32 height, u32 depth, u32 format_, u32 aa, u32 use, u32 tileMode, u32 swizzle_,
-                    u32 pitch, u32 bpp, u32 slice, u32 sample, bytes data):
+                    u32 pitch, u32 bpp, u32 slice, u32 sample, const u8[::1] data):
 
-    cdef array.array dataArr = array.array('B', data)
+    if not len(data):
+        return b''
 
     return swizzleSurf(width, height, depth, format_, aa, use, tileMode, swizzle_, pitch, bpp,
-                       slice, sample, dataArr.data.as_uchars, len(data), 1)
+                       slice, sample, <u8 *>&data[0], len(data), 1)
 
 
 cdef u8 formatHwInfo[0x100]
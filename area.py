@@ -32,15 +32,18 @@ import struct
 
 from bytes import bytes_to_string, to_bytes
 import globals
+import loadprofile
 
 from items import ObjectItem, ZoneItem, LocationItem
 from items import SpriteItem, EntranceItem, PathItem
 from items import NabbitPathItem, CommentItem
 
-from loading import LoadTileset
+from loading import LoadTilesets
 from misc import Metadata
+from objectstore import LayerStore
 import spritelib as SLib
 from structures import Structures, GetFormat as GetStructureFormat
+from tilemap import LayerTileMap
 
 #################################
 
@@ -51,7 +54,8 @@ FMT = GetStructureFormat
 
 class AbstractArea:
     """
-    Base abstract NSMBU area with only basic data loaded.
+    Base abstract NSMBU area that only keeps its raw files.
+    Nothing is parsed until it is asked for, and the files are saved back as they are.
     """
 
     def __init__(self):
@@ -66,10 +70,34 @@ class AbstractArea:
         self.L0 = L0
         self.L1 = L1
         self.L2 = L2
-        self.LoadBlocks(course)
-        self.LoadTilesetNames()
-        self.bgs = self.LoadBackgrounds()
-        self.LoadSprites()
+
+    def RawBlock(self, idx):
+        """
+        Returns a single block of the raw course file
+        """
+        offset, size = struct.unpack_from(FMT(SID.CourseBlock), self.course, idx * 8)
+        return self.course[offset:offset + size] if size else b''
+
+    def UsedTilesets(self):
+        """
+        Returns the names of the four tilesets of the area (block 1)
+        """
+        if self.course is None:
+            return ('', '', '', '')
+
+        return tuple(map(bytes_to_string, struct.unpack_from('32s32s32s32s', self.RawBlock(0))))
+
+    def UsedSpriteTypes(self):
+        """
+        Returns the set of sprite types placed in the area (block 8)
+        """
+        if self.course is None:
+            return set()
+
+        sprstruct = struct.Struct(FMT(SID.Sprite))
+        spritedata = self.RawBlock(7)
+
+        return {sprstruct.unpack_from(spritedata, offset)[0] for offset in range(0, len(spritedata) - 23, 24)}
 
     def LoadBlocks(self, course):
         """
@@ -211,6 +239,7 @@ class Area_NSMBU(AbstractArea):
         self.nPaths = []
         self.comments = []
         self.layers = [[], [], []]
+        self.tilemaps = [LayerTileMap(), LayerTileMap(), LayerTileMap()]
 
         # Metadata
         self.LoadMiyamotoInfo(None)
@@ -224,13 +253,16 @@ class Area_NSMBU(AbstractArea):
         """
 
         # Load in the course file and blocks
+        loadprofile.Begin('Parse blocks')
         self.LoadBlocks(course)
 
         # Load stuff from individual blocks
         self.LoadTilesetNames()  # block 1
         self.LoadOptions()  # block 2
         self.LoadEntrances()  # block 7
+        loadprofile.Begin('Sprites')
         self.LoadSprites()  # block 8
+        loadprofile.End()
         self.LoadZones()  # blocks 10, 3, and 5
         self.LoadLocations()  # block 11
         self.LoadPaths()  # block 14 and 15
@@ -247,31 +279,41 @@ class Area_NSMBU(AbstractArea):
 
         # Now, load the comments
         self.LoadComments()
+        loadprofile.End()
 
-        if self.tileset0 not in ('', None):
-            LoadTileset(0, self.tileset0)
-
-        if self.tileset1 not in ('', None):
-            LoadTileset(1, self.tileset1)
-
-        if self.tileset2 not in ('', None):
-            LoadTileset(2, self.tileset2)
-
-        if self.tileset3 not in ('', None):
-            LoadTileset(3, self.tileset3)
+        LoadTilesets([
+            (idx, name) for idx, name in enumerate((self.tileset0, self.tileset1, self.tileset2, self.tileset3))
+            if name not in ('', None)
+        ])
 
         # Load the object layers
         self.layers = [[], [], []]
+        for tilemap in self.tilemaps:
+            tilemap.invalidateAll()
 
+        loadprofile.Begin('Object layers')
         if L0 is not None:
             self.LoadLayer(0, L0)
         if L1 is not None:
             self.LoadLayer(1, L1)
         if L2 is not None:
             self.LoadLayer(2, L2)
+        loadprofile.End()
 
         return True
 
+    def UsedTilesets(self):
+        """
+        Returns the names of the four tilesets of the area
+        """
+        return (self.tileset0, self.tileset1, self.tileset2, self.tileset3)
+
+    def UsedSpriteTypes(self):
+        """
+        Returns the set of sprite types placed in the area
+        """
+        return {sprite.type for sprite in self.sprites}
+
     def save(self, isNewArea=False):
         """
         Save the area back to a file
@@ -340,6 +382,8 @@ class Area_NSMBU(AbstractArea):
             upd = layer[i]
             upd.setZValue(upd.zValue() - 1)
 
+        obj.UpdateTileMap()
+
     def SortSpritesByZone(self):
         """
         Sorts the sprite list by zone ID so it will work in-game
@@ -461,27 +505,14 @@ class Area_NSMBU(AbstractArea):
         """
         objcount = len(layerdata) // 16
         objstruct = struct.Struct(FMT(SID.LayerObject))
-        offset = 0
         z = (2 - idx) * 8192
 
-        layer = self.layers[idx]
-        append = layer.append
+        append = self.layers[idx].append
         unpack = objstruct.unpack_from
+        obj = ObjectItem
         for i in range(objcount):
-            data = unpack(layerdata, offset)
-            # Just for clarity, assigning these things to variables explaining what they are
-            tileset = (data[0] >> 12) & 3
-            type = data[0] & 255
-            layer = idx
-            x = data[1]
-            y = data[2]
-            width = data[3]
-            height = data[4]
-            z = z
-            objdata = data[5]
-            append(ObjectItem(tileset, type, layer, x, y, width, height, z, objdata))
-            z += 1
-            offset += 16
+            tiletype, x, y, width, height, objdata = unpack(layerdata, i * 16)
+            append(obj((tiletype >> 12) & 3, tiletype & 255, idx, x, y, width, height, z + i, objdata))
 
     def LoadPaths(self):
         """
@@ -643,23 +674,7 @@ class Area_NSMBU(AbstractArea):
 
         layer.sort(key=lambda obj: obj.zValue())
 
-        offset = 0
-        objstruct = struct.Struct(FMT(SID.LayerObject))
-        buffer = bytearray((len(layer) * 16) + 2)
-        f_int = int
-        for obj in layer:
-            objstruct.pack_into(buffer,
-                                offset,
-                                f_int((obj.tileset << 12) | obj.type),
-                                f_int(obj.objx),
-                                f_int(obj.objy),
-                                f_int(obj.width),
-                                f_int(obj.height),
-                                f_int(obj.data))
-            offset += 16
-        buffer[offset] = 0xFF
-        buffer[offset + 1] = 0xFF
-        return bytes(buffer)
+        return LayerStore.fromItems(idx, layer).toBytes()
 
     def SaveEntrances(self):
         """
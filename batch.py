@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# batch.py
+# Opens, validates, re-saves and recompresses levels without the GUI
+#
+# Usage: python3 batch.py [options] LEVEL_OR_FOLDER [...]
+# A JSON summary is printed on its own line for every level.
+
+
+################################################################
+################################################################
+
+# Stdlib imports
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import json
+import os
+import struct
+import sys
+import time
+
+# Import the "globals" module
+import globals
+
+# Check if Cython is available
+try:
+    import pyximport
+    pyximport.install()
+
+    import cython_available
+
+except:
+    pass
+
+else:
+    del cython_available
+    globals.cython_available = True
+
+# Local imports
+import area  # must come before gamedefs and level, to resolve their import cycle
+import SarcLib
+from gamedefs import MiyamotoGameDefinition
+from level import FindInnerLevel, Level_NSMBU
+from objectstore import LayerStore
+from strings import MiyamotoTranslation
+from structures import Structures, GetFormat as GetStructureFormat
+import yaz0
+
+#################################
+
+
+def InitBatch(gamedef=None, nsmbudx=False):
+    """
+    Sets up the globals needed to load and save levels without the GUI.
+    Called once in every worker process.
+    """
+    globals.trans = MiyamotoTranslation(None)
+    globals.gamedef = MiyamotoGameDefinition(gamedef)
+    globals.IsNSMBUDX = nsmbudx
+    globals.TilesetEdited = False
+    globals.OverrideTilesetSaving = False
+
+
+def FindLevels(paths):
+    """
+    Returns the level files given, searching folders recursively
+    """
+    extensions = globals.FileExtensions_NSMBUDX if globals.IsNSMBUDX else globals.FileExtentions
+    levels = []
+
+    for path in paths:
+        if not os.path.isdir(path):
+            levels.append(os.path.abspath(path))
+            continue
+
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(extensions):
+                    levels.append(os.path.abspath(os.path.join(root, name)))
+
+    return levels
+
+
+def ValidateArea(area, errors, warnings):
+    """
+    Checks the raw files of an area, and returns a summary of its contents
+    """
+    prefix = 'Area %d: ' % area.areanum
+    summary = {'area': area.areanum}
+
+    if area.course is None:
+        errors.append(prefix + 'missing course file')
+        return summary
+
+    # Block table
+    blockStruct = struct.Struct(GetStructureFormat(Structures.CourseBlock))
+    if len(area.course) < blockStruct.size * 15:
+        errors.append(prefix + 'course file is truncated')
+        return summary
+
+    for idx in range(15):
+        offset, size = blockStruct.unpack_from(area.course, idx * blockStruct.size)
+        if size and offset + size > len(area.course):
+            errors.append(prefix + 'block %d is out of range' % (idx + 1))
+            return summary
+
+    tilesets = area.UsedTilesets()
+    summary['tilesets'] = list(tilesets)
+
+    for slot, name in enumerate(tilesets):
+        if name and name not in globals.szsData:
+            if slot == 0 and name in globals.Pa0Tilesets:
+                warnings.append(prefix + 'tileset "%s" is not in the archive' % name)
+            else:
+                errors.append(prefix + 'tileset "%s" is not in the archive' % name)
+
+    # Object layers
+    objects = []
+    for layer, layerdata in enumerate((area.L0, area.L1, area.L2)):
+        if layerdata is None:
+            objects.append(0)
+            continue
+
+        try:
+            store = LayerStore.fromBytes(layer, layerdata)
+        except Exception as e:
+            errors.append(prefix + 'layer %d could not be parsed (%s)' % (layer, e))
+            objects.append(0)
+            continue
+
+        objects.append(len(store))
+
+        bounds = store.bounds()
+        if bounds is not None and (bounds[0] < 0 or bounds[1] < 0 or bounds[2] > 1024 or bounds[3] > 512):
+            warnings.append(prefix + 'layer %d has objects outside of the area' % layer)
+
+        for tileset in set(store.tileset):
+            if tileset > 3 or not tilesets[tileset]:
+                warnings.append(prefix + 'layer %d uses empty tileset slot %d' % (layer, tileset))
+
+    summary['objects'] = objects
+
+    # Sprites
+    try:
+        summary['sprite_types'] = sorted(area.UsedSpriteTypes())
+    except Exception as e:
+        errors.append(prefix + 'sprites could not be parsed (%s)' % e)
+
+    return summary
+
+
+def ProcessLevel(path, output=None, validateOnly=False, compLevel=1):
+    """
+    Loads, validates and optionally re-saves a level.
+    Returns a JSON-compatible summary.
+    """
+    summary = {'file': path, 'ok': False, 'errors': [], 'warnings': []}
+    errors = summary['errors']
+    warnings = summary['warnings']
+    start = time.perf_counter()
+
+    # Anything the level code prints goes to the summary
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            with open(path, 'rb') as fileobj:
+                data = fileobj.read()
+
+            summary['input_size'] = len(data)
+
+            # Decompress, if needed (Yaz0)
+            if data.startswith(b'Yaz0'):
+                summary['compressed'] = True
+                data = yaz0.decompressBuffer(data)
+
+            elif data.startswith(b'SARC'):
+                summary['compressed'] = False
+
+            else:
+                errors.append('not a Yaz0 or SARC file')
+                return summary
+
+            arc = SarcLib.SARC_Archive()
+            arc.load(data)
+
+            levelData, levelname = FindInnerLevel(arc, data, path)
+            if not levelData:
+                errors.append("couldn't find the inner level file")
+                return summary
+
+            # Sort the szs data
+            globals.szsData = {}
+            for file in arc.contents:
+                if isinstance(file, SarcLib.File) and (not levelname or file.name != levelname):
+                    globals.szsData[file.name] = file.data
+
+            # Every area is kept raw, none of them is opened
+            level = Level_NSMBU(headless=True)
+            globals.Level = level
+            if not level.load(levelData, 0):
+                errors.append('the level has no course folder')
+                return summary
+
+            if not level.areas:
+                errors.append('the level has no areas')
+
+            summary['areas'] = [ValidateArea(area, errors, warnings) for area in level.areas]
+
+            if errors or validateOnly:
+                return summary
+
+            # Re-save, and recompress if the target is a .szs file
+            target = output or path
+            data = level.save()
+            if target.lower().endswith('.szs'):
+                data = yaz0.compressBuffer(data, compLevel)
+
+            with open(target, 'wb') as fileobj:
+                fileobj.write(data)
+
+            summary['output'] = target
+            summary['output_size'] = len(data)
+
+    except Exception as e:
+        errors.append('%s: %s' % (type(e).__name__, e))
+
+    finally:
+        summary['ok'] = not errors
+        summary['log'] = log.getvalue().splitlines()
+        summary['seconds'] = round(time.perf_counter() - start, 3)
+
+    return summary
+
+
+def _ProcessLevel(args):
+    return ProcessLevel(*args)
+
+
+def main():
+    """
+    Command-line entry point
+    """
+    parser = argparse.ArgumentParser(description='Open, validate, re-save and recompress Miyamoto! levels without the GUI.')
+    parser.add_argument('paths', nargs='+', metavar='PATH', help='level files, or folders to search for levels')
+    parser.add_argument('-o', '--output', metavar='FOLDER', help='write the re-saved levels here instead of over the originals')
+    parser.add_argument('--validate', action='store_true', help='only load and validate, do not save anything')
+    parser.add_argument('-c', '--comp-level', type=int, default=1, choices=range(10), metavar='0-9', help='Yaz0 compression level (default: 1)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='number of worker processes')
+    parser.add_argument('--gamedef', help='name of the game definition (patch folder) to use')
+    parser.add_argument('--nsmbudx', action='store_true', help='the levels are from NSMBU Deluxe')
+    parser.add_argument('--summary', metavar='FILE', help='also write all the summaries to this file as a JSON list')
+    args = parser.parse_args()
+
+    # The game definitions are looked up relative to the Miyamoto folder
+    paths = [os.path.abspath(path) for path in args.paths]
+    output = os.path.abspath(args.output) if args.output else None
+    os.chdir(globals.miyamoto_path)
+
+    InitBatch(args.gamedef, args.nsmbudx)
+    levels = FindLevels(paths)
+
+    if output:
+        os.makedirs(output, exist_ok=True)
+
+    jobs = [(level, os.path.join(output, os.path.basename(level)) if output else None,
+             args.validate, args.comp_level) for level in levels]
+
+    if args.jobs > 1 and len(jobs) > 1:
+        executor = ProcessPoolExecutor(args.jobs, initializer=InitBatch, initargs=(args.gamedef, args.nsmbudx))
+        results = executor.map(_ProcessLevel, jobs)
+    else:
+        executor = None
+        results = map(_ProcessLevel, jobs)
+
+    summaries = []
+    try:
+        for summary in results:
+            print(json.dumps(summary), flush=True)
+            summaries.append(summary)
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as out:
+            json.dump(summaries, out, indent=2)
+
+    return 0 if all(summary['ok'] for summary in summaries) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,6 +8,9 @@
 ################################################################
 ################################################################
 
+from concurrent.futures import ThreadPoolExecutor
+import os
+
 try:
     import pyximport
     pyximport.install()
@@ -15,19 +18,32 @@ try:
     from . import compress_cy as compress_
     from . import decompress_cy as decompress_
 
+    accelerated = True
+
 except:
     from . import compress_
     from . import decompress_
 
+    accelerated = False
+
+
+# Compression quality presets
+QUALITY_FAST = 0
+QUALITY_NORMAL = 1
+QUALITY_HIGH = 2
+
+# Rows of pixels compressed by a single job (a multiple of the block height)
+BAND_HEIGHT = 64
+
 
 def decompress(data, width, height):
-    if not isinstance(data, bytes):
-        try:
-            data = bytes(data)
+    # Work on a view of the data, so neither the conversion nor the cropping copies it
+    try:
+        data = memoryview(data).cast('B')
 
-        except:
-            print("Couldn't decompress data")
-            return b''
+    except:
+        print("Couldn't decompress data")
+        return b''
 
     csize = ((width + 3) // 4) * ((height + 3) // 4) * 16
     if len(data) < csize:
@@ -38,7 +54,7 @@ def decompress(data, width, height):
     return decompress_.decompress(data, width, height)
 
 
-def compress(data, width, height):
+def compress(data, width, height, quality=QUALITY_NORMAL):
     if not isinstance(data, bytes):
         try:
             data = bytes(data)
@@ -53,4 +69,25 @@ def compress(data, width, height):
         return b''
 
     data = data[:csize]
-    return compress_.compress(data, width, height)
+    return compress_.compress(data, width, height, quality)
+
+
+def compressMipmaps(levels, quality=QUALITY_NORMAL, workers=None):
+    """
+    Compresses a list of (data, width, height) RGBA8 mipmap levels.
+    Every level is split into bands of block rows, which are compressed
+    across a thread pool. Returns the compressed data of every level.
+    """
+    jobs = []
+    with ThreadPoolExecutor(max_workers=workers or max(1, os.cpu_count() or 1)) as pool:
+        for data, width, height in levels:
+            data = bytes(data)
+            stride = width * 4
+
+            jobs.append([
+                pool.submit(compress, data[y * stride:(y + BAND_HEIGHT) * stride],
+                            width, min(BAND_HEIGHT, height - y), quality)
+                for y in range(0, height, BAND_HEIGHT)
+            ])
+
+        return [b''.join(band.result() for band in bands) for bands in jobs]
@@ -224,7 +224,8 @@ def FindColors(Colors):
     return Color0, Color1
 
 
-def compress(SrcPtr, Width, Height):
+def compress(SrcPtr, Width, Height, Quality=1):
+    # This compressor has no refinement step, so every quality preset gives the same result
     DstPtr = bytearray()
 
     for y in range(0, Height, 4):
@@ -14,6 +14,7 @@
 from cpython cimport array
 from cython cimport view
 from libc.stdlib cimport malloc, free
+from libc.string cimport memcpy
 
 
 ctypedef signed char s8
@@ -23,8 +24,14 @@ ctypedef unsigned short u16
 ctypedef unsigned int u32
 
 
+cdef enum:
+    QUALITY_FAST = 0
+    QUALITY_NORMAL = 1
+    QUALITY_HIGH = 2
+
+
 cdef void fancybasecolorsearch(u8 srccolors[4][4][4], u8 *bestcolor[2],
-                               int numxpixels, int numypixels):
+                               int numxpixels, int numypixels) noexcept nogil:
 
     # use same luminance-weighted distance metric to determine encoding as for finding the base colors */
 
@@ -239,8 +246,8 @@ cdef void fancybasecolorsearch(u8 srccolors[4][4][4], u8 *bestcolor[2],
             bestcolor[1][i] = testcolor[0][i]
 
 
-cdef void storedxtencodedblock(u8 *blkaddr, u8 srccolors[4][4][4], u8 *bestcolor[2],
-                               int numxpixels, int numypixels):
+cdef u32 storedxtencodedblock(u8 *blkaddr, u8 srccolors[4][4][4], u8 *bestcolor[2],
+                              int numxpixels, int numypixels) noexcept nogil:
 
     # use same luminance-weighted distance metric to determine encoding as for finding the base colors
 
@@ -340,19 +347,22 @@ cdef void storedxtencodedblock(u8 *blkaddr, u8 srccolors[4][4][4], u8 *bestcolor
         blkaddr[0] = (bits2 >> 16) & 0xff; blkaddr += 1
         blkaddr[0] = bits2 >> 24
 
-    else:
-        blkaddr[0] = color0 & 0xff; blkaddr += 1
-        blkaddr[0] = color0 >> 8; blkaddr += 1
-        blkaddr[0] = color1 & 0xff; blkaddr += 1
-        blkaddr[0] = color1 >> 8; blkaddr += 1
-        blkaddr[0] = bits & 0xff; blkaddr += 1
-        blkaddr[0] = (bits >> 8) & 0xff; blkaddr += 1
-        blkaddr[0] = (bits >> 16) & 0xff; blkaddr += 1
-        blkaddr[0] = bits >> 24
+        return testerror2
+
+    blkaddr[0] = color0 & 0xff; blkaddr += 1
+    blkaddr[0] = color0 >> 8; blkaddr += 1
+    blkaddr[0] = color1 & 0xff; blkaddr += 1
+    blkaddr[0] = color1 >> 8; blkaddr += 1
+    blkaddr[0] = bits & 0xff; blkaddr += 1
+    blkaddr[0] = (bits >> 8) & 0xff; blkaddr += 1
+    blkaddr[0] = (bits >> 16) & 0xff; blkaddr += 1
+    blkaddr[0] = bits >> 24
+
+    return testerror
 
 
 cdef void encodedxtcolorblockfaster(u8 *blkaddr, u8 srccolors[4][4][4],
-                                    int numxpixels, int numypixels):
+                                    int numxpixels, int numypixels, int quality) noexcept nogil:
 
     # simplistic approach. We need two base colors, simply use the "highest" and the "lowest" color
     # present in the picture as base colors
@@ -365,6 +375,9 @@ cdef void encodedxtcolorblockfaster(u8 *blkaddr, u8 srccolors[4][4][4],
     cdef:
         u8 *bestcolor[2]
         u8 basecolors[2][3]
+        u8 *refinedcolor[2]
+        u8 refinedcolors[2][3]
+        u8 refinedblock[8]
         u8 i, j
         u32 lowcv, highcv, testcv
 
@@ -396,14 +409,36 @@ cdef void encodedxtcolorblockfaster(u8 *blkaddr, u8 srccolors[4][4][4],
     bestcolor[0] = basecolors[0]
     bestcolor[1] = basecolors[1]
 
+    # the fast preset keeps the extreme colors as they are
+    if quality == QUALITY_FAST:
+        storedxtencodedblock(blkaddr, srccolors, bestcolor, numxpixels, numypixels)
+        return
+
     # try to find better base colors
     fancybasecolorsearch(srccolors, bestcolor, numxpixels, numypixels)
 
+    if quality == QUALITY_HIGH:
+        # refine the base colors a second time, and keep whichever encoding has the lower error
+        for j in range(2):
+            for i in range(3):
+                refinedcolors[j][i] = basecolors[j][i]
+
+        refinedcolor[0] = refinedcolors[0]
+        refinedcolor[1] = refinedcolors[1]
+
+        fancybasecolorsearch(srccolors, refinedcolor, numxpixels, numypixels)
+
+        if (storedxtencodedblock(refinedblock, srccolors, refinedcolor, numxpixels, numypixels) <
+            storedxtencodedblock(blkaddr, srccolors, bestcolor, numxpixels, numypixels)):
+            memcpy(blkaddr, refinedblock, 8)
+
+        return
+
     # find the best encoding for these colors, and store the result
     storedxtencodedblock(blkaddr, srccolors, bestcolor, numxpixels, numypixels)
 
 
-cdef void writedxt5encodedalphablock(u8 *blkaddr, u8 alphabase1, u8 alphabase2, u8 alphaenc[16]):
+cdef void writedxt5encodedalphablock(u8 *blkaddr, u8 alphabase1, u8 alphabase2, u8 alphaenc[16]) noexcept nogil:
     blkaddr[0] = alphabase1; blkaddr += 1
     blkaddr[0] = alphabase2; blkaddr += 1
     blkaddr[0] = alphaenc[0] | (alphaenc[1] << 3) | ((alphaenc[2] & 3) << 6); blkaddr += 1
@@ -415,7 +450,7 @@ cdef void writedxt5encodedalphablock(u8 *blkaddr, u8 alphabase1, u8 alphabase2,
 
 
 cdef void encodedxt5alpha(u8 *blkaddr, u8 srccolors[4][4][4],
-                            int numxpixels, int numypixels):
+                            int numxpixels, int numypixels) noexcept nogil:
 
     cdef:
         u8 alphabase[2], alphause[2]
@@ -720,12 +755,12 @@ cdef void encodedxt5alpha(u8 *blkaddr, u8 srccolors[4][4][4],
         writedxt5encodedalphablock(blkaddr, <u8>alphatest[0], <u8>alphatest[1], alphaenc3)
 
 
-cdef void extractsrccolors(u8 srcpixels[4][4][4], u8 *srcaddr, int srcRowStride,
-                           int numxpixels, int numypixels):
+cdef void extractsrccolors(u8 srcpixels[4][4][4], const u8 *srcaddr, int srcRowStride,
+                           int numxpixels, int numypixels) noexcept nogil:
 
     cdef:
         u8 i, j, c
-        u8 *curaddr
+        const u8 *curaddr
 
     for j in range(numypixels):
         curaddr = srcaddr + j * srcRowStride * 4
@@ -734,12 +769,11 @@ cdef void extractsrccolors(u8 srcpixels[4][4][4], u8 *srcaddr, int srcRowStride,
                 srcpixels[j][i][c] = curaddr[0]; curaddr += 1
 
 
-cpdef bytearray compress(bytes src, int width, int height):
+cpdef bytearray compress(bytes src, int width, int height, int quality=QUALITY_NORMAL):
     cdef:
-        array.array dataArr = array.array('B', src)
-        u8 *srcPixData = dataArr.data.as_uchars
-        u8 *srcaddr = srcPixData
-        u8 *srcend = srcPixData + len(src)
+        const u8 *srcPixData = src
+        const u8 *srcaddr = srcPixData
+        const u8 *srcend = srcPixData + len(src)
 
         u32 dest_len = ((width + 3) // 4) * ((height + 3) // 4) * 16
         u8 *dest = <u8 *>malloc(dest_len)
@@ -759,31 +793,33 @@ cpdef bytearray compress(bytes src, int width, int height):
         dstRowDiff = 0
 
     try:
-        for j in range(0, height, 4):
-            if height > j + 3:
-                numypixels = 4
+        # Release the GIL so several bands or mipmaps can be compressed at once
+        with nogil:
+            for j in range(0, height, 4):
+                if height > j + 3:
+                    numypixels = 4
 
-            else:
-                numypixels = height - j
+                else:
+                    numypixels = height - j
 
-            srcaddr = srcPixData + j * width * 4
-            if srcaddr >= srcend:
-                break
+                srcaddr = srcPixData + j * width * 4
+                if srcaddr >= srcend:
+                    break
 
-            for i in range(0, width, 4):
-                if width > i + 3:
-                    numxpixels = 4
+                for i in range(0, width, 4):
+                    if width > i + 3:
+                        numxpixels = 4
 
-                else:
-                    numxpixels = width - i
+                    else:
+                        numxpixels = width - i
 
-                extractsrccolors(srcpixels, srcaddr, width, numxpixels, numypixels)
-                encodedxt5alpha(blkaddr, srcpixels, numxpixels, numypixels)
-                encodedxtcolorblockfaster(blkaddr + 8, srcpixels, numxpixels, numypixels)
-                srcaddr += 4 * numxpixels
-                blkaddr += 16
+                    extractsrccolors(srcpixels, srcaddr, width, numxpixels, numypixels)
+                    encodedxt5alpha(blkaddr, srcpixels, numxpixels, numypixels)
+                    encodedxtcolorblockfaster(blkaddr + 8, srcpixels, numxpixels, numypixels, quality)
+                    srcaddr += 4 * numxpixels
+                    blkaddr += 16
 
-            blkaddr += dstRowDiff
+                blkaddr += dstRowDiff
 
         return bytearray(<u8[:dest_len]>dest)
 
@@ -7,10 +7,16 @@
 
 # decompress_.py
 # A BC3/DXT5 decompressor in Python based on libtxc_dxtn.
+# Decodes whole rows of blocks at a time, so it doesn't need Cython to be usable.
 
 ################################################################
 ################################################################
 
+from array import array
+from itertools import chain, repeat
+from operator import add, and_, or_, rshift
+import sys
+
 
 def EXP5TO8R(packedcol):
     return (((packedcol) >> 8) & 0xf8) | (((packedcol) >> 13) & 0x07)
@@ -24,86 +30,101 @@ def EXP5TO8B(packedcol):
     return (((packedcol) << 3) & 0xf8) | (((packedcol) >>  2) & 0x07)
 
 
-def dxt5_decode_imageblock(pixdata, img_block_src, i, j):
-    color0 = pixdata[img_block_src] | (pixdata[img_block_src + 1] << 8)
-    color1 = pixdata[img_block_src + 2] | (pixdata[img_block_src + 3] << 8)
-    bits = (pixdata[img_block_src + 4] | (pixdata[img_block_src + 5] << 8) |
-            (pixdata[img_block_src + 6] << 16) | (pixdata[img_block_src + 7] << 24))
-
-    bit_pos = 2 * (j * 4 + i)
-    code = (bits >> bit_pos) & 3
-
-    ACOMP = 255
-    if code == 0:
-        RCOMP = EXP5TO8R(color0)
-        GCOMP = EXP6TO8G(color0)
-        BCOMP = EXP5TO8B(color0)
-
-    elif code == 1:
-        RCOMP = EXP5TO8R(color1)
-        GCOMP = EXP6TO8G(color1)
-        BCOMP = EXP5TO8B(color1)
+def colorPalette(colors):
+    """
+    Returns the 4 RGB colors of a block, packed as RGBA8 with no alpha.
+    colors: color0 | color1 << 16
+    """
+    color0 = colors & 0xFFFF
+    color1 = colors >> 16
 
-    elif code == 2:
-        RCOMP = ((EXP5TO8R(color0) * 2 + EXP5TO8R(color1)) // 3)
-        GCOMP = ((EXP6TO8G(color0) * 2 + EXP6TO8G(color1)) // 3)
-        BCOMP = ((EXP5TO8B(color0) * 2 + EXP5TO8B(color1)) // 3)
+    r0, g0, b0 = EXP5TO8R(color0), EXP6TO8G(color0), EXP5TO8B(color0)
+    r1, g1, b1 = EXP5TO8R(color1), EXP6TO8G(color1), EXP5TO8B(color1)
 
-    elif code == 3:
-        RCOMP = ((EXP5TO8R(color0) + EXP5TO8R(color1) * 2) // 3)
-        GCOMP = ((EXP6TO8G(color0) + EXP6TO8G(color1) * 2) // 3)
-        BCOMP = ((EXP5TO8B(color0) + EXP5TO8B(color1) * 2) // 3)
- 
-    return ACOMP, RCOMP, GCOMP, BCOMP
+    return (
+        r0 | g0 << 8 | b0 << 16,
+        r1 | g1 << 8 | b1 << 16,
+        (r0 * 2 + r1) // 3 | (g0 * 2 + g1) // 3 << 8 | (b0 * 2 + b1) // 3 << 16,
+        (r0 + r1 * 2) // 3 | (g0 + g1 * 2) // 3 << 8 | (b0 + b1 * 2) // 3 << 16,
+    )
 
 
-def fetch_2d_texel_rgba_dxt5(srcRowStride, pixdata, i, j):
-    blksrc = ((srcRowStride + 3) // 4 * (j // 4) + (i // 4)) * 16
+def alphaPalette(alphas):
+    """
+    Returns the 8 alpha values of a block, packed as RGBA8 with no color.
+    alphas: alpha0 | alpha1 << 8
+    """
+    alpha0 = alphas & 0xFF
+    alpha1 = alphas >> 8
 
-    alpha0 = pixdata[blksrc]
-    alpha1 = pixdata[blksrc + 1]
+    if alpha0 > alpha1:
+        values = [(alpha0 * (8 - code) + alpha1 * (code - 1)) // 7 for code in range(2, 8)]
 
-    bit_pos = ((j & 3) * 4 + (i & 3)) * 3
-    acodelow = pixdata[blksrc + 2 + bit_pos // 8]
-    acodehigh = pixdata[blksrc + 3 + bit_pos // 8]
-    code = (acodelow >> (bit_pos & 0x07) |
-            (acodehigh << (8 - (bit_pos & 0x07)))) & 0x07
-
-    ACOMP, RCOMP, GCOMP, BCOMP = dxt5_decode_imageblock(pixdata, blksrc + 8, i & 3, j & 3)
- 
-    if code == 0:
-        ACOMP = alpha0
-
-    elif code == 1:
-        ACOMP = alpha1
+    else:
+        values = [(alpha0 * (6 - code) + alpha1 * (code - 1)) // 5 for code in range(2, 6)] + [0, 255]
 
-    elif alpha0 > alpha1:
-        ACOMP = (alpha0 * (8 - code) + (alpha1 * (code - 1))) // 7
+    return tuple(value << 24 for value in [alpha0, alpha1] + values)
 
-    elif code < 6:
-        ACOMP = (alpha0 * (6 - code) + (alpha1 * (code - 1))) // 5
 
-    elif code == 6:
-        ACOMP = 0
+# The 4 color codes of a row of a block, by index byte
+ColorCodes = [bytes([byte & 3, byte >> 2 & 3, byte >> 4 & 3, byte >> 6]) for byte in range(0x100)]
 
-    else:
-        ACOMP = 255
- 
-    return RCOMP, GCOMP, BCOMP, ACOMP
+# The 4 alpha codes of a row of a block, by 12 bits of the alpha indices
+AlphaCodes = [bytes([bits & 7, bits >> 3 & 7, bits >> 6 & 7, bits >> 9]) for bits in range(0x1000)]
 
 
 def decompress(data, width, height):
-    output = bytearray(width * height * 4)
- 
-    for y in range(height):
-        for x in range(width):
-            R, G, B, A = fetch_2d_texel_rgba_dxt5(width, data, x, y)
-
-            pos = (y * width + x) * 4
-
-            output[pos + 0] = R
-            output[pos + 1] = G
-            output[pos + 2] = B
-            output[pos + 3] = A
- 
-    return bytes(output)
+    """
+    Decompresses every block of the texture at once: the palettes are built
+    once per distinct pair of endpoints, and every row of pixels is decoded
+    by looking its codes up in the palettes of its row of blocks.
+    All the per-pixel work runs in C, through `map` and `array`.
+    """
+    blkWidth = (width + 3) // 4
+    blkHeight = (height + 3) // 4
+    blkCount = blkWidth * blkHeight
+
+    words = array('I')
+    words.frombytes(data[:blkCount * 16])
+    longs = array('Q')
+    longs.frombytes(data[:blkCount * 16])
+    if sys.byteorder == 'big':
+        words.byteswap()
+        longs.byteswap()
+
+    # Block palettes, 4 colors and 8 alpha values per block
+    colorKeys = words[2::4]
+    alphaKeys = array('I', map(and_, longs[::2], repeat(0xFFFF, blkCount)))
+
+    palettes = {key: colorPalette(key) for key in set(colorKeys)}
+    colors = array('I', chain.from_iterable(map(palettes.__getitem__, colorKeys)))
+
+    palettes = {key: alphaPalette(key) for key in set(alphaKeys)}
+    alphas = array('I', chain.from_iterable(map(palettes.__getitem__, alphaKeys)))
+
+    # Offsets of the palettes of every pixel in a row of blocks
+    colorBase = array('I', [x // 4 * 4 for x in range(blkWidth * 4)])
+    alphaBase = array('I', [x // 4 * 8 for x in range(blkWidth * 4)])
+    rowWidth = blkWidth * 4
+
+    output = array('I')
+    for y in range(blkHeight):
+        blocks = data[y * blkWidth * 16:(y + 1) * blkWidth * 16]
+        alphaBits = longs[y * blkWidth * 2:(y + 1) * blkWidth * 2:2]
+
+        rowColors = colors[y * blkWidth * 4:(y + 1) * blkWidth * 4].__getitem__
+        rowAlphas = alphas[y * blkWidth * 8:(y + 1) * blkWidth * 8].__getitem__
+
+        for j in range(min(4, height - y * 4)):
+            colorCodes = b''.join(map(ColorCodes.__getitem__, blocks[12 + j::16]))
+            alphaCodes = b''.join(map(AlphaCodes.__getitem__, map(and_, map(rshift, alphaBits, repeat(16 + j * 12, blkWidth)), repeat(0xFFF, blkWidth))))
+
+            row = array('I', map(or_, map(rowColors, map(add, colorBase, colorCodes)),
+                                      map(rowAlphas, map(add, alphaBase, alphaCodes))))
+
+            output.extend(row if width == rowWidth else row[:width])
+
+    if sys.byteorder == 'big':
+        output.byteswap()
+
+    return output.tobytes()
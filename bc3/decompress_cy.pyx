@@ -11,9 +11,7 @@
 ################################################################
 ################################################################
 
-from cpython cimport array
-from cython cimport view
-from libc.stdlib cimport malloc, free
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize
 
 
 ctypedef unsigned char u8
@@ -107,29 +105,29 @@ cdef (u8, u8, u8, u8) fetch_2d_texel_rgba_dxt5(u32 srcRowStride, u8 pixdata[], u
     return RCOMP, GCOMP, BCOMP, ACOMP
 
 
-cpdef bytes decompress(bytes data, u32 width, u32 height):
+cpdef bytes decompress(const u8[::1] data, u32 width, u32 height):
+    """
+    Decodes `data` (any contiguous buffer) without copying it,
+    straight into the returned bytes object
+    """
     cdef:
-        array.array dataArr = array.array('B', data)
+        u8 *work = <u8 *>&data[0]
 
-        u8 *work = dataArr.data.as_uchars
-        u8 *output = <u8 *>malloc(width * height * 4)
+        bytes result = PyBytes_FromStringAndSize(NULL, width * height * 4)
+        u8 *output = <u8 *>PyBytes_AS_STRING(result)
 
         u8 R, G, B, A
         u32 y, x, pos
  
-    try:
-        for y in range(height):
-            for x in range(width):
-                R, G, B, A = fetch_2d_texel_rgba_dxt5(width, work, x, y)
-
-                pos = (y * width + x) * 4
-
-                output[pos + 0] = R
-                output[pos + 1] = G
-                output[pos + 2] = B
-                output[pos + 3] = A
-     
-        return bytes(<u8[:width * height * 4]>output)
-
-    finally:
-        free(output)
+    for y in range(height):
+        for x in range(width):
+            R, G, B, A = fetch_2d_texel_rgba_dxt5(width, work, x, y)
+
+            pos = (y * width + x) * 4
+
+            output[pos + 0] = R
+            output[pos + 1] = G
+            output[pos + 2] = B
+            output[pos + 3] = A
+ 
+    return result
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# bc3_encoder.py
+# Compares the BC3 compressor presets against nvcompress, for speed and PSNR
+#
+# Usage: python3 benchmarks/bc3_encoder.py IMAGE [--nvcompress PATH]
+
+
+################################################################
+################################################################
+
+import argparse
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from PyQt5 import QtCore, QtGui
+Qt = QtCore.Qt
+
+import bc3
+import dds
+
+#################################
+
+
+Presets = (
+    ('fast', bc3.QUALITY_FAST),
+    ('normal', bc3.QUALITY_NORMAL),
+    ('high', bc3.QUALITY_HIGH),
+)
+
+
+def psnr(original, decoded):
+    """
+    Returns the PSNR of decoded RGBA8 data, in dB
+    """
+    error = sum((a - b) * (a - b) for a, b in zip(original, decoded))
+    if not error:
+        return math.inf
+
+    return 10 * math.log10(255 * 255 * len(original) / error)
+
+
+def mipmapLevels(img):
+    """
+    Returns the (data, width, height) of every mipmap level of a QImage
+    """
+    width = img.width()
+    height = img.height()
+
+    levels = []
+    for i in range(max(width, height).bit_length()):
+        if i:
+            img = img.scaled(max(1, width >> i), max(1, height >> i),
+                             Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            img = img.convertToFormat(QtGui.QImage.Format_RGBA8888)
+
+        data = img.constBits()
+        data.setsize(img.byteCount())
+        levels.append((data.asstring(), img.width(), img.height()))
+
+    return levels
+
+
+def benchNvcompress(path, img):
+    """
+    Compresses an image with nvcompress, returns (seconds, base level BC3 data)
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        png = os.path.join(tmp, 'tmp.png')
+        out = os.path.join(tmp, 'tmp.dds')
+        img.save(png)
+
+        start = time.perf_counter()
+        subprocess.call([path, '-color', '-alpha', '-mipfilter', 'box', '-bc3', png, out],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+
+        _, _, _, _, size, _, _, data = dds.readDDS(out)
+
+    return elapsed, data[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the BC3 compressor presets.')
+    parser.add_argument('image', help='RGBA image to compress, e.g. an unpacked tileset texture')
+    parser.add_argument('--nvcompress', help='path to an nvcompress executable to compare against')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per preset (the best one is kept)')
+    args = parser.parse_args()
+
+    img = QtGui.QImage(args.image).convertToFormat(QtGui.QImage.Format_RGBA8888)
+    if img.isNull():
+        sys.exit("Couldn't load %s" % args.image)
+
+    width = img.width()
+    height = img.height()
+    levels = mipmapLevels(img)
+    original = levels[0][0]
+
+    print('%dx%d, %d mipmap levels, %s compressor' % (
+        width, height, len(levels), 'Cython' if bc3.accelerated else 'pure Python'))
+    print('%-12s %10s %10s' % ('encoder', 'seconds', 'PSNR (dB)'))
+
+    for name, quality in Presets:
+        best = math.inf
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            mipmaps = bc3.compressMipmaps(levels, quality)
+            best = min(best, time.perf_counter() - start)
+
+        decoded = bc3.decompress(mipmaps[0], width, height)
+        print('%-12s %10.3f %10.2f' % (name, best, psnr(original, decoded)))
+
+    if args.nvcompress:
+        elapsed, data = benchNvcompress(args.nvcompress, img)
+        decoded = bc3.decompress(data, width, height)
+        print('%-12s %10.3f %10.2f' % ('nvcompress', elapsed, psnr(original, decoded)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# quickpaint_merge.py
+# Compares QuickPaintOperations.mergeCells against the previous merge loop
+# of optimizeObjects, on quick paint strokes of increasing size
+#
+# Usage: python3 benchmarks/quickpaint_merge.py [--legacy-limit CELLS]
+
+
+################################################################
+################################################################
+
+import argparse
+from math import sqrt
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from quickpaint import QuickPaintOperations, ObjectSearchIndex
+
+#################################
+
+
+class Cell:
+    """
+    Stand-in for a painted 1x1 ObjectItem
+    """
+
+    def __init__(self, x, y, tileset, type):
+        self.objx = x
+        self.objy = y
+        self.tileset = tileset
+        self.type = type
+        self.layer = 1
+        self.width = 1
+        self.height = 1
+        self.objdata = None
+
+
+def stroke(width, height, types, fill, seed):
+    """
+    Returns the cells of a random brush stroke
+    """
+    rng = random.Random(seed)
+    return [Cell(x, y, 0, rng.choice(types))
+            for y in range(height) for x in range(width) if rng.random() < fill]
+
+
+def legacyMerge(cells):
+    """
+    The merge loop optimizeObjects used before mergeCells, without the item updates.
+    Returns the list of (x, y, width, height) rectangles.
+    """
+    index = ObjectSearchIndex()
+    for cell in cells:
+        index.insert(cell)
+
+    searchObj = index.at
+    database = list(cells)
+    inside = []
+    rects = []
+    ln = 1
+
+    while len(list(filter(lambda i: i.layer == ln, database))) > 0:
+        obj = min(list(filter(lambda i: i.layer == ln, database)),
+                  key=lambda i: sqrt(i.objx ** 2 + i.objy ** 2))
+        w = 1024
+        dims = []
+
+        for y in range(512):
+            if w != 1024:
+                dims.append((w, y))
+
+            if searchObj(ln, obj.objx, obj.objy + y) is None:
+                break
+
+            for x in range(w):
+                cobj = searchObj(ln, obj.objx + x, obj.objy + y)
+                if not cobj or cobj in inside or cobj.tileset != obj.tileset or cobj.type != obj.type:
+                    w = x
+                    break
+
+        dims = list(filter(lambda i: i[0] != 0 and i[1] != 0, dims))
+        if True in map(lambda i: i[1] > 1, dims):
+            dims = list(filter(lambda i: i[1] > 1, dims))
+
+        if not dims:
+            database.remove(obj)
+            continue
+
+        w, h = max(dims, key=lambda i: i[0] * i[1])
+        rects.append((obj.objx, obj.objy, w, h))
+
+        for y in range(obj.objy, obj.objy + h):
+            for x in range(obj.objx, obj.objx + w):
+                cobj = searchObj(ln, x, y)
+                if cobj in database:
+                    database.remove(cobj)
+                    inside.append(cobj)
+
+    return rects
+
+
+def timeit(func, cells):
+    """
+    Returns (seconds, number of rectangles) for a merge function
+    """
+    start = time.perf_counter()
+    rects = func(cells)
+    return time.perf_counter() - start, len(rects)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the quick paint object merging.')
+    parser.add_argument('--legacy-limit', type=int, default=5000,
+                        help='largest stroke (in cells) the previous implementation is run on')
+    args = parser.parse_args()
+
+    cases = (
+        ('solid 32x8', 32, 8, (1,), 1.0),
+        ('solid 128x16', 128, 16, (1,), 1.0),
+        ('solid 512x32', 512, 32, (1,), 1.0),
+        ('mixed 64x16', 64, 16, (1, 2, 3), 1.0),
+        ('sparse 256x32', 256, 32, (1,), 0.7),
+        ('mixed 512x64', 512, 64, (1, 2), 0.9),
+    )
+
+    print('%-16s %8s %12s %8s %12s %8s' % ('stroke', 'cells', 'legacy (s)', 'rects', 'sweep (s)', 'rects'))
+
+    for i, (name, width, height, types, fill) in enumerate(cases):
+        cells = stroke(width, height, types, fill, i)
+
+        newTime, newRects = timeit(QuickPaintOperations.mergeCells, cells)
+
+        if len(cells) <= args.legacy_limit:
+            oldTime, oldRects = timeit(legacyMerge, cells)
+            print('%-16s %8d %12.3f %8d %12.3f %8d' % (name, len(cells), oldTime, oldRects, newTime, newRects))
+
+        else:
+            print('%-16s %8d %12s %8s %12.3f %8d' % (name, len(cells), 'skipped', '-', newTime, newRects))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,678 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# suite.py
+# Times the codecs, the tileset decoding and the level saving path,
+# comparing the Cython modules against their pure-Python fallbacks
+#
+# Usage: python3 benchmarks/suite.py [--filter TEXT] [--save BASELINE] [--compare BASELINE]
+# The Pa0 tilesets are taken from miyamotoextras when they are there,
+# everything else is generated. PyQt5 is needed for the tileset and level cases.
+
+
+################################################################
+################################################################
+
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import traceback
+
+RootPath = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, RootPath)
+
+import globals
+
+# Check if Cython is available
+try:
+    import pyximport
+    pyximport.install()
+
+    import cython_available
+
+except:
+    pass
+
+else:
+    del cython_available
+    globals.cython_available = True
+
+import SarcLib
+import gtx
+from objectstore import LayerStore
+from structures import Structures, GetFormat as GetStructureFormat
+import yaz0
+
+#################################
+
+
+BenchTileset = 'Pa1_benchmark'
+TextureWidth = 2048
+TextureHeight = 512
+
+
+def importPure(package, name):
+    """
+    Imports the pure-Python module of a package, even if the package
+    bound its Cython module under the same name
+    """
+    pkg = importlib.import_module(package)
+    bound = getattr(pkg, name, None)
+
+    module = importlib.import_module('%s.%s' % (package, name))
+    if bound is not None:
+        setattr(pkg, name, bound)
+
+    return module
+
+
+def importCython(name):
+    """
+    Imports a Cython module, or returns None if it can't be built
+    """
+    if not globals.cython_available:
+        return None
+
+    try:
+        return importlib.import_module(name)
+
+    except:
+        return None
+
+
+def LoadBackends():
+    """
+    Returns the implementations of every codec, by backend name
+    """
+    backends = {
+        'yaz0': {'pure': (yaz0._compress, yaz0._decompress)},
+        'addrlib': {'pure': importPure('addrlib', 'addrlib')},
+        'bc3': {'pure': importPure('bc3', 'decompress_')},
+        'gtx_quick': {},
+    }
+
+    yaz0_cy = importCython('yaz0_cy')
+    if yaz0_cy is not None:
+        backends['yaz0']['cython'] = (yaz0_cy.compress, yaz0_cy.decompress)
+
+    libyaz0 = importCython('libyaz0')
+    if libyaz0 is not None:
+        backends['yaz0']['libyaz0'] = (lambda data, level: libyaz0.compress(data, 0, level), libyaz0.decompress)
+
+    addrlib_cy = importCython('addrlib.addrlib_cy')
+    if addrlib_cy is not None:
+        backends['addrlib']['cython'] = addrlib_cy
+
+    decompress_cy = importCython('bc3.decompress_cy')
+    if decompress_cy is not None:
+        backends['bc3']['cython'] = decompress_cy
+
+    gtx_quick_cy = importCython('gtx_quick_cy')
+    if gtx_quick_cy is not None:
+        backends['gtx_quick']['cython'] = gtx_quick_cy
+
+    return backends
+
+
+################################################################
+############################ Fixtures ##########################
+################################################################
+
+
+def SyntheticTexture(format_, rng):
+    """
+    Returns a tileset-sized GTX file. The texture is made of a small set
+    of random blocks, so it compresses about as well as a real one.
+    """
+    if format_ == 0x33:
+        blockSize, blocks = 16, (TextureWidth // 4) * (TextureHeight // 4)
+
+    else:
+        blockSize, blocks = 4, TextureWidth * TextureHeight
+
+    palette = [bytes(rng.getrandbits(8) for _ in range(blockSize)) for _ in range(64)]
+    data = b''.join(palette[rng.getrandbits(6)] for _ in range(blocks))
+
+    return gtx.buildGTX(TextureWidth, TextureHeight, format_, [data])
+
+
+def SyntheticTileset(name, rng):
+    """
+    Returns the SARC data of a tileset with generated textures,
+    collisions and a few object definitions
+    """
+    tex = SyntheticTexture(0x33, rng)
+    nml = SyntheticTexture(0x33, rng)
+
+    colldata = b''.join(struct.pack('<Q', rng.getrandbits(16)) for _ in range(256))
+
+    # One object per tile size from 1x1 to 4x4, each filled with a single tile
+    indexfile = b''
+    deffile = b''
+    for i in range(16):
+        width, height = i % 4 + 1, i // 4 + 1
+        indexfile += struct.pack('>HBBH', len(deffile), width, height, 0)
+        deffile += (bytes((0, i, 0)) * width + b'\xFE') * height + b'\xFF'
+
+    arc = SarcLib.SARC_Archive()
+
+    folder = SarcLib.Folder('BG_tex')
+    arc.addFolder(folder)
+    folder.addFile(SarcLib.File('%s.gtx' % name, tex))
+    folder.addFile(SarcLib.File('%s_nml.gtx' % name, nml))
+
+    folder = SarcLib.Folder('BG_chk')
+    arc.addFolder(folder)
+    folder.addFile(SarcLib.File('d_bgchk_%s.bin' % name, colldata))
+
+    folder = SarcLib.Folder('BG_unt')
+    arc.addFolder(folder)
+    folder.addFile(SarcLib.File('%s.bin' % name, deffile))
+    folder.addFile(SarcLib.File('%s_hd.bin' % name, indexfile))
+
+    return arc.save()[0]
+
+
+def LoadTilesets(rng):
+    """
+    Returns {name: SARC data} of the tilesets used by the synthetic level:
+    Pa0_jyotyu from miyamotoextras (or generated), and a generated Pa1
+    """
+    tilesets = {}
+
+    path = os.path.join(RootPath, 'miyamotoextras', 'Pa0_jyotyu.szs')
+    if os.path.isfile(path):
+        with open(path, 'rb') as inf:
+            data = inf.read()
+
+        if data[:4] == b'Yaz0':
+            data = yaz0.decompressBuffer(data)
+
+        tilesets['Pa0_jyotyu'] = data
+
+    else:
+        tilesets['Pa0_jyotyu'] = SyntheticTileset('Pa0_jyotyu', rng)
+
+    tilesets[BenchTileset] = SyntheticTileset(BenchTileset, rng)
+    return tilesets
+
+
+def SyntheticCourse(tilesets, sprites, width, height, rng):
+    """
+    Returns a course file based on blankcourse.bin, with its tileset
+    names replaced, a zone covering the level and random sprites added
+    """
+    with open(os.path.join(RootPath, 'miyamotodata', 'blankcourse.bin'), 'rb') as inf:
+        blank = inf.read()
+
+    blockStruct = struct.Struct(GetStructureFormat(Structures.CourseBlock))
+    blocks = []
+    for i in range(15):
+        offset, size = blockStruct.unpack_from(blank, i * 8)
+        blocks.append(blank[offset:offset + size])
+
+    # Block 1: the tileset names
+    names = (list(tilesets) + [''] * 4)[:4]
+    blocks[0] = b''.join(name.encode('ascii').ljust(32, b'\0') for name in names)
+
+    # Block 5: the zone's background
+    bgStruct = struct.Struct(GetStructureFormat(Structures.Background))
+    blocks[4] = bgStruct.pack(0, 0, 0, 0, b'Black'.ljust(16, b'\0'), 0)
+
+    # Block 10: the zones. Sprites outside of every zone can't be saved.
+    zoneStruct = struct.Struct(GetStructureFormat(Structures.Zone))
+    blocks[9] = zoneStruct.pack(0, 0, width * 16, height * 16, *[0] * 16)
+
+    # Block 8: the sprites
+    spriteStruct = struct.Struct(GetStructureFormat(Structures.Sprite))
+    blocks[7] = b''.join(
+        spriteStruct.pack(rng.randrange(20), rng.randrange(width) * 16, rng.randrange(height) * 16,
+                          0, 0, 0, 0, 0, b'\0\0', 0)
+        for _ in range(sprites)
+    ) + b'\xFF\xFF\xFF\xFF'
+
+    course = bytearray(blockStruct.size * 15)
+    for i, block in enumerate(blocks):
+        blockStruct.pack_into(course, i * 8, len(course), len(block))
+        course += block
+
+    return bytes(course)
+
+
+def SyntheticLayer(layer, objects, width, height, rng):
+    """
+    Returns an object layer file with random objects of the first two tilesets
+    """
+    store = LayerStore(layer)
+    for z in range(objects):
+        store.append(rng.randrange(2), rng.randrange(16), rng.randrange(width), rng.randrange(height),
+                     rng.randrange(1, 9), rng.randrange(1, 9), 0, z)
+
+    return store.toBytes()
+
+
+def SyntheticLevel(tilesets, scale, rng):
+    """
+    Returns (level SARC data, [(course, L0, L1, L2) of every area]).
+    At scale 1, every area has 20000 objects on layer 1 and 1000 sprites.
+    """
+    width, height = 1024, 512
+    areas = []
+    for _ in range(4):
+        course = SyntheticCourse(tilesets, int(1000 * scale), width, height, rng)
+        layers = [SyntheticLayer(layer, int(count * scale), width, height, rng)
+                  for layer, count in enumerate((4000, 20000, 2000))]
+        areas.append([course] + layers)
+
+    arc = SarcLib.SARC_Archive()
+    folder = SarcLib.Folder('course')
+    arc.addFolder(folder)
+
+    for areanum, (course, L0, L1, L2) in enumerate(areas, 1):
+        folder.addFile(SarcLib.File('course%d.bin' % areanum, course))
+        folder.addFile(SarcLib.File('course%d_bgdatL0.bin' % areanum, L0))
+        folder.addFile(SarcLib.File('course%d_bgdatL1.bin' % areanum, L1))
+        folder.addFile(SarcLib.File('course%d_bgdatL2.bin' % areanum, L2))
+
+    for name, data in tilesets.items():
+        arc.addFile(SarcLib.File(name, data))
+
+    return arc.save()[0], areas
+
+
+class Fixtures:
+    """
+    The data every case runs on, generated from a fixed seed
+    """
+
+    def __init__(self, scale, seed):
+        rng = random.Random(seed)
+
+        self.tilesets = LoadTilesets(rng)
+        self.level, self.areas = SyntheticLevel(self.tilesets, scale, rng)
+        self.levelYaz0 = yaz0.compressBuffer(self.level, 1)
+
+        self.textures = {
+            'BC3': SyntheticTexture(0x33, rng),
+            'RGBA8': SyntheticTexture(0x1a, rng),
+        }
+
+
+################################################################
+############################# Cases ############################
+################################################################
+
+
+def DecodeGTX(gtxdata, addrlib, decompress_):
+    """
+    gtx.readGFD, then addrlib.deswizzle, then bc3.decompress,
+    like tileset._loadGTX_addrlib but with the given modules
+    """
+    (dim, width, height, depth, format_,
+     use, tileMode, swizzle_, data) = gtx.readGFD(gtxdata)
+
+    surfOut = addrlib.getSurfaceInfo(format_, width, height, 1, 1, tileMode, 0, 0)
+    udata = addrlib.deswizzle(width, height, 1, format_, 0, use, tileMode, swizzle_, surfOut.pitch, surfOut.bpp, 0, 0, data)
+
+    if format_ == 0x33:
+        csize = ((width + 3) // 4) * ((height + 3) // 4) * 16
+        udata = decompress_.decompress(memoryview(udata)[:csize], width, height)
+
+    return udata
+
+
+def DecodeGTXQuick(gtxdata, gtx_quick_cy):
+    """
+    gtx.readGFD, then gtx_quick_cy.decodeGTX
+    """
+    (dim, width, height, depth, format_,
+     use, tileMode, swizzle_, data) = gtx.readGFD(gtxdata)
+
+    return gtx_quick_cy.decodeGTX(width, height, format_, data)
+
+
+def CodecCases(fixtures, backends, compLevel):
+    """
+    Yields (case, backend, bytes processed, function, setup) for the cases
+    that don't need PyQt5
+    """
+    for backend, (compress, decompress) in backends['yaz0'].items():
+        yield ('yaz0 compress', backend, len(fixtures.level),
+               lambda compress=compress: compress(fixtures.level, compLevel), None)
+        yield ('yaz0 decompress', backend, len(fixtures.level),
+               lambda decompress=decompress: decompress(fixtures.levelYaz0), None)
+
+    for texture, gtxdata in fixtures.textures.items():
+        size = TextureWidth * TextureHeight * 4
+
+        for backend in backends['addrlib']:
+            addrlib = backends['addrlib'][backend]
+            decompress_ = backends['bc3'].get(backend, backends['bc3']['pure'])
+            yield ('GTX decode %s (addrlib)' % texture, backend, size,
+                   lambda gtxdata=gtxdata, addrlib=addrlib, decompress_=decompress_: DecodeGTX(gtxdata, addrlib, decompress_), None)
+
+        for backend, gtx_quick_cy in backends['gtx_quick'].items():
+            yield ('GTX decode %s (gtx_quick)' % texture, backend, size,
+                   lambda gtxdata=gtxdata, gtx_quick_cy=gtx_quick_cy: DecodeGTXQuick(gtxdata, gtx_quick_cy), None)
+
+
+class HeadlessWindow:
+    """
+    Stands in for the main window while levels are loaded without the editor
+    """
+    scene = None
+
+    class levelOverview:
+        @staticmethod
+        def update():
+            pass
+
+
+class QtCases:
+    """
+    The cases that go through the editor itself: tileset packing and
+    saving, and area and level loading and saving.
+    Sets up a QApplication with the offscreen platform and temporary settings.
+    """
+    Names = (
+        'Area_NSMBU.load',
+        'Area_NSMBU.save',
+        'PackTexture',
+        'SaveTileset',
+        'Level_NSMBU.save',
+    )
+
+    def __init__(self, fixtures, compLevel):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+        from PyQt5 import QtCore, QtWidgets
+
+        globals.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        os.chdir(RootPath)
+
+        self.settingsDir = tempfile.TemporaryDirectory()
+        globals.settings = QtCore.QSettings(os.path.join(self.settingsDir.name, 'settings.ini'), QtCore.QSettings.IniFormat)
+
+        import area  # must come before loading, to resolve their import cycle
+
+        # The editor replaces the exception hook with a message box, which would block
+        sys.excepthook = sys.__excepthook__
+
+        from loading import LoadTranslation, LoadGameDef, LoadSpriteData, LoadOverrides
+        import spritelib as SLib
+        from ui import MiyamotoTheme, LoadNumberFont
+
+        LoadTranslation()
+        globals.theme = MiyamotoTheme()
+
+        globals.Sprites = None
+        LoadGameDef(None)
+        LoadSpriteData()
+        LoadNumberFont()
+        LoadOverrides()
+        SLib.OutlineColor = globals.theme.color('smi')
+        SLib.main()
+
+        # The level items look up their scene in the main window. Without one,
+        # they act as items that were not added to a scene yet.
+        globals.mainWindow = HeadlessWindow()
+
+        globals.CompLevel = compLevel
+        globals.TilesetEdited = False
+        globals.OverrideTilesetSaving = False
+
+        # Every load should decode the tilesets again
+        globals.TilesetCacheSize = 0
+
+        self.SLib = SLib
+        self.fixtures = fixtures
+        self.area = None
+        self.level = None
+
+    def cases(self):
+        """
+        Yields (case, backend, bytes processed, function, setup)
+        """
+        from area import Area_NSMBU
+        from level import Level_NSMBU
+        from tileset import CreateTilesets, PackTexture, SaveTileset
+
+        course, L0, L1, L2 = self.fixtures.areas[0]
+
+        def loadArea():
+            globals.szsData = dict(self.fixtures.tilesets)
+            CreateTilesets()
+
+            self.area = globals.Area = self.SLib.Area = Area_NSMBU()
+            self.area.load(course, L0, L1, L2)
+
+        def prepareArea():
+            if self.area is None:
+                loadArea()
+
+        def prepareLevel():
+            prepareArea()
+
+            # The first area is parsed, the others are kept as raw files
+            self.level = globals.Level = Level_NSMBU(headless=True)
+            self.level.load(self.fixtures.level, 0)
+            self.level.areas[0] = self.area
+
+        def saveLevel():
+            globals.szsData = dict(self.fixtures.tilesets)
+            return self.level.save()
+
+        areaSize = sum(len(data) for data in (course, L0, L1, L2))
+        textureSize = TextureWidth * TextureHeight * 4
+
+        yield ('Area_NSMBU.load', 'default', areaSize, loadArea, None)
+        yield ('Area_NSMBU.save', 'default', areaSize, lambda: self.area.save(), prepareArea)
+        yield ('PackTexture', 'default', textureSize, lambda: PackTexture(1), prepareArea)
+        yield ('SaveTileset', 'default', textureSize * 2, lambda: SaveTileset(1), prepareArea)
+        yield ('Level_NSMBU.save', 'default', len(self.fixtures.level), saveLevel, prepareLevel)
+
+
+################################################################
+############################# Runner ###########################
+################################################################
+
+
+def TimeCase(func, repeat, budget):
+    """
+    Runs a case up to `repeat` times, stopping early once `budget`
+    seconds have been spent. Returns the time of every run.
+    """
+    times = []
+    total = 0
+    while len(times) < repeat and (not times or total < budget):
+        gc.collect()
+
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+
+        times.append(elapsed)
+        total += elapsed
+
+    return times
+
+
+def Key(result):
+    return '%s [%s]' % (result['case'], result['backend'])
+
+
+def PrintResult(result, pure):
+    """
+    Prints a line of the results table
+    """
+    if result['status'] != 'ok':
+        print('%-34s %-8s %s' % (result['case'], result['backend'], result['status']))
+        return
+
+    speedup = ''
+    if pure is not None and pure['status'] == 'ok' and result['backend'] != 'pure':
+        speedup = '%.1fx' % (pure['median'] / result['median'])
+
+    print('%-34s %-8s %10.1f %10.1f %10.2f %8s' % (
+        result['case'], result['backend'], result['median'] * 1000,
+        result['min'] * 1000, result['throughput'], speedup))
+
+
+def Run(cases, args):
+    """
+    Times every case matching the filter and returns their results
+    """
+    results = []
+    pure = {}
+
+    print('%-34s %-8s %10s %10s %10s %8s' % ('case', 'backend', 'median ms', 'min ms', 'MB/s', 'vs pure'))
+
+    for name, backend, size, func, setup in cases:
+        if args.filter and args.filter.lower() not in name.lower():
+            continue
+
+        result = {'case': name, 'backend': backend, 'bytes': size}
+        if callable(func):
+            try:
+                if setup is not None:
+                    setup()
+
+                times = TimeCase(func, args.repeat, args.budget)
+
+            except Exception as e:
+                traceback.print_exc()
+                result['status'] = 'error: %s: %s' % (type(e).__name__, e)
+
+            else:
+                result['status'] = 'ok'
+                result['runs'] = len(times)
+                result['median'] = statistics.median(times)
+                result['min'] = min(times)
+                result['throughput'] = size / result['median'] / 1e6
+
+        else:
+            result['status'] = func
+
+        if backend == 'pure':
+            pure[name] = result
+
+        PrintResult(result, pure.get(name))
+        results.append(result)
+
+    return results
+
+
+def Compare(results, path, threshold):
+    """
+    Compares the results against a baseline file.
+    Returns the number of regressions.
+    """
+    with open(path, encoding='utf-8') as inf:
+        baseline = {Key(result): result for result in json.load(inf)['results']}
+
+    regressions = 0
+    print('\nCompared to %s:' % path)
+
+    for result in results:
+        old = baseline.get(Key(result))
+        if old is None or old['status'] != 'ok' or result['status'] != 'ok':
+            continue
+
+        ratio = result['median'] / old['median']
+        if ratio > 1 + threshold:
+            regressions += 1
+            verdict = 'REGRESSION'
+
+        elif ratio < 1 - threshold:
+            verdict = 'faster'
+
+        else:
+            verdict = ''
+
+        print('%-45s %10.1f -> %10.1f ms %7.2fx %s' % (Key(result), old['median'] * 1000, result['median'] * 1000, ratio, verdict))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the codecs, tileset decoding and level saving.')
+    parser.add_argument('--filter', help='only run the cases whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of every case (default: 5)')
+    parser.add_argument('--budget', type=float, default=10,
+                        help='seconds after which a case stops repeating (default: 10)')
+    parser.add_argument('--scale', type=float, default=1, help='size of the synthetic level (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic fixtures (default: 0)')
+    parser.add_argument('--comp-level', type=int, default=1, help='Yaz0 compression level (default: 1)')
+    parser.add_argument('--save', metavar='BASELINE', help='write the results to a JSON baseline')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare the results with a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='slowdown reported as a regression by --compare (default: 0.15)')
+    args = parser.parse_args()
+
+    fixtures = Fixtures(args.scale, args.seed)
+    backends = LoadBackends()
+
+    print('Python %s, Cython %s, fixtures: level %d KB, Pa0_jyotyu %s\n' % (
+        platform.python_version(), 'available' if globals.cython_available else 'not available',
+        len(fixtures.level) // 1024,
+        'from miyamotoextras' if os.path.isfile(os.path.join(RootPath, 'miyamotoextras', 'Pa0_jyotyu.szs')) else 'generated'))
+
+    cases = list(CodecCases(fixtures, backends, args.comp_level))
+
+    if not args.filter or any(args.filter.lower() in name.lower() for name in QtCases.Names):
+        try:
+            cases += list(QtCases(fixtures, args.comp_level).cases())
+
+        except Exception:
+            traceback.print_exc()
+            sys.exit('Could not set up the editor for the %s cases' % ', '.join(QtCases.Names))
+
+    results = Run(cases, args)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as out:
+            json.dump({
+                'version': globals.MiyamotoVersion,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cython': globals.cython_available,
+                'scale': args.scale,
+                'seed': args.seed,
+                'results': results,
+            }, out, indent=2)
+
+    if args.compare and Compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1608,15 +1608,19 @@ class PreferencesDialog(QtWidgets.QDialog):
                 self.compLevel = QtWidgets.QComboBox()
                 self.compLevel.setMaximumWidth(256)
 
-                if globals.libyaz0_available:
-                    for i in range(33, 43):
-                        self.compLevel.addItem(globals.trans.string('PrefsDlg', i))
+                for i in range(33, 43):
+                    self.compLevel.addItem(globals.trans.string('PrefsDlg', i))
 
-                    self.compLevel.setCurrentIndex(globals.CompLevel)
+                self.compLevel.setCurrentIndex(globals.CompLevel)
 
-                else:
-                    self.compLevel.addItem(globals.trans.string('PrefsDlg', 42))
-                    self.compLevel.setCurrentIndex(0)
+                # Add the tileset texture (BC3) quality setting
+                self.bc3Quality = QtWidgets.QComboBox()
+                self.bc3Quality.setMaximumWidth(256)
+
+                for i in range(47, 50):
+                    self.bc3Quality.addItem(globals.trans.string('PrefsDlg', i))
+
+                self.bc3Quality.setCurrentIndex(globals.BC3Quality)
 
                 # Add the Embedded tab type determiner
                 self.separate = QtWidgets.QCheckBox()
@@ -1632,13 +1636,21 @@ class PreferencesDialog(QtWidgets.QDialog):
 
                 del RotationFPS
 
+                # Add the memory budget of the pre-rendered level view chunks
+                self.chunkCacheSize = QtWidgets.QSpinBox()
+                self.chunkCacheSize.setMaximumWidth(256)
+                self.chunkCacheSize.setRange(16, 4096)
+                self.chunkCacheSize.setValue(globals.TileChunkCacheSize)
+
                 # Create the main layout
                 L = QtWidgets.QFormLayout()
                 L.addRow(globals.trans.string('PrefsDlg', 14), self.Trans)
                 L.addRow(globals.trans.string('PrefsDlg', 15), ClearRecentBtn)
                 L.addRow(globals.trans.string('PrefsDlg', 32), self.compLevel)
+                L.addRow(globals.trans.string('PrefsDlg', 46), self.bc3Quality)
                 L.addRow(globals.trans.string('PrefsDlg', 43), self.separate)
                 L.addRow(globals.trans.string('PrefsDlg', 45), self.rotationFPS)
+                L.addRow(globals.trans.string('PrefsDlg', 50), self.chunkCacheSize)
 
                 self.setLayout(L)
 
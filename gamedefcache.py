@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# gamedefcache.py
+# Persistent on-disk cache of the data compiled from gamedef XML files
+
+
+################################################################
+################################################################
+
+############ Imports ############
+
+import hashlib
+import json
+import os
+import tempfile
+
+import globals
+
+#################################
+
+
+CacheVersion = 1
+
+# Cache file contents by path, as (key, text), so reloading a gamedef or
+# saving a level only has to stat the XML files
+Compiled = {}
+
+
+def CacheFolder():
+    """
+    Returns the folder compiled gamedef files are cached in
+    """
+    return os.path.join(globals.miyamoto_path, 'cache', 'gamedef')
+
+
+def CachePath(kind, paths):
+    """
+    Returns the path of the cache file of a chain of XML files
+    """
+    h = hashlib.sha1(kind.encode('utf-8'))
+    for path in paths:
+        h.update(b'\0' + os.path.normpath(path).encode('utf-8'))
+
+    return os.path.join(CacheFolder(), '%s-%s.json' % (kind, h.hexdigest()))
+
+
+def CacheKey(paths):
+    """
+    Returns the cache key of a chain of XML files,
+    or None if one of them can't be found
+    """
+    key = [CacheVersion]
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        key.append([path, st.st_mtime_ns, st.st_size])
+
+    return key
+
+
+def LoadCompiled(kind, paths, compile):
+    """
+    Returns [compile(path) for path in paths]. The results are loaded from
+    the cache if none of the files changed since they were compiled.
+    compile must return data that JSON can store; tuples come back as lists.
+    """
+    key = CacheKey(paths)
+    if key is None:
+        return [compile(path) for path in paths]
+
+    cachePath = CachePath(kind, paths)
+
+    # The text is kept rather than the data, as callers
+    # are free to change what they are given
+    if cachePath in Compiled and Compiled[cachePath][0] == key:
+        return json.loads(Compiled[cachePath][1])['data']
+
+    try:
+        with open(cachePath, encoding='utf-8') as inf:
+            text = inf.read()
+
+        cache = json.loads(text)
+        if cache['key'] == key:
+            Compiled[cachePath] = key, text
+            return cache['data']
+
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    data = [compile(path) for path in paths]
+    text = json.dumps({'key': key, 'data': data}, ensure_ascii=False, separators=(',', ':'))
+    Compiled[cachePath] = key, text
+
+    folder = CacheFolder()
+
+    try:
+        os.makedirs(folder, exist_ok=True)
+
+        # Write to a temporary file first, so a partial file is never read
+        fd, tmp_path = tempfile.mkstemp('.tmp', kind, folder)
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            out.write(text)
+
+        os.replace(tmp_path, cachePath)
+
+    except OSError:
+        pass
+
+    return data
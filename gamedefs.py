@@ -108,6 +108,9 @@ class MiyamotoGameDefinition:
             'sprites': gdf(None, False),
         }
 
+        # Resolved file lists and the sprite file index, built once per gamedef
+        self.resolved = {}
+
     def InitFromName(self, name):
         """
         Attempts to open/load a Game Definition from a name string
@@ -246,39 +249,38 @@ class MiyamotoGameDefinition:
         """
         Checks each base of this gamedef and returns a list of successive file paths
         """
+        # The chain is only walked the first time, callers get their own copy
+        key = ('files', name, folder)
+        if key not in self.resolved:
+            paths, wasPatch = self._recursiveFiles(name, folder)
+            self.resolved[key] = tuple(paths), wasPatch
+
+        paths, wasPatch = self.resolved[key]
+        if isPatch:
+            return list(paths), wasPatch
+        else:
+            return list(paths)
+
+    def _recursiveFiles(self, name, folder):
+        """
+        Resolves the successive file paths of recursiveFiles,
+        and whether the first one is a patch
+        """
         ListToCheckIn = self.files if not folder else self.folders
 
         # This can be handled 4 ways: if we do or don't have a base, and if we do or don't have a copy of the file.
         if self.base is None:
             if ListToCheckIn[name].path is None:  # No base, no file
-
-                if isPatch:
-                    return [], True
-                else:
-                    return []
+                return [], True
 
             else:  # No base, file
-
-                alist = []
-                alist.append(ListToCheckIn[name].path)
-                if isPatch:
-                    return alist, ListToCheckIn[name].patch
-                else:
-                    return alist
+                return [ListToCheckIn[name].path], ListToCheckIn[name].patch
 
         else:
-
-            if isPatch:
-                listUpToNow, wasPatch = self.base.recursiveFiles(name, True, folder)
-            else:
-                listUpToNow = self.base.recursiveFiles(name, False, folder)
+            listUpToNow, wasPatch = self.base.recursiveFiles(name, True, folder)
 
             if ListToCheckIn[name].path is None:  # Base, no file
-
-                if isPatch:
-                    return listUpToNow, wasPatch
-                else:
-                    return listUpToNow
+                return listUpToNow, wasPatch
 
             else:  # Base, file
 
@@ -288,23 +290,18 @@ class MiyamotoGameDefinition:
 
                 # If it's not (it's free-standing), make a new list and start over
                 else:
-                    newlist = []
-                    newlist.append(ListToCheckIn[name].path)
-                    if isPatch:
-                        return newlist, False
-                    else:
-                        return newlist
+                    return [ListToCheckIn[name].path], False
 
                 # Return
-                if isPatch:
-                    return listUpToNow, wasPatch
-                else:
-                    return listUpToNow
+                return listUpToNow, wasPatch
 
     def multipleRecursiveFiles(self, *args):
         """
         Returns multiple recursive files in order of least recent to most recent as a list of tuples, one list per gamedef base
         """
+        key = ('multiple', ) + args
+        if key in self.resolved:
+            return list(self.resolved[key])
 
         # This should be very simple
         # Each arg should be a file name
@@ -323,8 +320,32 @@ class MiyamotoGameDefinition:
             except KeyError:
                 result.append(None)
         main.append(tuple(result))
+
+        self.resolved[key] = tuple(main)
         return main
 
+    def spriteFiles(self):
+        """
+        Returns the folder holding the most recent copy of each sprite image of
+        this gamedef and its bases, by normcased filename. Don't change it.
+        """
+        if 'sprites' in self.resolved:
+            return self.resolved['sprites']
+
+        files = {}
+        for folder in ['miyamotodata/sprites'] + self.recursiveFiles('sprites', False, True):
+            for root, dirs, names in os.walk(folder):
+                subfolder = os.path.relpath(root, folder)
+
+                for name in names:
+                    if subfolder != os.curdir:
+                        name = os.path.join(subfolder, name)
+
+                    files[os.path.normcase(name)] = folder
+
+        self.resolved['sprites'] = files
+        return files
+
     def file(self, name):
         """
         Returns a file by recursively checking successive gamedef bases
@@ -47,6 +47,8 @@ SpriteListData = None
 EntranceTypeNames = None
 Tiles = None  # 0x200 tiles per tileset, plus 64 for each type of override
 TilesetAnimTimer = None
+TilesetAnimFrame = 0
+AnimatedTiles = None  # (index, tile) pairs of the animated tiles, rebuilt when None
 Overrides = None  # 320 tiles, this is put into Tiles usually
 TileBehaviours = None
 ObjectDefinitions = None  # 4 tilesets
@@ -92,6 +94,9 @@ AutoOpenScriptEnabled = False
 ExceptionRaised = False
 CurrentLevelNameForAutoOpenScript = 'AAAAAAAAAAAAAAAAAAAAAAAAAA'
 TileWidth = 60
+TileChunkCacheSize = 256  # MB
+TilesetCacheSize = 512  # MB, 0 disables the decoded tileset cache
+BC3Quality = 1  # 0: fast, 1: normal, 2: high
 szsData = {}
 UseRGBA8 = False
 NumSprites = 0
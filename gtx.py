@@ -89,6 +89,10 @@ class GX2Surface(struct.Struct):
 
 
 def readGFD(f):
+    """
+    Reads the first surface of a GTX file.
+    The image data is returned as a memoryview into `f`, not a copy.
+    """
     pos = 0
     dim, width, height, depth, format, tileMode = 0, 0, 0, 0, 0, 0
     data = b''
@@ -125,7 +129,7 @@ def readGFD(f):
             swizzle = gx2surf.swizzle
 
         elif blkhead.type_ == 0x0C and not data:
-            data = bytes(f[pos:pos + blkhead.dataSize])
+            data = memoryview(f)[pos:pos + blkhead.dataSize]
 
         pos += blkhead.dataSize
 
@@ -310,6 +314,32 @@ def RAWtoGTX(width, height, format_, fourcc, dataSize, compSel, numMips, data):
     return outData
 
 
+def buildGTX(width, height, format_, mipmaps, compSel=(0, 1, 2, 3)):
+    """
+    Builds a GTX file from the unswizzled data of every mipmap level.
+    Only RGBA8 (0x1a) and BC3 (0x33) are supported.
+    Works entirely in memory, so it is safe to call from worker threads.
+    """
+    if format_ == 0x33:
+        blkWidth, blkHeight, bpp = 4, 4, 16
+
+    elif format_ == 0x1a:
+        blkWidth, blkHeight, bpp = 1, 1, 4
+
+    else:
+        raise NotImplementedError("Unimplemented texture format!")
+
+    if not mipmaps:
+        raise ValueError("No image data was given!")
+
+    for mipLevel, data in enumerate(mipmaps):
+        _, size = getCurrentMipOffset_Size(width, height, blkWidth, blkHeight, bpp, mipLevel)
+        if len(data) != size:
+            raise ValueError("Mipmap level %d should be %d bytes, got %d!" % (mipLevel, size, len(data)))
+
+    return RAWtoGTX(width, height, format_, b'', len(mipmaps[0]), list(compSel), len(mipmaps), b''.join(mipmaps))
+
+
 def writeGFD(f):
     width, height, format_, fourcc, dataSize, compSel, numMips, data = dds.readDDS(f)
     numMips += 1
@@ -28,8 +28,7 @@
 ################################################################
 ################################################################
 
-from cpython cimport array
-from cython cimport view
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize
 from libc.stdlib cimport malloc, free
 from libc.string cimport memcpy
 
@@ -39,19 +38,19 @@ ctypedef unsigned short u16
 ctypedef unsigned int u32
 
 
-cdef u8 EXP5TO8R(u16 packedcol):
+cdef u8 EXP5TO8R(u16 packedcol) nogil:
     return (((packedcol) >> 8) & 0xf8) | (((packedcol) >> 13) & 0x07)
 
 
-cdef u8 EXP6TO8G(u16 packedcol):
+cdef u8 EXP6TO8G(u16 packedcol) nogil:
     return (((packedcol) >> 3) & 0xfc) | (((packedcol) >>  9) & 0x03)
 
 
-cdef u8 EXP5TO8B(u16 packedcol):
+cdef u8 EXP5TO8B(u16 packedcol) nogil:
     return (((packedcol) << 3) & 0xf8) | (((packedcol) >>  2) & 0x07)
 
 
-cdef (u8, u8, u8, u8) dxt5_decode_imageblock(u8 *pixdata, u32 img_block_src, u8 i, u8 j):
+cdef (u8, u8, u8, u8) dxt5_decode_imageblock(u8 *pixdata, u32 img_block_src, u8 i, u8 j) noexcept nogil:
     cdef:
         u16 color0 = pixdata[img_block_src] | (pixdata[img_block_src + 1] << 8)
         u16 color1 = pixdata[img_block_src + 2] | (pixdata[img_block_src + 3] << 8)
@@ -87,7 +86,7 @@ cdef (u8, u8, u8, u8) dxt5_decode_imageblock(u8 *pixdata, u32 img_block_src, u8
     return ACOMP, RCOMP, GCOMP, BCOMP
 
 
-cdef (u8, u8, u8, u8) fetch_2d_texel_rgba_dxt5(u32 srcRowStride, u8 *pixdata, u32 i, u32 j):
+cdef (u8, u8, u8, u8) fetch_2d_texel_rgba_dxt5(u32 srcRowStride, u8 *pixdata, u32 i, u32 j) noexcept nogil:
     cdef:
         u32 blksrc = ((srcRowStride + 3) // 4 * (j // 4) + (i // 4)) * 16
 
@@ -125,14 +124,16 @@ cdef (u8, u8, u8, u8) fetch_2d_texel_rgba_dxt5(u32 srcRowStride, u8 *pixdata, u3
     return RCOMP, GCOMP, BCOMP, ACOMP
 
 
-cpdef bytes decodeGTX(u32 width, u32 height, u32 format, data):
-    cdef array.array dataArr = array.array('B', data)
-
+cpdef bytes decodeGTX(u32 width, u32 height, u32 format, const u8[::1] data):
+    """
+    Decodes `data` (any contiguous buffer) without copying it,
+    straight into the returned bytes object
+    """
     if format == 0x1a:
-        return export_RGBA8(width, height, dataArr.data.as_uchars)
+        return export_RGBA8(width, height, <u8 *>&data[0])
 
     elif format == 0x33:
-        return export_DXT5(width, height, dataArr.data.as_uchars)
+        return export_DXT5(width, height, <u8 *>&data[0])
 
     else:
         raise NotImplementedError("Unimplemented texture format!")
@@ -141,12 +142,13 @@ cpdef bytes decodeGTX(u32 width, u32 height, u32 format, data):
 cdef bytes export_RGBA8(u32 width, u32 height, u8 *source):
     cdef:
         u32 pos, x, y, pos_
-        u8 *output
+        bytes result = PyBytes_FromStringAndSize(NULL, width * height * 4)
+        u8 *output = <u8 *>PyBytes_AS_STRING(result)
 
-    output = <u8 *>malloc(width * height * 4)
     pos = 0
 
-    try:
+    # Release the GIL so textures can be decoded in several threads at once
+    with nogil:
         for y in range(height):
             for x in range(width):
                 pos = (y & ~15) * width
@@ -165,10 +167,7 @@ cdef bytes export_RGBA8(u32 width, u32 height, u8 *source):
 
                 memcpy(output + pos_, source + pos, 4)
 
-        return bytes(<u8[:width * height * 4]>output)
-
-    finally:
-        free(output)
+    return result
 
 
 cdef bytes export_DXT5(u32 width, u32 height, u8 *source):
@@ -181,44 +180,46 @@ cdef bytes export_DXT5(u32 width, u32 height, u8 *source):
     work = <u8 *>malloc(blobWidth * blobHeight * 16)
     pos = 0
 
-    for y in range(blobHeight):
-        for x in range(blobWidth):
-            pos = (y >> 4) * (blobWidth * 16)
-            pos ^= (y & 1)
-            pos ^= (x & 7) << 1
-            pos ^= (x & 8) << 1
-            pos ^= (x & 8) << 2
-            pos ^= (x & 0x10) << 2
-            pos ^= (x & ~0x1F) << 4
-            pos ^= (y & 2) << 6
-            pos ^= (y & 4) << 6
-            pos ^= (y & 8) << 1
-            pos ^= (y & 0x10) << 2
-            pos ^= (y & 0x20)
-            pos *= 16
-
-            pos_ = (y * blobWidth + x) * 16
-
-            memcpy(work + pos_, source + pos, 16)
-
     cdef:
         u8 R, G, B, A
-        u8 *output = <u8 *>malloc(width * height * 4)
+        bytes result = PyBytes_FromStringAndSize(NULL, width * height * 4)
+        u8 *output = <u8 *>PyBytes_AS_STRING(result)
  
     try:
-        for y in range(height):
-            for x in range(width):
-                R, G, B, A = fetch_2d_texel_rgba_dxt5(width, work, x, y)
-
-                pos = (y * width + x) * 4
-
-                output[pos + 0] = R
-                output[pos + 1] = G
-                output[pos + 2] = B
-                output[pos + 3] = A
+        # Release the GIL so textures can be decoded in several threads at once
+        with nogil:
+            for y in range(blobHeight):
+                for x in range(blobWidth):
+                    pos = (y >> 4) * (blobWidth * 16)
+                    pos ^= (y & 1)
+                    pos ^= (x & 7) << 1
+                    pos ^= (x & 8) << 1
+                    pos ^= (x & 8) << 2
+                    pos ^= (x & 0x10) << 2
+                    pos ^= (x & ~0x1F) << 4
+                    pos ^= (y & 2) << 6
+                    pos ^= (y & 4) << 6
+                    pos ^= (y & 8) << 1
+                    pos ^= (y & 0x10) << 2
+                    pos ^= (y & 0x20)
+                    pos *= 16
+
+                    pos_ = (y * blobWidth + x) * 16
+
+                    memcpy(work + pos_, source + pos, 16)
+
+            for y in range(height):
+                for x in range(width):
+                    R, G, B, A = fetch_2d_texel_rgba_dxt5(width, work, x, y)
+
+                    pos = (y * width + x) * 4
+
+                    output[pos + 0] = R
+                    output[pos + 1] = G
+                    output[pos + 2] = B
+                    output[pos + 3] = A
      
-        return bytes(<u8[:width * height * 4]>output)
+        return result
 
     finally:
         free(work)
-        free(output)
@@ -278,6 +278,7 @@ class ObjectItem(LevelEditorItem):
             self.data = 0
 
         self.objdata = None
+        self.tileMapRect = None
 
         self.setFlag(self.ItemIsMovable, not globals.ObjectsFrozen)
         self.setFlag(self.ItemIsSelectable, not globals.ObjectsFrozen)
@@ -309,56 +310,39 @@ class ObjectItem(LevelEditorItem):
         self.UpdateTooltip()
 
     def UpdateSearchDatabase(self):
-        y = 0
-
-        self.RemoveFromSearchDatabase()
-
+        """
+        Registers the tiles of this object in the quick paint search index
+        """
         import quickpaint
-
-        quickpaint.QuickPaintOperations.object_search_database[self] = []
-        if self.width == 1 and self.height == 1:
-            if not quickpaint.QuickPaintOperations.object_search_database.get((self.objx, self.objy, self.layer)):
-                quickpaint.QuickPaintOperations.object_search_database[self.objx, self.objy, self.layer] = []
-
-            if self not in quickpaint.QuickPaintOperations.object_search_database[(self.objx, self.objy, self.layer)]:
-                quickpaint.QuickPaintOperations.object_search_database[(self.objx, self.objy, self.layer)].append(self)
-                quickpaint.QuickPaintOperations.object_search_database[self].append((self.objx, self.objy, self.layer))
-
-        elif self.objdata:
-            for row in self.objdata:
-                x = 0
-                for tile in row:
-                    if tile != -1:
-                        if not quickpaint.QuickPaintOperations.object_search_database.get(
-                                (self.objx + x, self.objy + y, self.layer)):
-                            quickpaint.QuickPaintOperations.object_search_database[
-                                self.objx + x, self.objy + y, self.layer] = []
-
-                        if self not in quickpaint.QuickPaintOperations.object_search_database[
-                            (self.objx + x, self.objy + y, self.layer)]:
-                            quickpaint.QuickPaintOperations.object_search_database[
-                                (self.objx + x, self.objy + y, self.layer)].append(self)
-                            quickpaint.QuickPaintOperations.object_search_database[self].append(
-                                (self.objx + x, self.objy + y, self.layer))
-
-                    x += 1
-
-                y += 1
-
+        quickpaint.QuickPaintOperations.object_search_database.insert(self)
         del quickpaint
 
     def RemoveFromSearchDatabase(self):
+        """
+        Removes this object from the quick paint search index
+        """
         import quickpaint
+        quickpaint.QuickPaintOperations.object_search_database.remove(self)
+        del quickpaint
 
-        if self in quickpaint.QuickPaintOperations.object_search_database:
-            for t in quickpaint.QuickPaintOperations.object_search_database[self]:
-                if (quickpaint.QuickPaintOperations.object_search_database.get(t)
-                    and self in quickpaint.QuickPaintOperations.object_search_database[t]):
-                    quickpaint.QuickPaintOperations.object_search_database[t].remove(self)
+    def UpdateTileMap(self):
+        """
+        Marks the cells this object covered and now covers as outdated
+        """
+        tilemaps = getattr(globals.Area, 'tilemaps', None)
+        if tilemaps is None:
+            return
 
-            del quickpaint.QuickPaintOperations.object_search_database[self]
+        if self.tileMapRect is not None:
+            layer, x, y, width, height = self.tileMapRect
+            tilemaps[layer].invalidate(x, y, width, height)
 
-        del quickpaint
+        if 0 <= self.layer <= 2:
+            self.tileMapRect = (self.layer, self.objx, self.objy, self.width, self.height)
+            tilemaps[self.layer].invalidate(self.objx, self.objy, self.width, self.height)
+
+        else:
+            self.tileMapRect = None
 
     def SetType(self, tileset, type):
         """
@@ -386,6 +370,7 @@ class ObjectItem(LevelEditorItem):
         self.objdata = RenderObject(self.tileset, self.type, self.width, self.height)
         self.randomise()
         self.UpdateSearchDatabase()
+        self.UpdateTileMap()
  
     def randomise(self, startx=0, starty=0, width=None, height=None):
         """
@@ -518,6 +503,7 @@ class ObjectItem(LevelEditorItem):
             self.randomise(self.width, 0, width - self.width, height)
 
         self.UpdateSearchDatabase()
+        self.UpdateTileMap()
 
     def UpdateRects(self):
         """
@@ -586,6 +572,7 @@ class ObjectItem(LevelEditorItem):
                 self.objx = x
                 self.objy = y
                 self.UpdateSearchDatabase()
+                self.UpdateTileMap()
                 if self.positionChanged is not None:
                     self.positionChanged(self, oldx, oldy, x, y)
 
@@ -600,6 +587,9 @@ class ObjectItem(LevelEditorItem):
 
             return newpos
 
+        elif change == QtWidgets.QGraphicsItem.ItemSceneHasChanged:
+            self.UpdateTileMap()
+
         return QtWidgets.QGraphicsItem.itemChange(self, change, value)
 
     def paint(self, painter, option, widget):
@@ -1886,8 +1876,11 @@ class SpriteItem(LevelEditorItem):
         self.resetTransform()
 
         if (self.type in globals.gamedef.getImageClasses()) and (self.type not in SLib.SpriteImagesLoaded):
-            globals.gamedef.getImageClasses()[self.type].loadImages()
-            SLib.SpriteImagesLoaded.add(self.type)
+            if SLib.queueSpriteImages(self.type):
+                # Draw the spritebox until the images are loaded
+                obj = None
+            else:
+                SLib.loadSpriteImages(self.type)
 
         self.ImageObj = obj(self) if obj else SLib.SpriteImage(self)
 
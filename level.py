@@ -30,7 +30,11 @@
 import os
 from xml.etree import ElementTree as etree
 
+from bytes import bytes_to_string
+import gamedefcache
 import globals
+import loadprofile
+import resourcestore
 import SarcLib
 import spritelib as SLib
 from tileset import CreateTilesets, SaveTileset
@@ -38,6 +42,63 @@ from tileset import CreateTilesets, SaveTileset
 #################################
 
 
+def FindInnerLevel(arc, data, path):
+    """
+    Finds the level file inside a level archive.
+    Returns its data and name, the archive itself (with an empty name)
+    if the course files are not nested, or (None, '') if there is no level.
+    """
+    def exists(fn):
+        try:
+            arc[fn]
+
+        except KeyError:
+            return False
+
+        return True
+
+    def guessInnerName():
+        basename = os.path.basename(path)
+
+        possibilities = []
+        possibilities.append(basename)
+        possibilities.append(basename.split(' ')[-1])  # for names like "NSMBU 1-1.szs"
+        possibilities.append(basename.split(' ')[0])  # for names like "1-1 test.szs"
+        possibilities.append(basename.split('.')[0])
+        possibilities.append(basename.split('_')[0])
+
+        for fn in possibilities:
+            if exists(fn):
+                return arc[fn].data, fn
+
+        return None, ''
+
+    if exists('levelname'):
+        fn = bytes_to_string(arc['levelname'].data)
+        if exists(fn):
+            return arc[fn].data, fn
+
+    levelFileData, levelname = guessInnerName()
+    if not levelFileData and exists('course'):
+        return data, ''
+
+    return levelFileData, levelname
+
+
+def _CompileSpriteResources(path):
+    """
+    Compiles a spriteresources XML file for the gamedef cache
+    """
+    root = etree.parse(path).getroot()
+
+    # Get all sprites' filenames and add them to a list
+    resources = []
+    for sprite in root.iter('sprite'):
+        resources.append((int(sprite.get('id')), [id2.get('name') for id2 in sprite]))
+
+    return resources
+
+
 class AbstractLevel:
     """
     Class for an abstract level from any game. Defines the API.
@@ -78,11 +139,16 @@ class Level_NSMBU(AbstractLevel):
     Class for a level from New Super Mario Bros. U
     """
 
-    def __init__(self):
+    def __init__(self, headless=False):
         """
-        Initializes the level with default settings
+        Initializes the level with default settings.
+        A headless level creates no tiles or items, so it can be used
+        without a QApplication, as long as no area is opened.
         """
         super().__init__()
+        if headless:
+            return
+
         CreateTilesets()
 
         import area
@@ -157,6 +223,7 @@ class Level_NSMBU(AbstractLevel):
             L1 = areaData[thisArea][2]
             L2 = areaData[thisArea][3]
 
+            # Only the current area is parsed, the others keep their raw files
             import area
             if thisArea == areaNum:
                 newarea = area.Area_NSMBU()
@@ -166,7 +233,9 @@ class Level_NSMBU(AbstractLevel):
                 newarea = area.AbstractArea()
 
             newarea.areanum = thisArea
+            loadprofile.Begin('Area %d' % thisArea, parsed=thisArea == areaNum)
             newarea.load(course, L0, L1, L2, progress)
+            loadprofile.End()
             self.areas.append(newarea)
 
             thisArea += 1
@@ -224,40 +293,21 @@ class Level_NSMBU(AbstractLevel):
                 if path:
                     paths.append(os.path.join(globals.miyamoto_path, path if isinstance(path, str) else path.path))
 
+            # Read the sprites resources xmls, compiled in the gamedef cache
             sprites_xml = {}
-            for path in paths:
-                # Read the sprites resources xml
-                tree = etree.parse(path)
-                root = tree.getroot()
-
-                # Get all sprites' filenames and add them to a list
-                for sprite in root.iter('sprite'):
-                    id = int(sprite.get('id'))
-
-                    name = []
-                    for id2 in sprite:
-                        name.append(id2.get('name'))
-
-                    sprites_xml[id] = list(name)
+            for resources in gamedefcache.LoadCompiled('spriteresources', paths, _CompileSpriteResources):
+                for id, name in resources:
+                    sprites_xml[id] = name
 
             # Look up every sprite and tileset used in each area
             sprites_SARC = []
             tilesets_names = []
             for area_SARC in globals.Level.areas:
-                for sprite in area_SARC.sprites:
-                    sprites_SARC.append(sprite.type)
-
-                if area_SARC.tileset0 not in ('', None):
-                    tilesets_names.append(area_SARC.tileset0)
+                sprites_SARC.extend(area_SARC.UsedSpriteTypes())
 
-                if area_SARC.tileset1 not in ('', None):
-                    tilesets_names.append(area_SARC.tileset1)
-
-                if area_SARC.tileset2 not in ('', None):
-                    tilesets_names.append(area_SARC.tileset2)
-
-                if area_SARC.tileset3 not in ('', None):
-                    tilesets_names.append(area_SARC.tileset3)
+                for tileset_name in area_SARC.UsedTilesets():
+                    if tileset_name not in ('', None):
+                        tilesets_names.append(tileset_name)
 
             sprites_SARC = list(set(sprites_SARC))
             tilesets_names = list(set(tilesets_names))
@@ -275,29 +325,23 @@ class Level_NSMBU(AbstractLevel):
             for sprite_name in sprites_names:
                 # Get it from inside the original archive
                 if not globals.OverwriteSprite and sprite_name in globals.szsData:
-                    newArchive.addFile(SarcLib.File(sprite_name, globals.szsData[sprite_name]))
-                    szsNewData[sprite_name] = globals.szsData[sprite_name]
-
-                # Get it from the "custom" data folder
-                elif os.path.isfile(globals.miyamoto_path + '/data/custom/' + sprite_name):
-                    with open(globals.miyamoto_path + '/data/custom/' + sprite_name, 'rb') as f:
-                        f1 = f.read()
-
-                    newArchive.addFile(SarcLib.File(sprite_name, f1))
-                    szsNewData[sprite_name] = f1
-
-                # Get it from the data folder
-                elif os.path.isfile(globals.miyamoto_path + '/data/' + sprite_name):
-                    with open(globals.miyamoto_path + '/data/' + sprite_name, 'rb') as f:
-                        f1 = f.read()
+                    f1 = resourcestore.Intern(globals.szsData[sprite_name])
 
-                    newArchive.addFile(SarcLib.File(sprite_name, f1))
-                    szsNewData[sprite_name] = f1
+                # Get it from the "custom" data folder, or from the data folder.
+                # The files are only read again if they changed since the last save.
+                else:
+                    f1 = resourcestore.ReadResource(globals.miyamoto_path + '/data/custom/' + sprite_name)
+                    if f1 is None:
+                        f1 = resourcestore.ReadResource(globals.miyamoto_path + '/data/' + sprite_name)
 
                 # Throw a warning because the file was not found...
-                else:
+                if f1 is None:
                     print("WARNING: Could not find the file: %s" % sprite_name)
                     print("Expect the level to crash ingame...")
+                    continue
+
+                newArchive.addFile(SarcLib.File(sprite_name, f1))
+                szsNewData[sprite_name] = f1
 
             # Add each tileset to our archive
             for tileset_name in tilesets_names:
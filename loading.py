@@ -27,21 +27,27 @@
 
 ############ Imports ############
 
+from concurrent.futures import ThreadPoolExecutor
+import os
 from PyQt5 import QtGui, QtWidgets
 import struct
 from xml.etree import ElementTree as etree
 
+import gamedefcache
 import globals
+import loadprofile
+import spritebundle
 import spritelib as SLib
 from gamedefs import MiyamotoGameDefinition, GetPath
 from misc import SpriteDefinition, BGName, setting, setSetting
 import SarcLib
 from strings import MiyamotoTranslation
 
-from tileset import TilesetTile, ObjectDef
+from tileset import AtlasTile, TilesetTile, ObjectDef
 from tileset import loadGTX, ProcessOverrides
 from tileset import CascadeTilesetNames_Category
 from tileset import SortTilesetNames_Category
+from tilesetcache import TilesetCacheKey, LoadCachedTileset, StoreCachedTilesetLater
 
 from ui import MiyamotoTheme
 
@@ -84,17 +90,19 @@ def LoadLevelNames():
 
     globals.LevelNames = []
 
-    for path in paths:
-        # Parse the file
-        tree = etree.parse( path )
-        root = tree.getroot()
-
-        # Parse the nodes (root acts like a large category)
-        patchLevelNames = LoadLevelNames_Category(root)
+    for patchLevelNames in gamedefcache.LoadCompiled('levelnames', paths, _CompileLevelNames):
         LoadLevelNames_ReplaceCategory(globals.LevelNames, patchLevelNames)
         LoadLevelNames_AddMissingCategories(globals.LevelNames, patchLevelNames)
 
 
+def _CompileLevelNames(path):
+    """
+    Compiles a levelnames XML file for the gamedef cache
+    """
+    # Parse the nodes (root acts like a large category)
+    return LoadLevelNames_Category(etree.parse(path).getroot())
+
+
 def LoadLevelNames_ReplaceCategory(node, node_patch):
     for child in node:
         for child_patch in node_patch:
@@ -154,23 +162,14 @@ def LoadTilesetNames(reload_=False):
 
     # Read each file
     globals.TilesetNames = [[[], False], [[], False], [[], False], [[], False]]
-    for path in paths:
-        tree = etree.parse(path)
-        root = tree.getroot()
+    for slots in gamedefcache.LoadCompiled('tilesets', paths, _CompileTilesetNames):
 
         # Go through each slot
-        for node in root:
-            if node.tag.lower() != 'slot': continue
-            try:
-                slot = int(node.attrib['num'])
-            except ValueError:
-                continue
-            if slot > 3: continue
-
+        for slot, sorted_, cat in slots:
             # Parse the category data into a list
-            newlist = [LoadTilesetNames_Category(node), ]
-            if 'sorted' in node.attrib:
-                newlist.append(node.attrib['sorted'].lower() == 'true')
+            newlist = [_TilesetNames_Category(cat), ]
+            if sorted_ is not None:
+                newlist.append(sorted_)
             else:
                 newlist.append(globals.TilesetNames[slot][1])  # inherit
 
@@ -184,6 +183,37 @@ def LoadTilesetNames(reload_=False):
             globals.TilesetNames[slot] = newlist
 
 
+def _CompileTilesetNames(path):
+    """
+    Compiles a tilesets XML file for the gamedef cache
+    """
+    root = etree.parse(path).getroot()
+    slots = []
+
+    for node in root:
+        if node.tag.lower() != 'slot': continue
+        try:
+            slot = int(node.attrib['num'])
+        except ValueError:
+            continue
+        if slot > 3: continue
+
+        sorted_ = node.attrib['sorted'].lower() == 'true' if 'sorted' in node.attrib else None
+        slots.append((slot, sorted_, LoadTilesetNames_Category(node)))
+
+    return slots
+
+
+def _TilesetNames_Category(cat):
+    """
+    Turns the tileset entries of a cached category back into tuples
+    """
+    return [
+        [item[0], _TilesetNames_Category(item[1]), item[2]] if isinstance(item[1], list) else tuple(item)
+        for item in cat
+    ]
+
+
 def LoadTilesetNames_Category(node):
     """
     Loads a TilesetNames XML category
@@ -229,6 +259,34 @@ def LoadObjDescriptions(reload_=False):
             globals.ObjDesc[int(w[0])] = w[1]
 
 
+def _CompileSpriteData(path):
+    """
+    Compiles a spritedata XML file for the gamedef cache
+    """
+    root = etree.parse(path).getroot()
+    sprites = []
+
+    for sprite in root:
+        if sprite.tag.lower() != 'sprite':
+            continue
+
+        try:
+            spriteid = int(sprite.attrib['id'])
+        except ValueError:
+            continue
+
+        fields = []
+        try:
+            SpriteDefinition.parseFields(sprite, fields)
+            error = None
+        except Exception as e:
+            error = str(e)
+
+        sprites.append((spriteid, sprite.attrib['name'], sprite.attrib.get('notes'), sprite.attrib.get('files'), fields, error))
+
+    return sprites
+
+
 def LoadSpriteData():
     """
     Ensures that the sprite data info is loaded
@@ -236,69 +294,49 @@ def LoadSpriteData():
     errors = []
     errortext = []
 
-    spriteIds = [-1]
-
     # It works this way so that it can overwrite settings based on order of precedence
     paths = [(globals.trans.files['spritedata'], None)]
     for pathtuple in globals.gamedef.multipleRecursiveFiles('spritedata', 'spritenames'):
         paths.append(pathtuple)
 
+    # Each XML file is parsed once, or not at all if it's cached
+    xmlPaths = []
     for sdpath, snpath in paths:
-
-        # Add XML sprite data, if there is any
         if sdpath not in (None, ''):
-            path = sdpath if isinstance(sdpath, str) else sdpath.path
-            tree = etree.parse(path)
-            root = tree.getroot()
+            xmlPaths.append(sdpath if isinstance(sdpath, str) else sdpath.path)
 
-            for sprite in root:
-                if sprite.tag.lower() != 'sprite':
-                    continue
+    compiled = gamedefcache.LoadCompiled('spritedata', xmlPaths, _CompileSpriteData)
 
-                try:
-                    spriteIds.append(int(sprite.attrib['id']))
-                except ValueError:
-                    continue
+    spriteIds = [-1]
+    for sprites in compiled:
+        spriteIds.extend(sprite[0] for sprite in sprites)
 
     globals.NumSprites = max(spriteIds) + 1
     globals.Sprites = [None] * globals.NumSprites
 
+    compiled = iter(compiled)
     for sdpath, snpath in paths:
 
         # Add XML sprite data, if there is any
         if sdpath not in (None, ''):
-            path = sdpath if isinstance(sdpath, str) else sdpath.path
-            tree = etree.parse(path)
-            root = tree.getroot()
-
-            for sprite in root:
-                if sprite.tag.lower() != 'sprite':
-                    continue
-
-                try:
-                    spriteid = int(sprite.attrib['id'])
-                except ValueError:
-                    continue
-
-                spritename = sprite.attrib['name']
-                notes = None
-                relatedObjFiles = None
+            for spriteid, spritename, notes, files, fields, error in next(compiled):
+                if notes is not None:
+                    notes = globals.trans.string('SpriteDataEditor', 2, '[notes]', notes)
 
-                if 'notes' in sprite.attrib:
-                    notes = globals.trans.string('SpriteDataEditor', 2, '[notes]', sprite.attrib['notes'])
-
-                if 'files' in sprite.attrib:
-                    relatedObjFiles = globals.trans.string('SpriteDataEditor', 8, '[list]',
-                                                   sprite.attrib['files'].replace(';', '<br>'))
+                if files is not None:
+                    files = globals.trans.string('SpriteDataEditor', 8, '[list]', files.replace(';', '<br>'))
 
                 sdef = SpriteDefinition()
                 sdef.id = spriteid
                 sdef.name = spritename
                 sdef.notes = notes
-                sdef.relatedObjFiles = relatedObjFiles
+                sdef.relatedObjFiles = files
 
                 try:
-                    sdef.loadFrom(sprite)
+                    sdef.loadFields(fields)
+                    if error is not None:
+                        raise Exception(error)
+
                 except Exception as e:
                     errors.append(str(spriteid))
                     errortext.append(str(e))
@@ -334,6 +372,38 @@ def LoadSpriteData():
         QtWidgets.QMessageBox.warning(None, globals.trans.string('Err_BrokenSpriteData', 2), repr(errortext))
 
 
+def _CompileSpriteCategories(path):
+    """
+    Compiles a spritecategories XML file for the gamedef cache
+    """
+    root = etree.parse(path).getroot()
+    views = []
+
+    for view in root:
+        if view.tag.lower() != 'view': continue
+
+        categories = []
+        for category in view:
+            if category.tag.lower() != 'category': continue
+
+            sprites = []
+            for attach in category:
+                if attach.tag.lower() != 'attach': continue
+
+                sprite = attach.attrib['sprite']
+                if '-' not in sprite:
+                    sprites.append(int(sprite))
+                else:
+                    x = sprite.split('-')
+                    sprites.extend(range(int(x[0]), int(x[1]) + 1))
+
+            categories.append((category.attrib['name'], sprites))
+
+        views.append((view.attrib['name'], categories))
+
+    return views
+
+
 def LoadSpriteCategories(reload_=False):
     """
     Ensures that the sprite category info is loaded
@@ -353,15 +423,9 @@ def LoadSpriteCategories(reload_=False):
     globals.SpriteCategories.append((globals.trans.string('Sprites', 19), [(globals.trans.string('Sprites', 16), list(range(globals.NumSprites)))], []))
     globals.SpriteCategories[-1][1][0][1].append(9999)  # 'no results' special case
 
-    for path in paths:
-        tree = etree.parse(path)
-        root = tree.getroot()
-
+    for views in gamedefcache.LoadCompiled('spritecategories', paths, _CompileSpriteCategories):
         CurrentView = None
-        for view in root:
-            if view.tag.lower() != 'view': continue
-
-            viewname = view.attrib['name']
+        for viewname, categories in views:
 
             # See if it's in there already
             CurrentView = []
@@ -370,10 +434,7 @@ def LoadSpriteCategories(reload_=False):
             if CurrentView == []: globals.SpriteCategories.append((viewname, CurrentView, []))
 
             CurrentCategory = None
-            for category in view:
-                if category.tag.lower() != 'category': continue
-
-                catname = category.attrib['name']
+            for catname, sprites in categories:
 
                 # See if it's in there already
                 CurrentCategory = []
@@ -381,18 +442,9 @@ def LoadSpriteCategories(reload_=False):
                     if potentialcat[0] == catname: CurrentCategory = potentialcat[1]
                 if CurrentCategory == []: CurrentView.append((catname, CurrentCategory))
 
-                for attach in category:
-                    if attach.tag.lower() != 'attach': continue
-
-                    sprite = attach.attrib['sprite']
-                    if '-' not in sprite:
-                        if int(sprite) not in CurrentCategory:
-                            CurrentCategory.append(int(sprite))
-                    else:
-                        x = sprite.split('-')
-                        for i in range(int(x[0]), int(x[1]) + 1):
-                            if i not in CurrentCategory:
-                                CurrentCategory.append(i)
+                for i in sprites:
+                    if i not in CurrentCategory:
+                        CurrentCategory.append(i)
 
 
 def LoadSpriteListData(reload_=False):
@@ -460,85 +512,167 @@ def LoadEntranceNames(reload_=False):
         idx += 1
 
 
-def _LoadTileset(idx, name):
-    """
-    Load in a tileset into a specific slot
-    """
+# Animated textures that can be found in the Pa0 tilesets,
+# and whether they have to be decoded with AddrLib
+TilesetAnimations = (
+    ('hatena_anime', False),
+    ('block_anime', False),
+    ('tuka_coin_anime', False),
+    ('belt_conveyor_anime', True),
+)
 
-    # if this file's not found, return
-    if name not in globals.szsData: return
 
-    sarcdata = globals.szsData[name]
+def _ReadTilesetArchive(idx, name, sarcdata):
+    """
+    Parses a tileset archive and returns the files needed to load it,
+    or None if the tileset is corrupted.
+    Safe to run in a worker thread.
+    """
     sarc = SarcLib.SARC_Archive()
     sarc.load(sarcdata)
 
-    # Decompress the textures
     try:
-        comptiledata = sarc['BG_tex/%s.gtx' % name].data
-        nmldata = sarc['BG_tex/%s_nml.gtx' % name].data
-        colldata = sarc['BG_chk/d_bgchk_%s.bin' % name].data
+        files = {
+            'tex': sarc['BG_tex/%s.gtx' % name].data,
+            'nml': sarc['BG_tex/%s_nml.gtx' % name].data,
+            'chk': sarc['BG_chk/d_bgchk_%s.bin' % name].data,
+        }
 
     except KeyError:
-        QtWidgets.QMessageBox.warning(
-            None, globals.trans.string('Err_CorruptedTilesetData', 0),
-            globals.trans.string('Err_CorruptedTilesetData', 1, '[file]', name),
-        )
+        return None
 
-        return False
+    files['hd'] = sarc['BG_unt/%s_hd.bin' % name].data
+    files['unt'] = sarc['BG_unt/%s.bin' % name].data
 
-    # load in the textures
-    img = loadGTX(comptiledata)
-    nml = loadGTX(nmldata)
+    anime = {}
+    if idx == 0:
+        for animName, _ in TilesetAnimations:
+            try:
+                anime[animName] = sarc['BG_tex/%s.gtx' % animName].data
 
-    # Divide it into individual tiles and
-    # add collisions at the same time
-    def getTileFromImage(tilemap, xtilenum, ytilenum):
-        return tilemap.copy((xtilenum * 64) + 2, (ytilenum * 64) + 2, 60, 60)
+            except KeyError:
+                pass
 
-    dest = QtGui.QPixmap.fromImage(img)
-    dest2 = QtGui.QPixmap.fromImage(nml)
-    sourcex = 0
-    sourcey = 0
-    tileoffset = idx * 256
-    for i in range(tileoffset, tileoffset + 256):
-        T = TilesetTile(getTileFromImage(dest, sourcex, sourcey), getTileFromImage(dest2, sourcex, sourcey))
-        T.setCollisions(struct.unpack_from('<Q', colldata, (i - tileoffset) * 8)[0])
-        globals.Tiles[i] = T
-        sourcex += 1
-        if sourcex >= 32:
-            sourcex = 0
-            sourcey += 1
+    files['anime'] = anime
+    return files
 
-    # Load the tileset animations, if there are any
-    if idx == 0:
-        hatena_anime = None
-        block_anime = None
-        tuka_coin_anime = None
-        belt_conveyor_anime = None
 
-        try:
-            hatena_anime = loadGTX(sarc['BG_tex/hatena_anime.gtx'].data)
+def _LookUpCachedTileset(idx, key):
+    """
+    Looks up a tileset in the decoded tileset cache
+    """
+    with loadprofile.Phase('Tileset cache lookup', slot=idx):
+        return LoadCachedTileset(key)
 
-        except:
-            pass
 
-        try:
-            block_anime = loadGTX(sarc['BG_tex/block_anime.gtx'].data)
+def _ParseTilesetArchive(idx, name, sarcdata):
+    """
+    Parses a tileset archive, see _ReadTilesetArchive()
+    """
+    with loadprofile.Phase('Tileset SARC parse', slot=idx):
+        return _ReadTilesetArchive(idx, name, sarcdata)
 
-        except:
-            pass
 
-        try:
-            tuka_coin_anime = loadGTX(sarc['BG_tex/tuka_coin_anime.gtx'].data)
+def _DecodeGTX(idx, texture, data, useAddrLib=False):
+    """
+    Decodes a texture of a tileset
+    """
+    with loadprofile.Phase('GTX decode', slot=idx, texture=texture):
+        return loadGTX(data, useAddrLib)
 
-        except:
-            pass
 
-        try:
-            belt_conveyor_anime = loadGTX(sarc['BG_tex/belt_conveyor_anime.gtx'].data, True)
+def _DecodeTilesets(tilesets):
+    """
+    Parses the archives and decodes the textures of several tilesets
+    concurrently. Returns a list of (idx, name, files, img, nml, anime).
+    Tilesets found in the decoded tileset cache skip decoding entirely.
+    """
+    results = [None] * len(tilesets)
+    jobs = []
+    decoded = []
+    with ThreadPoolExecutor(max_workers=max(1, os.cpu_count() or 1)) as pool:
+        keys = [TilesetCacheKey(idx, name, globals.szsData[name]) for idx, name in tilesets]
+        cached = [pool.submit(_LookUpCachedTileset, idx, key) for (idx, _), key in zip(tilesets, keys)]
+
+        archives = []
+        for i, ((idx, name), key, entry) in enumerate(zip(tilesets, keys, cached)):
+            entry = entry.result()
+            if entry is not None:
+                results[i] = (idx, name) + entry
+
+            else:
+                archives.append((i, key, pool.submit(_ParseTilesetArchive, idx, name, globals.szsData[name])))
+
+        for i, key, archive in archives:
+            idx, name = tilesets[i]
+            files = archive.result()
+            if files is None:
+                results[i] = (idx, name, None, None, None, None)
+                continue
+
+            anime = {}
+            for animName, useAddrLib in TilesetAnimations:
+                if animName in files['anime']:
+                    anime[animName] = pool.submit(_DecodeGTX, idx, animName, files['anime'][animName], useAddrLib)
+
+            jobs.append((i, key, files, pool.submit(_DecodeGTX, idx, 'tex', files['tex']),
+                         pool.submit(_DecodeGTX, idx, 'nml', files['nml']), anime))
+
+        for i, key, files, img, nml, anime in jobs:
+            idx, name = tilesets[i]
+
+            animImgs = {}
+            for animName, future in anime.items():
+                try:
+                    animImgs[animName] = future.result()
+
+                except:
+                    pass
 
-        except:
-            pass
+            results[i] = (idx, name, files, img.result(), nml.result(), animImgs)
+            decoded.append((key, files, results[i][3], results[i][4], animImgs))
+
+    # Cache the decoded tilesets without waiting for them to be written
+    for key, files, img, nml, anime in decoded:
+        StoreCachedTilesetLater(key, files, img, nml, anime)
+
+    return results
+
+
+def _LoadTileset(idx, name, files, img, nml, anime):
+    """
+    Load in a decoded tileset into a specific slot
+    """
+    if files is None:
+        QtWidgets.QMessageBox.warning(
+            None, globals.trans.string('Err_CorruptedTilesetData', 0),
+            globals.trans.string('Err_CorruptedTilesetData', 1, '[file]', name),
+        )
+
+        return False
+
+    colldata = files['chk']
+
+    # Divide it into individual tiles and
+    # add collisions at the same time.
+    # The tiles stay views into the decoded textures until they are drawn.
+    loadprofile.Begin('Tile slicing', slot=idx)
+    tileoffset = idx * 256
+    for i in range(256):
+        x = (i % 32) * 64 + 2
+        y = (i // 32) * 64 + 2
+
+        T = TilesetTile(AtlasTile(img, x, y), AtlasTile(nml, x, y))
+        T.setCollisions(struct.unpack_from('<Q', colldata, i * 8)[0])
+        globals.Tiles[tileoffset + i] = T
+    loadprofile.End()
+
+    # Load the tileset animations, if there are any
+    if idx == 0:
+        hatena_anime = anime.get('hatena_anime')
+        block_anime = anime.get('block_anime')
+        tuka_coin_anime = anime.get('tuka_coin_anime')
+        belt_conveyor_anime = anime.get('belt_conveyor_anime')
 
         for i in range(256):
             if globals.Tiles[i].coreType == 7:
@@ -586,8 +720,8 @@ def _LoadTileset(idx, name):
     # Load the object definitions
     defs = [None] * 256
 
-    indexfile = sarc['BG_unt/%s_hd.bin' % name].data
-    deffile = sarc['BG_unt/%s.bin' % name].data
+    indexfile = files['hd']
+    deffile = files['unt']
     objcount = len(indexfile) // 6
     indexstruct = struct.Struct('>HBBH')
 
@@ -605,8 +739,30 @@ def _LoadTileset(idx, name):
     ProcessOverrides(name)
 
 
+def LoadTilesets(tilesets):
+    """
+    Load in the tilesets of several slots at once.
+    tilesets: list of (slot, name)
+    The archives are parsed and the textures decoded in a worker pool;
+    only the conversion to pixmaps runs on the GUI thread.
+    """
+    # if a file's not found, skip it
+    tilesets = [(idx, name) for idx, name in tilesets if name in globals.szsData]
+    if not tilesets: return
+
+    with loadprofile.Phase('Decode tilesets', count=len(tilesets)):
+        decodedTilesets = _DecodeTilesets(tilesets)
+
+    for decoded in decodedTilesets:
+        with loadprofile.Phase('Load tileset', slot=decoded[0], tileset=decoded[1]):
+            _LoadTileset(*decoded)
+
+
 def LoadTileset(idx, name, reload=False):
-    return _LoadTileset(idx, name)
+    # if this file's not found, return
+    if name not in globals.szsData: return
+
+    return _LoadTileset(*_DecodeTilesets([(idx, name)])[0])
 
 
 def LoadOverrides():
@@ -709,24 +865,25 @@ def LoadGameDef(name=None, dlg=None):
 
         SLib.ImageCache.clear()
         SLib.SpriteImagesLoaded.clear()
+        spritebundle.ClearBundles()
         SLib.loadVines()
 
+        SLib.clearImageQueue()
+
         if globals.Area is not None:
             spriteClasses = globals.gamedef.getImageClasses()
 
-            for s in globals.Area.sprites:
-                if s.type in SLib.SpriteImagesLoaded: continue
-                if s.type not in spriteClasses: continue
-
-                spriteClasses[s.type].loadImages()
-
-                SLib.SpriteImagesLoaded.add(s.type)
-
-            for s in globals.Area.sprites:
-                if s.type in spriteClasses:
-                    s.setImageObj(spriteClasses[s.type])
-                else:
-                    s.setImageObj(SLib.SpriteImage)
+            # The images are loaded in the background, starting with the
+            # sprites in the viewport
+            SLib.DeferImageLoading = True
+            try:
+                for s in globals.Area.sprites:
+                    if s.type in spriteClasses:
+                        s.setImageObj(spriteClasses[s.type])
+                    else:
+                        s.setImageObj(SLib.SpriteImage)
+            finally:
+                SLib.DeferImageLoading = False
 
             # Reload the sprite-picker text
             for spr in globals.Area.sprites:
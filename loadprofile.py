@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# loadprofile.py
+# Opt-in timing of the phases of level loading, with Chrome trace export
+
+
+################################################################
+################################################################
+
+############ Imports ############
+
+import json
+import os
+import sys
+import threading
+import time
+
+#################################
+
+
+Enabled = False
+SessionName = ''
+Events = []
+_Origin = 0.0
+_Lock = threading.Lock()
+_Local = threading.local()
+
+
+class _Phase:
+    """
+    Records the wall time and the change in allocated memory blocks of a phase.
+    The block count is process-wide, so phases running in worker threads
+    at the same time see each other's allocations.
+    """
+    __slots__ = ('name', 'cat', 'args', 'start', 'blocks')
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        args = self.args
+        args['blocks'] = sys.getallocatedblocks() - self.blocks
+
+        event = {
+            'name': self.name,
+            'cat': self.cat,
+            'ts': (self.start - _Origin) * 1000000,
+            'dur': (end - self.start) * 1000000,
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+
+        with _Lock:
+            Events.append(event)
+
+        return False
+
+
+class _NoPhase:
+    """
+    Stands in for _Phase while profiling is disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NoPhaseInstance = _NoPhase()
+
+
+def StartSession(name):
+    """
+    Forgets the previous events and starts timing a new level load
+    """
+    global SessionName, _Origin
+
+    with _Lock:
+        del Events[:]
+
+    # Phases left open by a load that failed are dropped
+    del _OpenPhases()[:]
+
+    SessionName = name
+    _Origin = time.perf_counter()
+
+
+def Phase(name, cat='load', **args):
+    """
+    Returns a context manager that times a phase of level loading.
+    Does nothing unless profiling is enabled.
+    """
+    if not Enabled:
+        return _NoPhaseInstance
+
+    return _Phase(name, cat, args)
+
+
+def _OpenPhases():
+    """
+    Returns the stack of the phases started by Begin() in this thread
+    """
+    try:
+        return _Local.phases
+
+    except AttributeError:
+        _Local.phases = []
+        return _Local.phases
+
+
+def Begin(name, cat='load', **args):
+    """
+    Starts timing a phase of level loading, like entering Phase(), without
+    wrapping the code in a with block. End() stops it.
+    A phase is not recorded if an exception skips its End().
+    """
+    phase = Phase(name, cat, **args)
+    _OpenPhases().append(phase)
+    phase.__enter__()
+
+
+def End():
+    """
+    Stops timing the phase last started by Begin() in this thread
+    """
+    phases = _OpenPhases()
+    if phases:
+        phases.pop().__exit__(None, None, None)
+
+
+def ChromeTrace():
+    """
+    Returns the events of the last session in the Chrome trace event format
+    """
+    pid = os.getpid()
+    mainThread = threading.main_thread().ident
+
+    with _Lock:
+        events = list(Events)
+
+    traceEvents = [{
+        'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': mainThread,
+        'args': {'name': 'Main thread'},
+    }]
+
+    for event in sorted(events, key=lambda event: event['ts']):
+        traceEvents.append({
+            'name': event['name'],
+            'cat': event['cat'],
+            'ph': 'X',
+            'ts': round(event['ts'], 3),
+            'dur': round(event['dur'], 3),
+            'pid': pid,
+            'tid': event['tid'],
+            'args': event['args'],
+        })
+
+    return {'traceEvents': traceEvents, 'displayTimeUnit': 'ms', 'otherData': {'level': SessionName}}
+
+
+def ExportChromeTrace(path):
+    """
+    Writes the events of the last session to a Chrome trace JSON file,
+    which can be opened in chrome://tracing or Perfetto
+    """
+    with open(path, 'w', encoding='utf-8') as out:
+        json.dump(ChromeTrace(), out)
+
+
+def EventTree():
+    """
+    Returns the events of the last session nested by thread and time,
+    as a list of (event, children) for each thread: [(tid, roots), ...].
+    The main thread comes first.
+    """
+    with _Lock:
+        events = list(Events)
+
+    threads = {}
+    for event in sorted(events, key=lambda event: (event['ts'], -event['dur'])):
+        roots, stack = threads.setdefault(event['tid'], ([], []))
+
+        # Close the phases that ended before this one started
+        while stack and stack[-1][0]['ts'] + stack[-1][0]['dur'] <= event['ts']:
+            stack.pop()
+
+        node = (event, [])
+        (stack[-1][1] if stack else roots).append(node)
+        stack.append(node)
+
+    mainThread = threading.main_thread().ident
+    return sorted(((tid, roots) for tid, (roots, _) in threads.items()), key=lambda thread: thread[0] != mainThread)
@@ -35,6 +35,7 @@ if not hasattr(QtWidgets.QGraphicsItem, 'ItemSendsGeometryChanges'):
     QtWidgets.QGraphicsItem.ItemSendsGeometryChanges = QtWidgets.QGraphicsItem.GraphicsItemFlag(0x800)
 
 import globals
+from tilemap import ChunkSize, ChunksX, ChunksY, ChunkLOD, TileChunkCache
 
 #################################
 
@@ -47,6 +48,7 @@ class LevelScene(QtWidgets.QGraphicsScene):
     def __init__(self, *args):
         super().__init__(*args)
         self.setBackgroundBrush(QtGui.QBrush(globals.theme.color('bg')))
+        self.chunkCache = TileChunkCache(globals.TileChunkCacheSize)
 
     def drawForeground(self, painter, rect):
         """
@@ -59,107 +61,47 @@ class LevelScene(QtWidgets.QGraphicsScene):
         Draws all visible tiles
         """
         super().drawBackground(painter, rect)
-        if not hasattr(globals.Area, 'layers'):
+        if not hasattr(globals.Area, 'tilemaps'):
             return
 
-        drawrect = QtCore.QRectF(rect.x() / globals.TileWidth, rect.y() / globals.TileWidth, rect.width() / globals.TileWidth + 1,
-                                 rect.height() / globals.TileWidth + 1)
-        isect = drawrect.intersects
+        tileWidth = globals.TileWidth
+        chunkWidth = ChunkSize * tileWidth
+        cx1 = max(int(rect.x() // chunkWidth), 0)
+        cy1 = max(int(rect.y() // chunkWidth), 0)
+        cx2 = min(int((rect.x() + rect.width()) // chunkWidth) + 1, ChunksX)
+        cy2 = min(int((rect.y() + rect.height()) // chunkWidth) + 1, ChunksY)
 
-        layer0 = []
-        layer1 = []
-        layer2 = []
-
-        x1 = 1024
-        y1 = 512
-        x2 = 0
-        y2 = 0
+        if cx1 >= cx2 or cy1 >= cy2:
+            return
 
-        # iterate through each object
-        funcs = [layer0.append, layer1.append, layer2.append]
+        area = globals.Area
         show = [globals.Layer0Shown, globals.Layer1Shown, globals.Layer2Shown]
-        for layer, add, process in zip(globals.Area.layers, funcs, show):
-            if not process: continue
-            for item in layer:
-                if not isect(item.LevelRect): continue
-                add(item)
-                xs = item.objx
-                xe = xs + item.width
-                ys = item.objy
-                ye = ys + item.height
-                if xs < x1: x1 = xs
-                if xe > x2: x2 = xe
-                if ys < y1: y1 = ys
-                if ye > y2: y2 = ye
-
-        width = x2 - x1
-        height = y2 - y1
-
-        objectDefinitions = globals.ObjectDefinitions
-        tiles = globals.Tiles
+        lod = ChunkLOD(painter.worldTransform().m11())
+        getChunk = self.chunkCache.get
+        drawPixmap = painter.drawPixmap
 
-        offset = 0x800
-        items = {1: 26, 2: 27, 3: 16, 4: 17, 5: 18, 6: 19,
-                 7: 20, 8: 21, 9: 22, 10: 25, 11: 23, 12: 24,
-                 14: 32, 15: 33, 16: 34, 17: 35, 18: 42, 19: 36,
-                 20: 37, 21: 38, 22: 41, 23: 39, 24: 40}
+        tiles = globals.Tiles
 
-        # create and draw the tilemaps
-        for idx, layer in (2, layer2), (1, layer1), (0, layer0):
-            if not layer:
+        # draw the visible chunks of each tilemap
+        for idx in 2, 1, 0:
+            if not show[idx]:
                 continue
 
-            tmap = [[None] * width for _ in range(height)]
-
-            for item in layer:
-                startx = item.objx - x1
-                desty = item.objy - y1
-
-                exists = True
-                try:
-                    if objectDefinitions[item.tileset] is None:
-                        exists = False
-                    elif objectDefinitions[item.tileset][item.type] is None:
-                        exists = False
-                except IndexError:
-                    exists = False
-
-                for row in item.objdata:
-                    destrow = tmap[desty]
-                    destx = startx
-                    for tile in row:
-                        # If this object has data, make sure to override it properly
-                        if tile > 0:
-                            if item.data in items:
-                                destrow[destx] = offset + items[item.data]
-                            else:
-                                destrow[destx] = tile
-                        elif not exists:
-                            destrow[destx] = -1
-                        destx += 1
-                    desty += 1
-
-            painter.save()
-            painter.translate(x1 * globals.TileWidth, y1 * globals.TileWidth)
-            drawPixmap = painter.drawPixmap
-            desty = 0
-            for row in tmap:
-                destx = 0
-                for tile in row:
-                    pix = None
-
-                    if tile == -1:
-                        # Draw unknown tiles
-                        pix = tiles[0x800].getCurrentTile()
-                    elif tile is not None:
-                        pix = tiles[tile].getCurrentTile(idx == 1)
+            tilemap = area.tilemaps[idx]
+            tilemap.flush(area.layers[idx])
+            onLayer1 = idx == 1
 
+            for cy in range(cy1, cy2):
+                for cx in range(cx1, cx2):
+                    chunk = getChunk(tilemap, idx, cx, cy, lod)
+                    pix = chunk.pixmap
                     if pix is not None:
-                        drawPixmap(destx, desty, pix)
+                        drawPixmap(QtCore.QRectF(cx * chunkWidth, cy * chunkWidth, chunkWidth, chunkWidth),
+                                   pix, QtCore.QRectF(pix.rect()))
 
-                    destx += globals.TileWidth
-                desty += globals.TileWidth
-            painter.restore()
+                    # draw the current frame of the animated tiles
+                    for x, y, tile in chunk.animCells:
+                        drawPixmap(x * tileWidth, y * tileWidth, tiles[tile].getCurrentTile(onLayer1))
 
 
 class HexSpinBox(QtWidgets.QSpinBox):
@@ -266,18 +208,23 @@ class SpriteDefinition:
         """
         Loads in all the field data from an XML node
         """
-        self.fields = []
-        fields = self.fields
+        fields = []
+        try:
+            SpriteDefinition.parseFields(elem, fields)
+        finally:
+            self.loadFields(fields)
 
+    @staticmethod
+    def parseFields(elem, fields):
+        """
+        Appends the raw field data of an XML node to fields,
+        in a form that can be stored in the gamedef cache
+        """
         for field in elem:
             if field.tag not in ['checkbox', 'list', 'value', 'bitfield']: continue
 
             attribs = field.attrib
-
-            if 'comment' in attribs:
-                comment = globals.trans.string('SpriteDataEditor', 1, '[name]', attribs['title'], '[note]', attribs['comment'])
-            else:
-                comment = None
+            comment = attribs.get('comment')
 
             if field.tag == 'checkbox':
                 # parameters: title, bit, mask, comment
@@ -312,7 +259,7 @@ class SpriteDefinition:
                 fields.append((0, attribs['title'], bit, mask, comment))
 
             elif field.tag == 'list':
-                # parameters: title, bit, model, comment
+                # parameters: title, bit, entries, max, comment
                 if 'nybble' in attribs:
                     sbit = attribs['nybble']
                     sft = 2
@@ -339,16 +286,16 @@ class SpriteDefinition:
                     max = 1 << (bit[1] - bit[0])
 
                 entries = []
-                existing = [None for i in range(max)]
                 for e in field:
                     if e.tag != 'entry': continue
 
                     i = int(e.attrib['value'])
+                    if i >= max:
+                        raise IndexError('list index out of range')
+
                     entries.append((i, e.text))
-                    existing[i] = True
 
-                fields.append(
-                    (1, attribs['title'], bit, SpriteDefinition.ListPropertyModel(entries, existing, max), comment))
+                fields.append((1, attribs['title'], bit, entries, max, comment))
 
             elif field.tag == 'value':
                 # parameters: title, bit, max, comment
@@ -386,6 +333,36 @@ class SpriteDefinition:
 
                 fields.append((3, attribs['title'], startbit, bitnum, comment))
 
+    def loadFields(self, fields):
+        """
+        Loads in the field data returned by parseFields
+        """
+        self.fields = []
+
+        for field in fields:
+            kind, title, bit = field[:3]
+            comment = field[-1]
+
+            if comment is not None:
+                comment = globals.trans.string('SpriteDataEditor', 1, '[name]', title, '[note]', comment)
+
+            if isinstance(bit, list):
+                bit = tuple(bit)
+
+            if kind == 1:
+                entries, max = field[3:5]
+                entries = [tuple(entry) for entry in entries]
+
+                existing = [None for i in range(max)]
+                for i, _ in entries:
+                    existing[i] = True
+
+                self.fields.append(
+                    (1, title, bit, SpriteDefinition.ListPropertyModel(entries, existing, max), comment))
+
+            else:
+                self.fields.append((kind, title, bit, field[3], comment))
+
 
 class Metadata:
     """
@@ -105,6 +105,7 @@ from dialogs import *
 from gamedefs import *
 from items import *
 from level import *
+import loadprofile
 from loading import *
 from misc import *
 from puzzle import MainWindow as PuzzleWindow
@@ -1097,6 +1098,22 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
         act.setStatusTip(globals.trans.string('MenuItems', 95))
         self.vmenu.addAction(act)
 
+        # level load profile
+        dock = QtWidgets.QDockWidget(globals.trans.string('MenuItems', 152), self)
+        dock.setFeatures(
+            QtWidgets.QDockWidget.DockWidgetMovable | QtWidgets.QDockWidget.DockWidgetFloatable | QtWidgets.QDockWidget.DockWidgetClosable)
+        dock.setObjectName('loadprofile')  # needed for the state to save/restore correctly
+
+        self.loadProfile = LoadProfileWidget()
+        self.loadProfileDock = dock
+        dock.setWidget(self.loadProfile)
+
+        self.addDockWidget(Qt.RightDockWidgetArea, dock)
+        dock.setVisible(False)
+        act = dock.toggleViewAction()
+        act.setStatusTip(globals.trans.string('MenuItems', 153))
+        self.vmenu.addAction(act)
+
         # quick paint configuration
         dock = QtWidgets.QDockWidget(globals.trans.string('MenuItems', 136), self)
         dock.setFeatures(
@@ -2325,6 +2342,7 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
             obj.setZValue(newZ)
 
             layer.append(obj)
+            obj.UpdateTileMap()
 
         if numObjs:
             SetDirty()
@@ -2353,6 +2371,7 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
                 oObj.setZValue(oObj.zValue() + 1)
 
             layer.insert(0, obj)
+            obj.UpdateTileMap()
 
         if numObjs:
             SetDirty()
@@ -2790,6 +2809,10 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
         globals.CompLevel = int(dlg.generalTab.compLevel.currentIndex())
         setSetting('CompLevel', globals.CompLevel)
 
+        # Get the tileset texture quality
+        globals.BC3Quality = int(dlg.generalTab.bc3Quality.currentIndex())
+        setSetting('BC3Quality', globals.BC3Quality)
+
         # Determine the Embedded tab type
         globals.isEmbeddedSeparate = dlg.generalTab.separate.isChecked()
         setSetting('isEmbeddedSeparate', globals.isEmbeddedSeparate)
@@ -2800,6 +2823,11 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
         if SLib.RotationTimer.isActive():
             SLib.RotationTimer.setInterval(round(1000 / SLib.RotationFPS))
 
+        # Get the level view chunk cache budget
+        globals.TileChunkCacheSize = dlg.generalTab.chunkCacheSize.value()
+        setSetting('TileChunkCacheSize', globals.TileChunkCacheSize)
+        self.scene.chunkCache.setBudget(globals.TileChunkCacheSize)
+
         # Get the Toolbar tab settings
         boxes = (
         dlg.toolbarTab.FileBoxes, dlg.toolbarTab.EditBoxes, dlg.toolbarTab.ViewBoxes, dlg.toolbarTab.SettingsBoxes,
@@ -3020,6 +3048,7 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
             if tile is not None: tile.resetAnimation()
 
         self.scene.update()
+        self.objPicker.UpdateAnimatedTiles()
 
     def HandleCollisionsToggle(self, checked):
         """
@@ -3482,6 +3511,21 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
         """
         Load a level from any game into the editor
         """
+        if loadprofile.Enabled:
+            loadprofile.StartSession(os.path.basename(name) if name else 'untitled')
+
+        with loadprofile.Phase('Load level', area=areaNum):
+            result = self._LoadLevel(game, name, isFullPath, areaNum, loadLevel)
+
+        if loadprofile.Enabled:
+            self.loadProfile.Refresh()
+
+        return result
+
+    def _LoadLevel(self, game, name, isFullPath, areaNum, loadLevel):
+        """
+        Does the actual loading for LoadLevel()
+        """
         new = name is None
 
         if new:
@@ -3552,13 +3596,17 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
                 self.fileTitle = os.path.basename(self.fileSavePath)
 
                 # Open the file
+                loadprofile.Begin('Read file')
                 with open(self.fileSavePath, 'rb') as fileobj:
                     levelData = fileobj.read()
+                loadprofile.End()
 
                 # Decompress, if needed (Yaz0)
                 if levelData.startswith(b'Yaz0'):
                     print('Beginning Yaz0 decompression...')
+                    loadprofile.Begin('Yaz0 decompression', size=len(levelData))
                     levelData = DecompYaz0(levelData)
+                    loadprofile.End()
                     print('Decompression finished.')
 
                 elif levelData.startswith(b'SARC'):
@@ -3567,59 +3615,19 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
                 else:
                     return False  # keep it from crashing by loading things it shouldn't
 
+                loadprofile.Begin('SARC parse', size=len(levelData))
                 arc = SarcLib.SARC_Archive()
                 arc.load(levelData)
+                loadprofile.End()
 
-                def exists(fn):
-                    nonlocal arc
-
-                    try:
-                        arc[fn]
-
-                    except KeyError:
-                        return False
-
-                    return True
-
-                def guessInnerName():
-                    possibilities = []
-                    possibilities.append(os.path.basename(self.fileSavePath))
-                    possibilities.append(
-                        os.path.basename(self.fileSavePath).split(' ')[-1])  # for names like "NSMBU 1-1.szs"
-                    possibilities.append(
-                        os.path.basename(self.fileSavePath).split(' ')[0])  # for names like "1-1 test.szs"
-                    possibilities.append(os.path.basename(self.fileSavePath).split('.')[0])
-                    possibilities.append(os.path.basename(self.fileSavePath).split('_')[0])
-
-                    for fn in possibilities:
-                        if exists(fn):
-                            return arc[fn].data, fn
-
-                    return None, ''
-
-                levelname = ''
-
-                if exists('levelname'):
-                    fn = bytes_to_string(arc['levelname'].data)
-                    if exists(fn):
-                        levelFileData = arc[fn].data
-                        levelname = fn
-                    else:
-                        levelFileData, levelname = guessInnerName()
-
-                else:
-                    levelFileData, levelname = guessInnerName()
+                levelFileData, levelname = FindInnerLevel(arc, levelData, self.fileSavePath)
 
                 if not levelFileData:
-                    if exists('course'):
-                        levelFileData = levelData
+                    warningBox = QtWidgets.QMessageBox(QtWidgets.QMessageBox.NoIcon, 'OH NO',
+                                                       'Couldn\'t find the inner level file. Aborting.')
+                    warningBox.exec_()
 
-                    else:
-                        warningBox = QtWidgets.QMessageBox(QtWidgets.QMessageBox.NoIcon, 'OH NO',
-                                                           'Couldn\'t find the inner level file. Aborting.')
-                        warningBox.exec_()
-
-                        return False
+                    return False
 
                 # Sort the szs data
                 globals.szsData = {}
@@ -3629,6 +3637,7 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
 
                 # Get all tilesets in the level
                 self.tilesets = [[], [], [], []]
+                loadprofile.Begin('Sort tilesets')
                 for fname in globals.szsData:
                     data = globals.szsData[fname]
                     if data[:4] != b'SARC':
@@ -3670,6 +3679,7 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
                         slot = 0
 
                     self.tilesets[slot].append(fname)
+                loadprofile.End()
 
                 print(self.tilesets)
                 levelData = levelFileData
@@ -3708,6 +3718,8 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
         self.scene.clearSelection()
         self.CurrentSelection = []
         self.scene.clear()
+        SLib.clearMovementRegistry()
+        SLib.clearImageQueue()
 
         # Clear out all level-thing lists
         for thingList in (self.spriteList, self.entranceList, self.locationList, self.pathList, self.nabbitPathList, self.commentList):
@@ -3750,14 +3762,21 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
         # Prevent things from snapping when they're created
         globals.OverrideSnapping = True
 
-        # Load the actual level
-        if name is None:
-            self.newLevel()
+        # Load the actual level. Sprite images are loaded in the
+        # background once the editor is usable.
+        SLib.DeferImageLoading = True
+        try:
+            if name is None:
+                self.newLevel()
 
-        else:
-            self.LoadLevel_NSMBU(levelData, areaNum)
+            else:
+                self.LoadLevel_NSMBU(levelData, areaNum)
+
+        finally:
+            SLib.DeferImageLoading = False
 
         # Refresh object layouts
+        loadprofile.Begin('Refresh layouts')
         HandleTilesetEdited(True)
         for layer in globals.Area.layers:
             for obj in layer:
@@ -3766,12 +3785,13 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
             sprite.UpdateDynamicSizing()
             sprite.ImageObj.positionChanged()
         self.scene.update()
+        loadprofile.End()
 
         # Set up and reset the Quick Paint Tool
         if hasattr(self, 'quickPaint'):
             self.quickPaint.reset()  # Reset the QP widget.
         QuickPaintOperations.object_optimize_database = []
-        QuickPaintOperations.object_search_database = {}
+        QuickPaintOperations.object_search_database.clear()
 
         # Set the level overview settings
         self.levelOverview.maxX = 100
@@ -3857,12 +3877,16 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
         globals.Level = Level_NSMBU()
 
         # Load it
+        loadprofile.Begin('Parse level')
         if not globals.Level.load(levelData, areaNum):
             raise Exception
+        loadprofile.End()
 
         self.objUseLayer1.setChecked(True)
 
+        loadprofile.Begin('Object picker')
         self.objPicker.LoadFromTilesets()
+        loadprofile.End()
 
         if globals.Area.tileset0 != '':
             self.objAllTab.setCurrentIndex(0)
@@ -3876,6 +3900,7 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
         self.LoadEventTabFromLevel()
 
         # Add all things to the scene
+        loadprofile.Begin('Scene population')
         pcEvent = self.HandleObjPosChange
         for layer in reversed(globals.Area.layers):
             for obj in layer:
@@ -3945,6 +3970,7 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
             self.commentList.addItem(com.listitem)
             self.scene.addItem(com)
             com.UpdateListItem()
+        loadprofile.End()
 
         for tileset_name in globals.Pa0Tilesets:
             if tileset_name not in globals.szsData:
@@ -3955,9 +3981,7 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
         Reloads all the tilesets. If soft is True, they will not be reloaded if the filepaths have not changed.
         """
         tilesets = [globals.Area.tileset0, globals.Area.tileset1, globals.Area.tileset2, globals.Area.tileset3]
-        for idx, name in enumerate(tilesets):
-            if (name is not None) and (name != ''):
-                LoadTileset(idx, name, not soft)
+        LoadTilesets([(idx, name) for idx, name in enumerate(tilesets) if (name is not None) and (name != '')])
 
         HandleTilesetEdited(True)
 
@@ -4320,6 +4344,7 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
                     area.RemoveFromLayer(item)
                     item.layer = nl
                     newLayer.append(item)
+                    item.UpdateTileMap()
                     item.setZValue(z)
                     item.setVisible(newVisibility)
                     item.update()
@@ -5252,6 +5277,9 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
         if dlg.exec_() != QtWidgets.QDialog.Accepted:
             return
 
+        # Make sure no sprite is still drawn as a placeholder
+        SLib.loadQueuedImages(0)
+
         sType = dlg.zoneCombo.currentIndex()
         hideBackground = dlg.hideBackground.isChecked()
         saveImage = dlg.saveImage.isChecked()
@@ -5282,18 +5310,7 @@ class MiyamotoWindow(QtWidgets.QMainWindow):
 
             if globals.RotationShown:
                 sceneRect = (QtGui.QTransform() / globals.TileWidth).mapRect(source)
-                movementControlledType = SLib.SpriteImage_MovementControlled
-
-                globals.OverrideSnapping = True
-                globals.DirtyOverride += 1
-                for spr in globals.Area.sprites:
-                    imageObj = spr.ImageObj
-                    if isinstance(imageObj, movementControlledType):
-                        controller = spr.ImageObj.controller
-                        if controller and controller.active() and sceneRect.intersects(controller.parent.LevelRect | spr.LevelRect):
-                            spr.UpdateDynamicSizing()
-                globals.DirtyOverride -= 1
-                globals.OverrideSnapping = False
+                SLib.updateMovingSprites(sceneRect)
 
                 self.levelOverview.update()
 
@@ -5557,12 +5574,12 @@ def main():
     globals.RotationShown = setting('RotationShown', False)
     globals.RotationNoticeShown = setting('RotationNoticeShown', True)
     SLib.RotationFPS = setting('RotationFPS', 30)
+    globals.TileChunkCacheSize = setting('TileChunkCacheSize', 256)
+    globals.TilesetCacheSize = setting('TilesetCacheSize', 512)
+    globals.BC3Quality = setting('BC3Quality', 1)
 
-    if globals.libyaz0_available:
-        globals.CompLevel = setting('CompLevel', 1)
-
-    else:
-        globals.CompLevel = 0
+    globals.CompLevel = setting('CompLevel', 1)
+    loadprofile.Enabled = setting('LoadProfiling', False)
 
     SLib.RealViewEnabled = globals.RealViewEnabled
 
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# objectstore.py
+# Compact, Qt-free storage of object layers for bulk operations
+
+
+################################################################
+################################################################
+
+############ Imports ############
+
+from array import array
+import struct
+
+from structures import Structures, GetFormat as GetStructureFormat
+
+#################################
+
+
+class LayerStore:
+    """
+    An object layer kept as one array per field, for the code that reads or
+    writes layer files without creating ObjectItems: the batch tool and
+    saving. Objects are referred to by their index in the store.
+    """
+    Fields = ('tileset', 'type', 'x', 'y', 'width', 'height', 'data', 'z')
+    Typecodes = ('B', 'B', 'h', 'h', 'H', 'H', 'B', 'i')
+
+    def __init__(self, layer=0):
+        """
+        Creates an empty store for an object layer
+        """
+        self.layer = layer
+
+        for field, typecode in zip(self.Fields, self.Typecodes):
+            setattr(self, field, array(typecode))
+
+    @classmethod
+    def fromBytes(cls, layer, layerdata):
+        """
+        Creates a store from a course*_bgdatL*.bin file
+        """
+        store = cls(layer)
+
+        objstruct = struct.Struct(GetStructureFormat(Structures.LayerObject))
+        count = len(layerdata) // 16
+        z = (2 - layer) * 8192
+
+        unpack = objstruct.unpack_from
+        rows = [unpack(layerdata, i * 16) for i in range(count)]
+
+        store.tileset = array('B', [(row[0] >> 12) & 3 for row in rows])
+        store.type = array('B', [row[0] & 255 for row in rows])
+        store.x = array('h', [row[1] for row in rows])
+        store.y = array('h', [row[2] for row in rows])
+        store.width = array('H', [row[3] for row in rows])
+        store.height = array('H', [row[4] for row in rows])
+        store.data = array('B', [row[5] for row in rows])
+        store.z = array('i', range(z, z + count))
+
+        return store
+
+    @classmethod
+    def fromItems(cls, layer, items):
+        """
+        Creates a store from a list of ObjectItems
+        """
+        store = cls(layer)
+
+        f_int = int
+        store.tileset = array('B', [f_int(obj.tileset) for obj in items])
+        store.type = array('B', [f_int(obj.type) for obj in items])
+        store.x = array('h', [f_int(obj.objx) for obj in items])
+        store.y = array('h', [f_int(obj.objy) for obj in items])
+        store.width = array('H', [f_int(obj.width) for obj in items])
+        store.height = array('H', [f_int(obj.height) for obj in items])
+        store.data = array('B', [f_int(obj.data) for obj in items])
+        store.z = array('i', [f_int(obj.zValue()) for obj in items])
+
+        return store
+
+    def __len__(self):
+        return len(self.type)
+
+    def append(self, tileset, type, x, y, width, height, data, z):
+        """
+        Adds an object to the store, and returns its index
+        """
+        for field, value in zip(self.Fields, (tileset, type, x, y, width, height, data, z)):
+            getattr(self, field).append(value)
+
+        return len(self.type) - 1
+
+    def bounds(self):
+        """
+        Returns the (x1, y1, x2, y2) bounding rectangle of all objects, or None if empty
+        """
+        if not len(self):
+            return None
+
+        return (min(self.x), min(self.y),
+                max(map(int.__add__, self.x, self.width)),
+                max(map(int.__add__, self.y, self.height)))
+
+    def toBytes(self):
+        """
+        Packs the store into a course*_bgdatL*.bin file, sorted by Z value.
+        Returns None if the layer is empty.
+        """
+        if not len(self):
+            return None
+
+        objstruct = struct.Struct(GetStructureFormat(Structures.LayerObject))
+        buffer = bytearray(len(self) * 16 + 2)
+
+        pack = objstruct.pack_into
+        offset = 0
+        for i in sorted(range(len(self)), key=self.z.__getitem__):
+            pack(buffer, offset, (self.tileset[i] << 12) | self.type[i],
+                 self.x[i], self.y[i], self.width[i], self.height[i], self.data[i])
+            offset += 16
+
+        buffer[offset] = 0xFF
+        buffer[offset + 1] = 0xFF
+
+        return bytes(buffer)
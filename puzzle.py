@@ -18,9 +18,10 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 Qt = QtCore.Qt
 
 import globals
-from gtx import RAWtoGTX
+from gtx import buildGTX
 import SarcLib
 from tileset import HandleTilesetEdited, loadGTX, writeGTX
+from tileset import PackTileAtlas
 from tileset import updateCollisionOverlay
 
 
@@ -3096,66 +3097,13 @@ class animWidget(QtWidgets.QTabWidget):
         width = pixmap.width() // 60
         height = pixmap.height() // 60
 
-        tex = QtGui.QImage(width * 64, height * 64, QtGui.QImage.Format_RGBA8888)
-        tex.fill(Qt.transparent)
-        painter = QtGui.QPainter(tex)
-
-        for y in range(height):
-            for x in range(width):
-                tile = QtGui.QImage(64, 64, QtGui.QImage.Format_RGBA8888)
-                tile.fill(Qt.transparent)
-
-                tilePainter = QtGui.QPainter(tile)
-                tilePainter.drawPixmap(2, 2, pixmap.copy(x * 60, y * 60, 60, 60))
-                tilePainter.end()
-
-                for i in range(2, 62):
-                    color = tile.pixel(i, 2)
-                    for pix in range(0,2):
-                        tile.setPixel(i, pix, color)
-
-                    color = tile.pixel(2, i)
-                    for p in range(0,2):
-                        tile.setPixel(p, i, color)
-
-                    color = tile.pixel(i, 61)
-                    for p in range(62,64):
-                        tile.setPixel(i, p, color)
-
-                    color = tile.pixel(61, i)
-                    for p in range(62,64):
-                        tile.setPixel(p, i, color)
-
-                color = tile.pixel(2, 2)
-                for a in range(0, 2):
-                    for b in range(0, 2):
-                        tile.setPixel(a, b, color)
-
-                color = tile.pixel(61, 2)
-                for a in range(62, 64):
-                    for b in range(0, 2):
-                        tile.setPixel(a, b, color)
-
-                color = tile.pixel(2, 61)
-                for a in range(0, 2):
-                    for b in range(62, 64):
-                        tile.setPixel(a, b, color)
-
-                color = tile.pixel(61, 61)
-                for a in range(62, 64):
-                    for b in range(62, 64):
-                        tile.setPixel(a, b, color)
-
-
-                painter.drawImage(x * 64, y * 64, tile)
-
-        painter.end()
+        tex = PackTileAtlas([pixmap.copy(x * 60, y * 60, 60, 60) for y in range(height) for x in range(width)], width, height)
 
         bits = tex.bits()
         bits.setsize(tex.byteCount())
         data = bits.asstring()
 
-        return RAWtoGTX(width * 64, height * 64, 0x1a, bytes(4), len(data), [0, 1, 2, 3], 1, data)
+        return buildGTX(width * 64, height * 64, 0x1a, [data])
 
 
 
@@ -3889,79 +3837,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
 
     def PackTexture(self, normalmap=False):
-
-        tex = QtGui.QImage(2048, 512, QtGui.QImage.Format_RGBA8888)
-        tex.fill(Qt.transparent)
-        painter = QtGui.QPainter(tex)
-
-        Xoffset = 0
-        Yoffset = 0
-
-        for tile in Tileset.tiles:
-            minitex = QtGui.QImage(64, 64, QtGui.QImage.Format_RGBA8888)
-            minitex.fill(Qt.transparent)
-            minipainter = QtGui.QPainter(minitex)
-
-            minipainter.drawPixmap(2, 2, tile.normalmap if normalmap else tile.image)
-            minipainter.end()
-
-            # Read colours and DESTROY THEM (or copy them to the edges, w/e)
-            for i in range(2, 62):
-
-                # Top Clamp
-                colour = minitex.pixel(i, 2)
-                for p in range(0,2):
-                    minitex.setPixel(i, p, colour)
-
-                # Left Clamp
-                colour = minitex.pixel(2, i)
-                for p in range(0,2):
-                    minitex.setPixel(p, i, colour)
-
-                # Right Clamp
-                colour = minitex.pixel(i, 61)
-                for p in range(62,64):
-                    minitex.setPixel(i, p, colour)
-
-                # Bottom Clamp
-                colour = minitex.pixel(61, i)
-                for p in range(62,64):
-                    minitex.setPixel(p, i, colour)
-
-            # UpperLeft Corner Clamp
-            colour = minitex.pixel(2, 2)
-            for x in range(0,2):
-                for y in range(0,2):
-                    minitex.setPixel(x, y, colour)
-
-            # UpperRight Corner Clamp
-            colour = minitex.pixel(61, 2)
-            for x in range(62,64):
-                for y in range(0,2):
-                    minitex.setPixel(x, y, colour)
-
-            # LowerLeft Corner Clamp
-            colour = minitex.pixel(2, 61)
-            for x in range(0,2):
-                for y in range(62,64):
-                    minitex.setPixel(x, y, colour)
-
-            # LowerRight Corner Clamp
-            colour = minitex.pixel(61, 61)
-            for x in range(62,64):
-                for y in range(62,64):
-                    minitex.setPixel(x, y, colour)
-
-
-            painter.drawImage(Xoffset, Yoffset, minitex)
-
-            Xoffset += 64
-
-            if Xoffset >= 2048:
-                Xoffset = 0
-                Yoffset += 64
-
-        painter.end()
+        tex = PackTileAtlas([tile.normalmap if normalmap else tile.image for tile in Tileset.tiles], 32, 8)
 
         return writeGTX(tex, Tileset.slot, normalmap)
 
@@ -35,6 +35,139 @@ import globals
 #################################
 
 
+class ObjectSearchIndex:
+    """
+    Spatial index of the tiles objects cover, for finding the object at a position.
+    Objects are kept in buckets of BucketSize x BucketSize tiles, per layer,
+    so registering an object costs one entry per bucket it overlaps
+    instead of one per tile.
+    """
+    BucketSize = 16
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """
+        Removes every object from the index
+        """
+        self.buckets = {}
+        self.entries = {}
+
+    def __contains__(self, obj):
+        return obj in self.entries
+
+    def insert(self, obj):
+        """
+        Registers an object at its current position and size, replacing its previous entry
+        """
+        self.remove(obj)
+
+        x = obj.objx
+        y = obj.objy
+        width = obj.width
+        height = obj.height
+        layer = obj.layer
+
+        if width == 1 and height == 1:
+            # 1x1 objects are found even if they have no tile data
+            objdata = None
+
+        elif obj.objdata:
+            objdata = obj.objdata
+
+        else:
+            return
+
+        shift = self.BucketSize.bit_length() - 1
+        keys = [(layer, bx, by)
+                for by in range(y >> shift, ((y + height - 1) >> shift) + 1)
+                for bx in range(x >> shift, ((x + width - 1) >> shift) + 1)]
+
+        for key in keys:
+            self.buckets.setdefault(key, []).append(obj)
+
+        self.entries[obj] = (layer, x, y, width, height, objdata, keys)
+
+    def remove(self, obj):
+        """
+        Unregisters an object, if it is registered
+        """
+        entry = self.entries.pop(obj, None)
+        if entry is None:
+            return
+
+        for key in entry[6]:
+            bucket = self.buckets[key]
+            bucket.remove(obj)
+            if not bucket:
+                del self.buckets[key]
+
+    @staticmethod
+    def _covers(entry, x, y):
+        """
+        Returns True if the registered object has a tile at (x, y)
+        """
+        _, ox, oy, width, height, objdata, _ = entry
+        x -= ox
+        y -= oy
+
+        if not (0 <= x < width and 0 <= y < height):
+            return False
+
+        if objdata is None:
+            return True
+
+        return y < len(objdata) and x < len(objdata[y]) and objdata[y][x] != -1
+
+    def at(self, layer, x, y):
+        """
+        Returns the first registered object with a tile at (x, y) in a layer, or None
+        """
+        shift = self.BucketSize.bit_length() - 1
+        for obj in self.buckets.get((layer, x >> shift, y >> shift), ()):
+            if self._covers(self.entries[obj], x, y):
+                return obj
+
+        return None
+
+    def query(self, layer, x, y, width, height):
+        """
+        Returns the registered objects with a tile inside a rectangle of a layer
+        """
+        if width <= 0 or height <= 0:
+            return []
+
+        x2 = x + width
+        y2 = y + height
+
+        # Objects spanning several buckets are only checked once
+        shift = self.BucketSize.bit_length() - 1
+        candidates = {}
+        for by in range(y >> shift, ((y2 - 1) >> shift) + 1):
+            for bx in range(x >> shift, ((x2 - 1) >> shift) + 1):
+                for obj in self.buckets.get((layer, bx, by), ()):
+                    candidates[obj] = None
+
+        found = []
+        for obj in candidates:
+            _, ox, oy, ow, oh, objdata, _ = self.entries[obj]
+
+            # Only the part of the object inside the rectangle is checked
+            cx1 = max(x, ox) - ox
+            cy1 = max(y, oy) - oy
+            cx2 = min(x2, ox + ow) - ox
+            cy2 = min(y2, oy + oh) - oy
+
+            if cx1 >= cx2 or cy1 >= cy2:
+                continue
+
+            if objdata is None or any(tile != -1 for row in objdata[cy1:cy2] for tile in row[cx1:cx2]):
+                found.append(obj)
+
+        return found
+
+
 class QuickPaintOperations:
     """
     All of the actions/functions/operations/whatever programmed for the quick paint tool are stored in here.
@@ -42,7 +175,7 @@ class QuickPaintOperations:
     color_shift = 0
     color_shift_mouseGridPosition = None
     object_optimize_database = []
-    object_search_database = {}
+    object_search_database = ObjectSearchIndex()
 
     @staticmethod
     def _getMaxSize(qp_data):
@@ -56,91 +189,86 @@ class QuickPaintOperations:
         return res
 
     @staticmethod
-    def optimizeObjects(FromQPWidget=False):
+    def mergeCells(cells):
         """
-        This function merges all touching objects of the same type. We don't want huge files for level data.
-        Nor do we want an island to be completely made up of 1x1 objects. And we most definately don't want
-        objects more than 1x1 to repeat only the first tile in them.
+        Packs 1x1 objects of the same tileset and type into rectangles, in a single
+        row-major sweep over a grid of the cells. Every cell that is not part of a
+        rectangle yet becomes the top-left corner of the largest rectangle that can
+        be grown from it (taller ones first, which works better around slopes).
+        Returns a list of (x, y, width, height, objects), with the objects of every
+        rectangle in row-major order.
         """
-        optimize_memory = []
+        grid = {}
+        for obj in cells:
+            grid.setdefault((obj.objx, obj.objy), obj)
 
-        if FromQPWidget: lr = range(-1, 0)
-        else: lr = range(len(globals.Area.layers))
+        keys = {pos: (obj.tileset, obj.type) for pos, obj in grid.items()}
 
-        for ln in lr:
-            objects_inside_optimize_boxes = []
-            InfiniteLoopStopper = [-1, 0]
-
-            while len(list(filter(lambda i: i.layer == ln, QuickPaintOperations.object_optimize_database))) > 0:
-                from math import sqrt
-
-                obj = min(list(filter(lambda i: i.layer == ln, QuickPaintOperations.object_optimize_database)),
-                          key=lambda i: sqrt(i.objx ** 2 + i.objy ** 2))
-                w = 1024
-                cobj = obj
-                calculated_dimensions = []
-                atd_archive = []
-
-                for y in range(512):
-                    if w != 1024:
-                        calculated_dimensions.append((w, y))
-                    cobj = QuickPaintOperations.searchObj(obj.layer, obj.objx, obj.objy + y)
-
-                    if cobj is None:
-                        break
-
-                    for x in range(w):
-                        cobj = QuickPaintOperations.searchObj(obj.layer, obj.objx + x, obj.objy + y)
-                        atd_archive.append((
-                            x, y, None if not hasattr(cobj, 'modifiedForSize') else cobj.modifiedForSize,
-                            None if not hasattr(cobj, 'autoTileType') else cobj.autoTileType))
-
-                        if (not cobj or cobj in objects_inside_optimize_boxes
-                            or cobj.tileset != obj.tileset or cobj.type != obj.type):
-                            w = x
-                            break
-
-                # This somewhat helps remove the bug when painting over slopes.
-                calculated_dimensions = list(filter(lambda i: i[0] != 0 and i[1] != 0, calculated_dimensions))
-                if True in map(lambda i: i[1] > 1, calculated_dimensions):
-                    calculated_dimensions = list(filter(lambda i: i[1] > 1, calculated_dimensions))
-
-                if len(calculated_dimensions) > 0:
-                    lets_use_these_dimensions = max(calculated_dimensions, key=lambda i: i[0] * i[1])
+        # Length of the run of same-type cells starting at every cell, going right
+        run = {}
+        for x, y in sorted(grid, key=lambda pos: (pos[1], -pos[0])):
+            if keys.get((x + 1, y)) == keys[x, y]:
+                run[x, y] = run[x + 1, y] + 1
 
-                else:
-                    lets_use_these_dimensions = [0, 0, []]
+            else:
+                run[x, y] = 1
 
-                if lets_use_these_dimensions[0] * lets_use_these_dimensions[1] == 0:
-                    QuickPaintOperations.object_optimize_database.remove(obj)
-                    continue
+        consumed = set()
+        rects = []
 
-                calculated_rectangle = (
-                    obj.objx, obj.objy, lets_use_these_dimensions[0], lets_use_these_dimensions[1], obj,
-                    list(set(atd_archive)))
-                optimize_memory.append(calculated_rectangle)
+        for x, y in sorted(grid, key=lambda pos: (pos[1], pos[0])):
+            if (x, y) in consumed:
+                continue
 
-                for y in range(calculated_rectangle[1], calculated_rectangle[1] + calculated_rectangle[3]):
-                    for x in range(calculated_rectangle[0], calculated_rectangle[0] + calculated_rectangle[2]):
-                        cobj = QuickPaintOperations.searchObj(ln, x, y)
+            key = keys[x, y]
 
-                        if cobj in QuickPaintOperations.object_optimize_database:
-                            QuickPaintOperations.object_optimize_database.remove(cobj)
-                            objects_inside_optimize_boxes.append(cobj)
+            # Grow the rectangle down, one row at a time
+            candidates = []
+            width = run[x, y]
+            height = 0
+            while keys.get((x, y + height)) == key and (x, y + height) not in consumed:
+                width = min(width, run[x, y + height])
+                height += 1
+                candidates.append((width, height))
 
-                if InfiniteLoopStopper[0] == len(list(filter(lambda i: i.layer == ln, QuickPaintOperations.object_optimize_database))):
-                    InfiniteLoopStopper[1] += 1
+            tall = [dims for dims in candidates if dims[1] > 1]
+            width, height = max(tall or candidates, key=lambda dims: dims[0] * dims[1])
 
-                    if InfiniteLoopStopper[1] >= 20:
-                        break
+            objects = []
+            for ry in range(y, y + height):
+                for rx in range(x, x + width):
+                    consumed.add((rx, ry))
+                    objects.append(grid[rx, ry])
 
-                else:
-                    InfiniteLoopStopper[1] = 0
+                # Runs that reached into the rectangle now stop at its left edge
+                rx = x - 1
+                while keys.get((rx, ry)) == key and (rx, ry) not in consumed and run[rx, ry] > x - rx:
+                    run[rx, ry] = x - rx
+                    rx -= 1
 
-                InfiniteLoopStopper[0] = len(list(filter(lambda i: i.layer == ln, QuickPaintOperations.object_optimize_database)))
+            rects.append((x, y, width, height, objects))
 
-            for obj in objects_inside_optimize_boxes:
-                if obj not in map(lambda i: i[4], optimize_memory):
+        return rects
+
+    @staticmethod
+    def optimizeObjects(FromQPWidget=False):
+        """
+        This function merges all touching objects of the same type. We don't want huge files for level data.
+        Nor do we want an island to be completely made up of 1x1 objects. And we most definately don't want
+        objects more than 1x1 to repeat only the first tile in them.
+        """
+        if FromQPWidget: lr = range(-1, 0)
+        else: lr = range(len(globals.Area.layers))
+
+        for ln in lr:
+            cells = [obj for obj in QuickPaintOperations.object_optimize_database
+                     if obj.layer == ln and obj.width == 1 and obj.height == 1]
+
+            rects = QuickPaintOperations.mergeCells(cells)
+
+            # The top-left object of every rectangle is kept, the others are removed
+            for rect in rects:
+                for obj in rect[4][1:]:
                     if FromQPWidget:
                         if obj in globals.mainWindow.quickPaint.scene.display_objects:
                             obj.RemoveFromSearchDatabase()
@@ -151,17 +279,18 @@ class QuickPaintOperations:
                         obj.setSelected(False)
                         globals.mainWindow.scene.removeItem(obj)
 
-            for rect in optimize_memory:
-                if rect is not None:
-                    obj = rect[4]
-                    obj.atd_archive = rect[5]
-                    obj.objx = rect[0]
-                    obj.objy = rect[1]
-                    obj.width = rect[2]
-                    obj.height = rect[3]
-                    obj.updateObjCache()
-                    obj.UpdateRects()
-                    obj.UpdateTooltip()
+            for x, y, width, height, objects in rects:
+                obj = objects[0]
+                obj.atd_archive = [(cobj.objx - x, cobj.objy - y,
+                                    getattr(cobj, 'modifiedForSize', None),
+                                    getattr(cobj, 'autoTileType', None)) for cobj in objects]
+                obj.objx = x
+                obj.objy = y
+                obj.width = width
+                obj.height = height
+                obj.updateObjCache()
+                obj.UpdateRects()
+                obj.UpdateTooltip()
 
         QuickPaintOperations.object_optimize_database = []
 
@@ -324,121 +453,75 @@ class QuickPaintOperations:
 
                     mw.scene.removeItem(obj)
 
-                    for r in range(QuickPaintOperations._getMaxSize(qp_data) + 2):
-                        for a in range(-r, r):
-                            sobj = QuickPaintOperations.searchObj(ln, obj.objx + a, obj.objy - r)
-
-                            if sobj is not None:
-                                QuickPaintOperations.autoTileObj(ln, sobj)
-
-                        for a in range(-r, r):
-                            sobj = QuickPaintOperations.searchObj(ln, obj.objx + r, obj.objy + a)
-
-                            if sobj is not None:
-                                QuickPaintOperations.autoTileObj(ln, sobj)
-
-                        for a in range(-r, r):
-                            sobj = QuickPaintOperations.searchObj(ln, obj.objx - a, obj.objy + r)
-
-                            if sobj is not None:
-                                QuickPaintOperations.autoTileObj(ln, sobj)
+                    # Fix the tiles of the objects around it, nearest first
+                    r = QuickPaintOperations._getMaxSize(qp_data) + 1
+                    around = QuickPaintOperations.searchObjRect(ln, obj.objx - r, obj.objy - r, 2 * r + 1, 2 * r + 1)
+                    around.sort(key=lambda sobj: max(abs(sobj.objx - obj.objx), abs(sobj.objy - obj.objy)))
 
-                        for a in range(-r, r):
-                            sobj = QuickPaintOperations.searchObj(ln, obj.objx - r, obj.objy - a)
-
-                            if sobj is not None:
-                                QuickPaintOperations.autoTileObj(ln, sobj)
+                    for sobj in around:
+                        QuickPaintOperations.autoTileObj(ln, sobj)
 
     @staticmethod
     def searchObj(layer, x, y):
         """
         Quickly searches for an object at the specified position.
         """
-        if not QuickPaintOperations.object_search_database.get((x, y, layer)):
-            return None
-
-        if len(QuickPaintOperations.object_search_database[(x, y, layer)]) <= 0:
-            return None
+        return QuickPaintOperations.object_search_database.at(layer, x, y)
 
-        return QuickPaintOperations.object_search_database[(x, y, layer)][0]
+    @staticmethod
+    def searchObjRect(layer, x, y, width, height):
+        """
+        Quickly searches for the objects with a tile inside the specified rectangle.
+        """
+        return QuickPaintOperations.object_search_database.query(layer, x, y, width, height)
 
     @staticmethod
     def sliceObjRange(posList):
         """
         For every object and objects touching that object, they will slice into 1x1 objects.
         """
-        connected_objects = []
+        if not posList:
+            return
+
+        qpscn = globals.mainWindow.quickPaint.scene
+        qp_data = qpscn.object_database
+        r = QuickPaintOperations._getMaxSize(qp_data) + 1
+
+        connected_objects = {}
         objlist = []
         for pos in map(lambda i: (posList[i]['x'], posList[i]['y'], posList[i]['ln']), posList):
-            qpscn = globals.mainWindow.quickPaint.scene
-            qp_data = qpscn.object_database
             # pronounced [BOB-JAY] lol
             # Way to go Robert!
             # Actually Bobj stands for base object, because these are the objects we start with as they lie
             # on the positions where the user has painted over on the widget.
             # - John10v10
-            bobj = QuickPaintOperations.searchObj(pos[2], pos[0], pos[1])
-
-            if bobj is not None and bobj not in connected_objects:
-                connected_objects.append(bobj)
-                objlist.append(bobj)
-
-            for r in range(QuickPaintOperations._getMaxSize(qp_data) + 2):
-                for a in range(-r, r):
-                    bobj = QuickPaintOperations.searchObj(pos[2], pos[0] + a, pos[1] - r)
-
-                    if bobj is not None and bobj not in connected_objects:
-                        connected_objects.append(bobj)
-                        objlist.append(bobj)
-
-                for a in range(-r, r):
-                    bobj = QuickPaintOperations.searchObj(pos[2], pos[0] + r, pos[1] + a)
-
-                    if bobj is not None and bobj not in connected_objects:
-                        connected_objects.append(bobj)
-                        objlist.append(bobj)
-
-                for a in range(-r, r):
-                    bobj = QuickPaintOperations.searchObj(pos[2], pos[0] - a, pos[1] + r)
-
-                    if bobj is not None and bobj not in connected_objects:
-                        connected_objects.append(bobj)
-                        objlist.append(bobj)
-
-                for a in range(-r, r):
-                    bobj = QuickPaintOperations.searchObj(pos[2], pos[0] - r, pos[1] - a)
-
-                    if bobj is not None and bobj not in connected_objects:
-                        connected_objects.append(bobj)
-                        objlist.append(bobj)
-
-        no_more_found = False
-        while not no_more_found:
+            for bobj in QuickPaintOperations.searchObjRect(pos[2], pos[0] - r, pos[1] - r, 2 * r + 1, 2 * r + 1):
+                if bobj not in connected_objects:
+                    connected_objects[bobj] = None
+                    objlist.append(bobj)
+
+        # Connected objects are only followed within r tiles of every painted position
+        xs = [posList[i]['x'] for i in posList]
+        ys = [posList[i]['y'] for i in posList]
+        minx, miny = max(xs) - r, max(ys) - r
+        maxx, maxy = min(xs) + r + 1, min(ys) + r + 1
+
+        while objlist:
             preobjlist = []
             for obj in objlist:
-                for x in range(obj.objx - 1, obj.objx + obj.width + 1):
-                    for y in range(obj.objy - 1, obj.objy + obj.height + 1):
-                        sobj = QuickPaintOperations.searchObj(obj.layer, x, y)
-
-                        if sobj is not None and sobj is not obj and sobj not in connected_objects:
-                            still_append = True
+                x1 = max(obj.objx - 1, minx)
+                y1 = max(obj.objy - 1, miny)
+                x2 = min(obj.objx + obj.width + 1, maxx)
+                y2 = min(obj.objy + obj.height + 1, maxy)
 
-                            for pos in map(lambda i: (posList[i]['x'], posList[i]['y']), posList):
-                                if abs(x - pos[0]) > r or abs(y - pos[1]) > r:
-                                    still_append = False
+                for sobj in QuickPaintOperations.searchObjRect(obj.layer, x1, y1, x2 - x1, y2 - y1):
+                    if sobj is not obj and sobj not in connected_objects:
+                        preobjlist.append(sobj)
+                        connected_objects[sobj] = None
 
-                            if still_append:
-                                preobjlist.append(sobj)
-                                connected_objects.append(sobj)
-
-            if len(preobjlist) <= 0:
-                no_more_found = True
-
-            else:
-                objlist = preobjlist
+            objlist = preobjlist
 
-        connected_objects = list(filter(lambda i: i is not None, list(set(connected_objects))))
-        for robj in connected_objects:
+        for robj in list(connected_objects):
             QuickPaintOperations.sliceObj(robj)
 
     @staticmethod
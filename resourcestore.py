@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# resourcestore.py
+# Content-addressed store of the sprite resource files added to levels on save
+
+
+################################################################
+################################################################
+
+############ Imports ############
+
+import hashlib
+import os
+import stat
+
+#################################
+
+
+# File contents by SHA-1 digest, shared by every level and save
+Blobs = {}
+
+# Digests of the stored contents, by length
+Sizes = {}
+
+# (digest, mtime_ns, size) of the last read of each file path
+Files = {}
+
+
+def _Add(data):
+    """
+    Adds contents to the store and returns their digest
+    """
+    digest = hashlib.sha1(data).digest()
+
+    if digest not in Blobs:
+        Blobs[digest] = data
+        Sizes.setdefault(len(data), set()).add(digest)
+
+    return digest
+
+
+def _Release(digest):
+    """
+    Drops contents from the store, unless another file path still has them
+    """
+    for entry in Files.values():
+        if entry[0] == digest:
+            return
+
+    data = Blobs.pop(digest)
+
+    digests = Sizes[len(data)]
+    digests.discard(digest)
+    if not digests:
+        del Sizes[len(data)]
+
+
+def ReadResource(path):
+    """
+    Returns the contents of a file, only reading it from the disk if its
+    mtime or size changed since the last read. Returns None if the file
+    does not exist.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    if not stat.S_ISREG(st.st_mode):
+        return None
+
+    entry = Files.get(path)
+    if entry is not None and entry[1] == st.st_mtime_ns and entry[2] == st.st_size:
+        return Blobs[entry[0]]
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    digest = _Add(data)
+    Files[path] = digest, st.st_mtime_ns, st.st_size
+
+    if entry is not None and entry[0] != digest:
+        _Release(entry[0])
+
+    return Blobs[digest]
+
+
+def Intern(data):
+    """
+    Returns the stored copy of data if the store has the same contents,
+    so files of a level archive that are also in the data folders are only
+    kept in memory once. Otherwise returns data itself.
+    """
+    if len(data) not in Sizes:
+        return data
+
+    return Blobs.get(hashlib.sha1(data).digest(), data)
+
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# spritebundle.py
+# Packs the sprite images of a folder into atlas pages in a single memory-mapped file
+#
+# Usage: python3 spritebundle.py [FOLDER ...]
+# Without folders, the bundles of miyamotodata/sprites and of the
+# sprites folder of every gamedef are built.
+
+
+################################################################
+################################################################
+
+############ Imports ############
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from PyQt5 import QtCore, QtGui, sip
+
+import globals
+
+#################################
+
+
+BundleVersion = 3
+BundleMagic = b'MSPB'
+
+BundleHeader = struct.Struct('<4sIII')
+BundlePageHeader = struct.Struct('<IIQ')
+BundleEntryHeader = struct.Struct('<HIIIIIqQ')
+
+# Size of the atlas pages. Images that don't fit get a page of their own.
+PageWidth = 2048
+PageHeight = 2048
+
+# Opened bundles (or None) by sprite folder
+Bundles = {}
+
+
+def BundleFolder():
+    """
+    Returns the folder sprite bundles are kept in
+    """
+    return os.path.join(globals.miyamoto_path, 'cache', 'sprites')
+
+
+def BundlePath(folder):
+    """
+    Returns the path of the bundle of a sprite folder
+    """
+    key = hashlib.sha1(os.path.normpath(folder).encode('utf-8')).hexdigest()
+    return os.path.join(BundleFolder(), key + '.bin')
+
+
+class SpriteBundle:
+    """
+    A memory-mapped bundle of the sprite images of a folder, stored as
+    premultiplied ARGB32 atlas pages
+    """
+
+    def __init__(self, path, folder):
+        """
+        Opens the bundle of a folder and reads its index
+        """
+        self.folder = folder
+
+        with open(path, 'rb') as inf:
+            self.mm = mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, pageCount, count = BundleHeader.unpack_from(self.mm, 0)
+            if magic != BundleMagic or version != BundleVersion:
+                raise ValueError("Unsupported sprite bundle!")
+
+            pos = BundleHeader.size
+            self.pages = []
+            for _ in range(pageCount):
+                width, height, offset = BundlePageHeader.unpack_from(self.mm, pos)
+                pos += BundlePageHeader.size
+
+                if offset + width * height * 4 > len(self.mm):
+                    raise ValueError("Truncated sprite bundle!")
+
+                self.pages.append((width, offset))
+
+            index = {}
+            for _ in range(count):
+                nameLen, page, x, y, width, height, fileMtime, fileSize = BundleEntryHeader.unpack_from(self.mm, pos)
+                pos += BundleEntryHeader.size
+
+                name = self.mm[pos:pos + nameLen].decode('utf-8')
+                pos += nameLen
+
+                index[name] = (page, x, y, width, height, fileMtime, fileSize)
+
+        except:
+            self.mm.close()
+            raise
+
+        self.index = self.validate(index)
+        self.address = int(sip.voidptr(self.mm))
+
+    def validate(self, index):
+        """
+        Returns the entries of the index whose file didn't change since the
+        bundle was built. The folder is listed once, when the bundle is opened.
+        Files overwritten in place don't change the mtime of their folder,
+        so the mtime and size of each one are compared.
+        """
+        valid = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                name = os.path.normcase(entry.name)
+                if name not in index:
+                    continue
+
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+
+                if index[name][5:] == (st.st_mtime_ns, st.st_size):
+                    valid[name] = index[name][:5]
+
+        return valid
+
+    def __contains__(self, name):
+        """
+        Returns True if the bundle has an up-to-date copy of an image
+        """
+        return os.path.normcase(name) in self.index
+
+    def image(self, name):
+        """
+        Returns an image of the bundle, copied out of its atlas page
+        as a QImage that owns its pixels
+        """
+        page, x, y, width, height = self.index[os.path.normcase(name)]
+        if not (width and height):
+            return QtGui.QImage()
+
+        pageWidth, offset = self.pages[page]
+        address = self.address + offset + (y * pageWidth + x) * 4
+
+        # A view of the rectangle of the page in the map, only used to copy it
+        view = QtGui.QImage(sip.voidptr(address), width, height, pageWidth * 4,
+                            QtGui.QImage.Format_ARGB32_Premultiplied)
+
+        return view.copy()
+
+    def close(self):
+        self.mm.close()
+
+
+def GetBundle(folder):
+    """
+    Returns the bundle of a sprite folder, or None if it has none
+    """
+    if folder in Bundles:
+        return Bundles[folder]
+
+    try:
+        bundle = SpriteBundle(BundlePath(folder), folder)
+
+    except (OSError, ValueError, struct.error):
+        bundle = None
+
+    Bundles[folder] = bundle
+    return bundle
+
+
+def ClearBundles():
+    """
+    Closes the opened bundles, so they are checked again when next used
+    """
+    for bundle in Bundles.values():
+        if bundle is not None:
+            bundle.close()
+
+    Bundles.clear()
+
+
+def PackPages(sizes):
+    """
+    Places images of the given (width, height) on atlas pages, in rows.
+    Returns [(width, height) of every page] and [(page, x, y) of every image].
+    """
+    pages = []
+    places = [None] * len(sizes)
+
+    # Row packing wastes less space with the tallest images first
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+
+    rowX = rowY = rowHeight = 0
+    page = None
+    for i in order:
+        width, height = sizes[i]
+
+        if width > PageWidth or height > PageHeight:
+            # Too big for a shared page
+            places[i] = (len(pages), 0, 0)
+            pages.append([width, height])
+            continue
+
+        if page is not None and rowX + width > PageWidth:
+            rowX, rowY, rowHeight = 0, rowY + rowHeight, 0
+
+        if page is None or rowY + height > PageHeight:
+            page = len(pages)
+            pages.append([PageWidth, 0])
+            rowX = rowY = rowHeight = 0
+
+        places[i] = (page, rowX, rowY)
+        rowX += width
+        rowHeight = max(rowHeight, height)
+        pages[page][1] = max(pages[page][1], rowY + height)
+
+    return [tuple(page) for page in pages], places
+
+
+def BuildSpriteBundle(folder):
+    """
+    Decodes the PNGs of a sprite folder and packs them into the atlas
+    pages of its bundle. Returns the number of images packed.
+    """
+    names = []
+    sizes = []
+    stats = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if not name.lower().endswith('.png') or not os.path.isfile(path):
+            continue
+
+        size = QtGui.QImageReader(path).size()
+        if not size.isValid():
+            continue
+
+        names.append(name)
+        sizes.append((size.width(), size.height()))
+        stats.append(os.stat(path))
+
+    pages, places = PackPages(sizes)
+
+    # The pages come right after the index
+    offset = (BundleHeader.size + BundlePageHeader.size * len(pages)
+              + sum(BundleEntryHeader.size + len(os.path.normcase(name).encode('utf-8')) for name in names))
+
+    os.makedirs(BundleFolder(), exist_ok=True)
+    path = BundlePath(folder)
+
+    # Write to a temporary file first, so a partial bundle is never read
+    fd, tmp_path = tempfile.mkstemp('.tmp', 'bundle_', BundleFolder())
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(BundleHeader.pack(BundleMagic, BundleVersion, len(pages), len(names)))
+
+            for width, height in pages:
+                out.write(BundlePageHeader.pack(width, height, offset))
+                offset += width * height * 4
+
+            for name, (width, height), (page, x, y), st in zip(names, sizes, places, stats):
+                name = os.path.normcase(name).encode('utf-8')
+                out.write(BundleEntryHeader.pack(len(name), page, x, y, width, height, st.st_mtime_ns, st.st_size))
+                out.write(name)
+
+            # Draw the images of each page, one page at a time
+            for page, (width, height) in enumerate(pages):
+                atlas = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32_Premultiplied)
+                atlas.fill(QtCore.Qt.transparent)
+
+                painter = QtGui.QPainter(atlas)
+                painter.setCompositionMode(QtGui.QPainter.CompositionMode_Source)
+                for name, place in zip(names, places):
+                    if place[0] == page:
+                        img = QtGui.QImage(os.path.join(folder, name))
+                        painter.drawImage(place[1], place[2],
+                                          img.convertToFormat(QtGui.QImage.Format_ARGB32_Premultiplied))
+
+                painter.end()
+
+                data = atlas.constBits()
+                data.setsize(atlas.byteCount())
+                out.write(data)
+
+        os.replace(tmp_path, path)
+
+    except:
+        os.remove(tmp_path)
+        raise
+
+    return len(names)
+
+
+def SpriteFolders(gamedef):
+    """
+    Returns miyamotodata/sprites and the sprites folders of a gamedef and its bases
+    """
+    folders = ['miyamotodata/sprites'] + gamedef.recursiveFiles('sprites', False, True)
+    return [folder for folder in folders if os.path.isdir(folder)]
+
+
+def main():
+    os.chdir(globals.miyamoto_path)
+
+    folders = sys.argv[1:]
+    if not folders:
+        import area  # must come before gamedefs, to resolve their import cycle
+        from gamedefs import MiyamotoGameDefinition, getAvailableGameDefs
+        from strings import MiyamotoTranslation
+
+        globals.trans = MiyamotoTranslation(None)
+
+        for name in getAvailableGameDefs():
+            globals.gamedef = MiyamotoGameDefinition(name)
+            for folder in SpriteFolders(globals.gamedef):
+                if folder not in folders:
+                    folders.append(folder)
+
+    for folder in folders:
+        print('%s: %d images' % (folder, BuildSpriteBundle(folder)))
+
+
+if __name__ == '__main__':
+    main()
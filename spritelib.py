@@ -32,12 +32,15 @@
 
 from math import sin, cos, sqrt
 import os.path
+import time
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 Qt = QtCore.Qt
 QTransform = QtGui.QTransform
 
 import globals
+import loadprofile
+import spritebundle
 
 #################################
 
@@ -55,6 +58,24 @@ Area = None
 RotationTimer = None
 RotationFrame = 0
 RotationFPS = 30
+OverviewFPS = 5
+
+# Registry of hooked movement-controlled sprite images, bucketed by
+# MovementCellSize x MovementCellSize block cells of the level
+MovementCellSize = 32
+MovementBuckets = {}
+MovementCells = {}
+MovementPending = set()
+MovementSkip = 0
+MovementMaxSkip = 4
+OverviewLastUpdate = 0.0
+
+# Queue of sprite types whose images are loaded by ImageLoadTimer while the
+# editor is already usable. Their sprites are drawn as spriteboxes meanwhile.
+DeferImageLoading = False
+ImageLoadQueue = []
+ImageLoadTimer = None
+ImageLoadBudget = 0.015  # seconds of each tick spent loading images
 
 ################################################################
 ################################################################
@@ -70,43 +91,258 @@ def loadVines():
     loadIfNotInImageCache('VineBtm', 'vine_btm.png')
 
 
+def registerMovement(imageObj):
+    """
+    Adds a movement-controlled sprite image to the registry.
+    It is put into its cells on the next tick, once its rects are known.
+    """
+    MovementPending.add(imageObj)
+
+
+def unregisterMovement(imageObj):
+    """
+    Removes a movement-controlled sprite image from the registry
+    """
+    MovementPending.discard(imageObj)
+
+    cells = MovementCells.pop(imageObj, ())
+    for cell in cells:
+        bucket = MovementBuckets.get(cell)
+        if bucket is None:
+            continue
+
+        bucket.discard(imageObj)
+        if not bucket:
+            del MovementBuckets[cell]
+
+
+def clearMovementRegistry():
+    """
+    Forgets all registered movement-controlled sprite images
+    """
+    MovementBuckets.clear()
+    MovementCells.clear()
+    MovementPending.clear()
+
+
+def _movementCells(rect):
+    """
+    Returns the registry cells covered by a rect measured in blocks
+    """
+    x1 = max(int(rect.left()) // MovementCellSize, 0)
+    y1 = max(int(rect.top()) // MovementCellSize, 0)
+    x2 = max(int(rect.right()) // MovementCellSize, 0)
+    y2 = max(int(rect.bottom()) // MovementCellSize, 0)
+
+    return [(x, y) for y in range(y1, y2 + 1) for x in range(x1, x2 + 1)]
+
+
+def _bucketMovement(imageObj):
+    """
+    Puts a movement-controlled sprite image into the cells covered
+    by itself and its controller, or drops it if it has been unhooked
+    """
+    controller = imageObj.controller
+    if not controller or imageObj.parent.scene() is None:
+        unregisterMovement(imageObj)
+        return
+
+    cells = _movementCells(controller.parent.LevelRect | imageObj.parent.LevelRect)
+    if cells == MovementCells.get(imageObj):
+        return
+
+    unregisterMovement(imageObj)
+    MovementCells[imageObj] = cells
+    for cell in cells:
+        MovementBuckets.setdefault(cell, set()).add(imageObj)
+
+
+def movingSpritesIn(rect):
+    """
+    Returns the hooked movement-controlled sprite images
+    that may intersect a rect measured in blocks
+    """
+    if MovementPending:
+        for imageObj in tuple(MovementPending):
+            MovementPending.discard(imageObj)
+            _bucketMovement(imageObj)
+
+    found = set()
+    for cell in _movementCells(rect):
+        bucket = MovementBuckets.get(cell)
+        if bucket:
+            found |= bucket
+
+    return found
+
+
+def updateMovingSprites(rect):
+    """
+    Updates the active movement-controlled sprites intersecting
+    a rect measured in blocks
+    """
+    globals.OverrideSnapping = True
+    globals.DirtyOverride += 1
+    for imageObj in movingSpritesIn(rect):
+        controller = imageObj.controller
+        if not controller:
+            unregisterMovement(imageObj)
+            continue
+
+        spr = imageObj.parent
+        if controller.active() and rect.intersects(controller.parent.LevelRect | spr.LevelRect):
+            spr.UpdateDynamicSizing()
+            _bucketMovement(imageObj)
+    globals.DirtyOverride -= 1
+    globals.OverrideSnapping = False
+
+
 def updateMovement():
     """
     Updates movement-controlled sprites
     """
-    global RotationFrame
+    global RotationFrame, MovementSkip, OverviewLastUpdate
     RotationFrame += 1
 
+    # A previous tick overran its budget, so drop this one.
+    # RotationFrame keeps counting so the motion stays in real time.
+    if MovementSkip:
+        MovementSkip -= 1
+        return
+
+    start = time.perf_counter()
+
     mainWindow = globals.mainWindow
     view = mainWindow.view
     size = view.size()
 
-    movementControlledType = SpriteImage_MovementControlled
-
     scale = 24 * mainWindow.ZoomLevel / 100.0
     windowRect = QtCore.QRectF(view.XScrollBar.value() / scale,
                                view.YScrollBar.value() / scale,
                                size.width() / scale, size.height() / scale)
 
-    globals.OverrideSnapping = True
-    globals.DirtyOverride += 1
-    for spr in globals.Area.sprites:
-        imageObj = spr.ImageObj
-        if isinstance(imageObj, movementControlledType):
-            controller = spr.ImageObj.controller
-            if controller and controller.active() and windowRect.intersects(controller.parent.LevelRect | spr.LevelRect):
-                spr.UpdateDynamicSizing()
-    globals.DirtyOverride -= 1
-    globals.OverrideSnapping = False
+    updateMovingSprites(windowRect)
 
-    mainWindow.levelOverview.update()
+    # The overview is tiny, so it is redrawn at a lower rate
+    now = time.perf_counter()
+    if now - OverviewLastUpdate >= 1 / OverviewFPS:
+        OverviewLastUpdate = now
+        mainWindow.levelOverview.update()
+
+    budget = 1 / RotationFPS
+    elapsed = time.perf_counter() - start
+    if elapsed > budget:
+        MovementSkip = min(int(elapsed / budget), MovementMaxSkip)
+
+
+def loadSpriteImages(type):
+    """
+    Loads the images of a sprite type, unless they were already loaded
+    """
+    if type in SpriteImagesLoaded:
+        return
+
+    spriteClasses = globals.gamedef.getImageClasses()
+    if type in spriteClasses:
+        loadprofile.Begin('Sprite images', type=type)
+        spriteClasses[type].loadImages()
+        loadprofile.End()
+
+    SpriteImagesLoaded.add(type)
+
+
+def queueSpriteImages(type):
+    """
+    Queues the images of a sprite type to be loaded by ImageLoadTimer.
+    Returns False if they must be loaded right away instead.
+    """
+    if not DeferImageLoading or ImageLoadTimer is None:
+        return False
+
+    if type not in ImageLoadQueue:
+        ImageLoadQueue.append(type)
+
+    if not ImageLoadTimer.isActive():
+        ImageLoadTimer.start(0)
+
+    return True
+
+
+def clearImageQueue():
+    """
+    Forgets all queued sprite types
+    """
+    ImageLoadQueue.clear()
+
+    if ImageLoadTimer is not None:
+        ImageLoadTimer.stop()
+
+
+def _visibleQueuedTypes(sprites):
+    """
+    Returns the queued sprite types that have sprites inside the viewport
+    """
+    if globals.mainWindow is None:
+        return set()
+
+    view = globals.mainWindow.view
+    rect = view.mapToScene(view.viewport().rect()).boundingRect()
+    queued = set(ImageLoadQueue)
+
+    return {sprite.type for sprite in sprites if sprite.type in queued and rect.intersects(sprite.sceneBoundingRect())}
+
+
+def loadQueuedImages(budget=None):
+    """
+    Loads queued sprite types, those visible in the viewport first, until the
+    budget (in seconds) runs out, then swaps the spriteboxes of their sprites
+    for the real images. A budget of 0 loads the whole queue.
+    """
+    if budget is None:
+        budget = ImageLoadBudget
+
+    start = time.perf_counter()
+    sprites = globals.Area.sprites if globals.Area is not None else []
+    visible = _visibleQueuedTypes(sprites)
+    landed = set()
+
+    while ImageLoadQueue:
+        spriteType = next((t for t in ImageLoadQueue if t in visible), ImageLoadQueue[0])
+        ImageLoadQueue.remove(spriteType)
+
+        loadSpriteImages(spriteType)
+        landed.add(spriteType)
+
+        if budget and time.perf_counter() - start > budget:
+            break
+
+    if not ImageLoadQueue and ImageLoadTimer is not None:
+        ImageLoadTimer.stop()
+
+    if not landed:
+        return
+
+    spriteClasses = globals.gamedef.getImageClasses()
+    for sprite in sprites:
+        if sprite.type not in landed or sprite.type not in spriteClasses:
+            continue
+
+        # Only sprites still showing the placeholder
+        if type(sprite.ImageObj) is not SpriteImage:
+            continue
+
+        sprite.setImageObj(spriteClasses[sprite.type])
+        sprite.ImageObj.positionChanged()
+
+    if globals.mainWindow is not None:
+        globals.mainWindow.levelOverview.update()
 
 
 def main():
     """
     Resets Sprites.py to its original settings
     """
-    global OutlineColor, OutlinePen, OutlineBrush, ImageCache, SpritesFolders, RotationTimer
+    global OutlineColor, OutlinePen, OutlineBrush, ImageCache, SpritesFolders, RotationTimer, ImageLoadTimer
     OutlinePen = QtGui.QPen(OutlineColor, 4 * (TileWidth/24))
     OutlineBrush = QtGui.QBrush(OutlineColor)
 
@@ -125,26 +361,32 @@ def main():
     RotationTimer = QtCore.QTimer()
     RotationTimer.timeout.connect(updateMovement)
 
+    clearImageQueue()
+    ImageLoadTimer = QtCore.QTimer()
+    ImageLoadTimer.timeout.connect(loadQueuedImages)
+
 
 def GetImg(imgname, image=False):
     """
-    Returns the image path from the PNG filename imgname
+    Returns the image from the PNG filename imgname
     """
     imgname = str(imgname)
 
-    # Try to find the best path
-    path = 'miyamotodata/sprites/' + imgname
+    # Find the most recent copy in the sprite file index of the gamedef
+    folder = globals.gamedef.spriteFiles().get(os.path.normcase(imgname))
+    if folder is None:
+        return None
 
-    for folder in reversed(SpritesFolders): # find the most recent copy
-        tryPath = folder + '/' + imgname
-        if os.path.isfile(tryPath):
-            path = tryPath
-            break
+    # Folders with an up-to-date sprite bundle are read from it instead of the disk
+    bundle = spritebundle.GetBundle(folder)
+    if bundle is not None and imgname in bundle:
+        img = bundle.image(imgname)
+        if image: return img
+        else: return QtGui.QPixmap.fromImage(img)
 
-    # Return the appropriate object
-    if os.path.isfile(path):
-        if image: return QtGui.QImage(path)
-        else: return QtGui.QPixmap(path)
+    path = folder + '/' + imgname
+    if image: return QtGui.QImage(path)
+    else: return QtGui.QPixmap(path)
 
 
 def loadIfNotInImageCache(name, filename):
@@ -380,11 +622,13 @@ class SpriteImage_MovementController(SpriteImage_StaticMultiple):
     def updateControlled(self):
         for controlled in self.controlled:
             controlled.parent.UpdateDynamicSizing()
+            registerMovement(controlled)
 
     def detachControlled(self):
         if self.controlled:
             for controlled in self.controlled:
                 controlled.controller = None
+                unregisterMovement(controlled)
                 controlled.parent.UpdateDynamicSizing()
 
             self.controlled = []
@@ -454,6 +698,7 @@ class SpriteImage_MovementControlled(SpriteImage_StaticMultiple):
                         continue
                     self.controller = sprite.ImageObj
                     sprite.ImageObj.controlled.append(self)
+                    registerMovement(self)
                     break
 
         else:
@@ -464,6 +709,8 @@ class SpriteImage_MovementControlled(SpriteImage_StaticMultiple):
             self.controller.controlled.remove(self)
             self.controller = None
 
+        unregisterMovement(self)
+
     def dataChanged(self):
         # Find and hook the controller
         if not self.controller or self.controller.getMovementID() != self.getMovementID():
@@ -570,6 +817,9 @@ class SpriteImage_MovementControlled(SpriteImage_StaticMultiple):
     def positionChanged(self):
         self.parent.UpdateDynamicSizing()
 
+        if self.controller:
+            registerMovement(self)
+
     def delete(self):
         self.unhookController()
 
@@ -354,6 +354,16 @@ class MiyamotoTranslation:
                 13: 'Password may be composed of any ASCII character,[br]and up to 64 characters long.[br]',
                 14: 'Sorry![br][br]You can only view or edit Level Information in Area 1.',
                 },
+            'LoadProfile': {
+                0: 'Record level loads',
+                1: 'Phase',
+                2: 'Time (ms)',
+                3: 'Memory blocks',
+                4: 'Export Chrome Trace...',
+                5: 'Chrome trace',
+                6: 'Main thread',
+                7: 'Worker thread [num]',
+                },
             'LocationDataEditor': {
                 0: 'ID:',
                 1: '[b]ID:[/b][br]Must be different from all other IDs',
@@ -540,6 +550,8 @@ class MiyamotoTranslation:
                 149: 'Lower selected objects behind all other objects in the scene.',
                 150: 'Preview Pivotal Rotation',
                 151: 'Toggle previewing of pivotal rotation with sprite images',
+                152: 'Load Profile',
+                153: 'Show or hide the timings of the last level load',
                 },
             'Objects': {
                 0: '[b]Tileset [tileset], object [obj]:[/b][br][width]x[height] on layer [layer]',
@@ -669,6 +681,11 @@ class MiyamotoTranslation:
                 43: 'Split Embedded tab:',
                 44: None,
                 45: 'Pivotal Rotation Preview FPS:',
+                46: 'Tileset texture quality:',
+                47: 'Fast',
+                48: 'Normal',
+                49: 'High: Slowest',
+                50: 'Level view cache size (MB):',
                 },
             'QuickPaint': {
                 1: "WOAH! Watch out!",
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# tests/test_batch.py
+# Smoke test of the batch CLI on a level built from blankcourse.bin
+#
+# Usage: python3 -m unittest discover tests
+
+
+################################################################
+################################################################
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import SarcLib
+
+RootPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#################################
+
+
+def RunBatch(*args):
+    """
+    Runs batch.py with the arguments, and returns the process and its summaries
+    """
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    proc = subprocess.run([sys.executable, os.path.join(RootPath, 'batch.py')] + list(args),
+                          cwd=RootPath, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, timeout=600)
+
+    summaries = [json.loads(line) for line in proc.stdout.splitlines() if line.startswith('{')]
+    return proc, summaries
+
+
+class BatchTests(unittest.TestCase):
+    """
+    Runs the batch CLI on a one-area level
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+        with open(os.path.join(RootPath, 'miyamotodata', 'blankcourse.bin'), 'rb') as inf:
+            course = inf.read()
+
+        arc = SarcLib.SARC_Archive()
+        folder = SarcLib.Folder('course')
+        arc.addFolder(folder)
+        folder.addFile(SarcLib.File('course1.bin', course))
+
+        self.level = os.path.join(self.tmp.name, '1-1.sarc')
+        with open(self.level, 'wb') as out:
+            out.write(arc.save()[0])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_help(self):
+        proc, _ = RunBatch('--help')
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+
+    def test_validate(self):
+        proc, summaries = RunBatch('--validate', self.level)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(len(summaries), 1)
+        self.assertTrue(summaries[0]['ok'], summaries[0])
+        self.assertEqual(len(summaries[0]['areas']), 1)
+
+    def test_resave(self):
+        outFolder = os.path.join(self.tmp.name, 'out')
+        os.mkdir(outFolder)
+
+        proc, summaries = RunBatch('-o', outFolder, self.level)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertTrue(summaries[0]['ok'], summaries[0])
+
+        # The re-saved level must load again
+        output = summaries[0]['output']
+        self.assertTrue(os.path.isfile(output))
+
+        proc, summaries = RunBatch('--validate', output)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertTrue(summaries[0]['ok'], summaries[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
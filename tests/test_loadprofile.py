@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# tests/test_loadprofile.py
+# Smoke test of level loading with load profiling enabled
+#
+# Usage: python3 -m unittest discover tests
+
+
+################################################################
+################################################################
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+import loadprofile
+
+RootPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#################################
+
+
+# Loads the benchmark suite's synthetic level with profiling enabled, in its
+# own process so the editor's global state doesn't leak into other tests
+ProfiledLoad = '''
+import json, sys
+sys.path.insert(0, 'benchmarks')
+
+import suite
+fixtures = suite.Fixtures(0.01, 1)
+suite.QtCases(fixtures, 1)
+
+import globals
+import loadprofile
+from level import Level_NSMBU
+from tileset import CreateTilesets
+
+globals.szsData = dict(fixtures.tilesets)
+CreateTilesets()
+
+loadprofile.Enabled = True
+loadprofile.StartSession('profiled')
+Level_NSMBU(headless=True).load(fixtures.level, 1)
+
+def Tree(nodes):
+    return [[event['name'], Tree(children)] for event, children in nodes]
+
+print(json.dumps({
+    'names': [event['name'] for event in loadprofile.Events],
+    'tree': Tree(loadprofile.EventTree()[0][1]),
+    'open': len(loadprofile._OpenPhases()),
+    'trace': len(json.dumps(loadprofile.ChromeTrace())),
+}))
+'''
+
+
+def Children(tree, name):
+    """
+    Returns the names of the phases directly under the first phase with the name
+    """
+    for child, children in tree:
+        if child == name:
+            return [grandchild for grandchild, _ in children]
+
+        found = Children(children, name)
+        if found is not None:
+            return found
+
+
+class ProfiledLoadTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+        proc = subprocess.run([sys.executable, '-c', ProfiledLoad],
+                              cwd=RootPath, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, timeout=600)
+
+        if proc.returncode != 0:
+            raise AssertionError(proc.stderr)
+
+        cls.result = json.loads(proc.stdout.splitlines()[-1])
+
+    def test_phases(self):
+        names = self.result['names']
+        for name in ('Area 1', 'Area 2', 'Parse blocks', 'Sprites', 'Decode tilesets', 'Tile slicing', 'Object layers'):
+            self.assertIn(name, names)
+
+    def test_nesting(self):
+        tree = self.result['tree']
+        self.assertIn('Sprites', Children(tree, 'Parse blocks'))
+        self.assertIn('Parse blocks', Children(tree, 'Area 1'))
+        self.assertIn('Object layers', Children(tree, 'Area 1'))
+
+    def test_closed(self):
+        self.assertEqual(self.result['open'], 0)
+        self.assertGreater(self.result['trace'], 0)
+
+
+class MarkerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.enabled = loadprofile.Enabled
+
+    def tearDown(self):
+        loadprofile.Enabled = self.enabled
+        loadprofile.StartSession('')
+
+    def test_disabled(self):
+        loadprofile.Enabled = False
+        loadprofile.StartSession('disabled')
+        loadprofile.Begin('Phase')
+        loadprofile.End()
+        self.assertEqual(loadprofile.Events, [])
+
+    def test_failed_load(self):
+        loadprofile.Enabled = True
+        loadprofile.StartSession('failed')
+        loadprofile.Begin('Outer')
+        loadprofile.Begin('Inner')
+
+        # A new session forgets the phases the failed load left open
+        loadprofile.StartSession('next')
+        loadprofile.Begin('Phase')
+        loadprofile.End()
+        loadprofile.End()
+        self.assertEqual([event['name'] for event in loadprofile.Events], ['Phase'])
+
+
+if __name__ == '__main__':
+    unittest.main()
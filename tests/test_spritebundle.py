@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# tests/test_spritebundle.py
+# Checks that the images of a sprite bundle match their PNGs
+#
+# Usage: python3 -m unittest discover tests
+
+
+################################################################
+################################################################
+
+import os
+import random
+import tempfile
+import unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5 import QtGui
+
+import globals
+import spritebundle
+
+App = QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+
+#################################
+
+
+def RandomImage(width, height, rng):
+    """
+    Returns an ARGB32 image of random pixels, with partial alpha
+    """
+    img = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32)
+    for y in range(height):
+        for x in range(width):
+            img.setPixel(x, y, rng.getrandbits(32))
+
+    return img
+
+
+def Premultiplied(path):
+    return QtGui.QImage(path).convertToFormat(QtGui.QImage.Format_ARGB32_Premultiplied)
+
+
+class SpriteBundleTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = globals.miyamoto_path
+        self.tmp = tempfile.TemporaryDirectory()
+        globals.miyamoto_path = self.tmp.name
+
+        self.folder = os.path.join(self.tmp.name, 'sprites')
+        os.mkdir(self.folder)
+
+        # Includes an image too big to share a page
+        rng = random.Random(0)
+        self.sizes = {'a.png': (5, 7), 'b.png': (30, 2), 'c.png': (1, 1),
+                      'wide.png': (spritebundle.PageWidth + 3, 2)}
+        for name, (width, height) in self.sizes.items():
+            RandomImage(width, height, rng).save(os.path.join(self.folder, name))
+
+        self.assertEqual(spritebundle.BuildSpriteBundle(self.folder), len(self.sizes))
+
+    def tearDown(self):
+        spritebundle.ClearBundles()
+        globals.miyamoto_path = self.path
+        self.tmp.cleanup()
+
+    def test_images(self):
+        bundle = spritebundle.GetBundle(self.folder)
+
+        for name in self.sizes:
+            self.assertIn(name, bundle)
+            self.assertEqual(bundle.image(name), Premultiplied(os.path.join(self.folder, name)))
+
+        self.assertNotIn('missing.png', bundle)
+
+    def test_changed_file(self):
+        path = os.path.join(self.folder, 'a.png')
+        RandomImage(6, 7, random.Random(1)).save(path)
+
+        bundle = spritebundle.GetBundle(self.folder)
+        self.assertNotIn('a.png', bundle)
+        self.assertIn('b.png', bundle)
+
+    def test_pages(self):
+        sizes = [(spritebundle.PageWidth // 2, 10)] * 5 + [(3, spritebundle.PageHeight + 1)]
+        pages, places = spritebundle.PackPages(sizes)
+
+        # Three rows of two images on one page, and a page for the tall image
+        self.assertEqual(pages, [(3, spritebundle.PageHeight + 1),
+                                 (spritebundle.PageWidth, 30)])
+        self.assertEqual(places[-1], (0, 0, 0))
+        self.assertEqual(sorted(places[:5]), [(1, 0, 0), (1, 0, 10), (1, 0, 20),
+                                              (1, spritebundle.PageWidth // 2, 0),
+                                              (1, spritebundle.PageWidth // 2, 10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# tests/test_tileset.py
+# Checks the tile atlas packer against the per-tile packer it replaced
+#
+# Usage: python3 -m unittest discover tests
+
+
+################################################################
+################################################################
+
+import os
+import random
+import sys
+import unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+RootPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RootPath)
+
+from PyQt5 import QtCore, QtGui
+Qt = QtCore.Qt
+
+App = QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+
+import area  # must come before tileset, to resolve their import cycle
+from tileset import PackTileAtlas
+
+#################################
+
+
+def OldPackTileAtlas(pixmaps, columns, rows):
+    """
+    The packer PackTileAtlas replaced: every tile is drawn into its own
+    64x64 image, its edges are clamped pixel by pixel, and the image is
+    then drawn onto the atlas
+    """
+    tex = QtGui.QImage(columns * 64, rows * 64, QtGui.QImage.Format_RGBA8888)
+    tex.fill(Qt.transparent)
+    painter = QtGui.QPainter(tex)
+
+    for i, pixmap in enumerate(pixmaps):
+        tile = QtGui.QImage(64, 64, QtGui.QImage.Format_RGBA8888)
+        tile.fill(Qt.transparent)
+        tilePainter = QtGui.QPainter(tile)
+
+        tilePainter.drawPixmap(2, 2, pixmap)
+        tilePainter.end()
+
+        for j in range(2, 62):
+            color = tile.pixel(j, 2)
+            for p in range(0, 2):
+                tile.setPixel(j, p, color)
+
+            color = tile.pixel(2, j)
+            for p in range(0, 2):
+                tile.setPixel(p, j, color)
+
+            color = tile.pixel(j, 61)
+            for p in range(62, 64):
+                tile.setPixel(j, p, color)
+
+            color = tile.pixel(61, j)
+            for p in range(62, 64):
+                tile.setPixel(p, j, color)
+
+        for cx, cy, xs, ys in ((2, 2, (0, 1), (0, 1)), (61, 2, (62, 63), (0, 1)),
+                               (2, 61, (0, 1), (62, 63)), (61, 61, (62, 63), (62, 63))):
+            color = tile.pixel(cx, cy)
+            for a in xs:
+                for b in ys:
+                    tile.setPixel(a, b, color)
+
+        painter.drawImage(i % columns * 64, i // columns * 64, tile)
+
+    painter.end()
+    return tex
+
+
+def ImageBytes(img):
+    """
+    Returns the pixels of a QImage as bytes
+    """
+    data = img.constBits()
+    data.setsize(img.byteCount())
+    return data.asstring()
+
+
+def RandomTiles(count, alphas, rng):
+    """
+    Returns random 60x60 tile pixmaps, with alpha values picked from alphas
+    """
+    pixmaps = []
+    for _ in range(count):
+        img = QtGui.QImage(60, 60, QtGui.QImage.Format_RGBA8888)
+        img.fill(Qt.transparent)
+        for y in range(0, 60, 3):
+            for x in range(0, 60, 3):
+                color = QtGui.QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256), rng.choice(alphas))
+                for dy in range(3):
+                    for dx in range(3):
+                        img.setPixelColor(x + dx, y + dy, color)
+
+        pixmaps.append(QtGui.QPixmap.fromImage(img))
+
+    return pixmaps
+
+
+class PackTileAtlasTests(unittest.TestCase):
+    def check(self, alphas, columns, rows):
+        pixmaps = RandomTiles(columns * rows, alphas, random.Random(columns * rows))
+
+        new = PackTileAtlas(pixmaps, columns, rows)
+        old = OldPackTileAtlas(pixmaps, columns, rows)
+
+        self.assertEqual(new.size(), old.size())
+        self.assertEqual(new.format(), old.format())
+        self.assertEqual(ImageBytes(new), ImageBytes(old))
+
+    def test_opaque(self):
+        self.check((255, ), 4, 2)
+
+    def test_binary_alpha(self):
+        self.check((0, 255), 4, 2)
+
+    def test_partial_alpha(self):
+        self.check(range(256), 32, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
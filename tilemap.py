@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# tilemap.py
+# Persistent per-layer tile grids used to draw the level canvas
+
+
+################################################################
+################################################################
+
+############ Imports ############
+
+from array import array
+from collections import OrderedDict
+
+from PyQt5 import QtCore, QtGui
+Qt = QtCore.Qt
+
+import globals
+
+#################################
+
+
+# Size of an area, in tiles
+MapWidth = 1024
+MapHeight = 512
+
+# Size of a pre-rendered chunk, in tiles
+ChunkSize = 16
+ChunksX = MapWidth // ChunkSize
+ChunksY = MapHeight // ChunkSize
+
+# Largest level-of-detail reduction used for chunks (1 / 2 ** MaxChunkLOD)
+MaxChunkLOD = 4
+
+# Special cell values
+TILE_EMPTY = -1
+TILE_UNKNOWN = -2
+
+# Tiles drawn for objects whose data value turns them into item blocks
+ItemTiles = {1: 26, 2: 27, 3: 16, 4: 17, 5: 18, 6: 19,
+             7: 20, 8: 21, 9: 22, 10: 25, 11: 23, 12: 24,
+             14: 32, 15: 33, 16: 34, 17: 35, 18: 42, 19: 36,
+             20: 37, 21: 38, 22: 41, 23: 39, 24: 40}
+
+
+class LayerTileMap:
+    """
+    Grid of the tile drawn in every cell of an object layer.
+    Objects mark the cells they cover as outdated when they change,
+    and those cells are rebuilt the next time they are needed.
+    """
+    MaxDirtyRects = 64
+
+    def __init__(self):
+        """
+        Creates an empty tilemap that needs a full rebuild
+        """
+        self.tiles = array('h', [TILE_EMPTY]) * (MapWidth * MapHeight)
+        self.dirty = [(0, 0, MapWidth, MapHeight)]
+        self.chunkVersions = array('I', [0]) * (ChunksX * ChunksY)
+
+    def invalidate(self, x, y, width, height):
+        """
+        Marks a rect of cells as outdated
+        """
+        x1 = max(x, 0)
+        y1 = max(y, 0)
+        x2 = min(x + width, MapWidth)
+        y2 = min(y + height, MapHeight)
+
+        if x1 >= x2 or y1 >= y2:
+            return
+
+        dirty = self.dirty
+        for dx1, dy1, dx2, dy2 in dirty:
+            if dx1 <= x1 and dy1 <= y1 and dx2 >= x2 and dy2 >= y2:
+                return
+
+        if len(dirty) >= self.MaxDirtyRects:
+            # Too many separate rects, collapse them into a single one
+            for dx1, dy1, dx2, dy2 in dirty:
+                x1 = min(x1, dx1)
+                y1 = min(y1, dy1)
+                x2 = max(x2, dx2)
+                y2 = max(y2, dy2)
+
+            del dirty[:]
+
+        dirty.append((x1, y1, x2, y2))
+
+    def invalidateAll(self):
+        """
+        Marks every cell as outdated
+        """
+        self.dirty = [(0, 0, MapWidth, MapHeight)]
+
+    def flush(self, objects):
+        """
+        Rebuilds the outdated cells from the objects of the layer,
+        in the order they are drawn
+        """
+        dirty = self.dirty
+        if not dirty:
+            return
+
+        self.dirty = []
+
+        tiles = self.tiles
+        chunkVersions = self.chunkVersions
+        for x1, y1, x2, y2 in dirty:
+            empty = array('h', [TILE_EMPTY]) * (x2 - x1)
+            for y in range(y1, y2):
+                tiles[y * MapWidth + x1:y * MapWidth + x2] = empty
+
+            for cy in range(y1 // ChunkSize, (y2 - 1) // ChunkSize + 1):
+                for cx in range(x1 // ChunkSize, (x2 - 1) // ChunkSize + 1):
+                    chunkVersions[cy * ChunksX + cx] += 1
+
+        for obj in objects:
+            ox1 = obj.objx
+            oy1 = obj.objy
+            ox2 = ox1 + obj.width
+            oy2 = oy1 + obj.height
+
+            for x1, y1, x2, y2 in dirty:
+                if ox1 < x2 and ox2 > x1 and oy1 < y2 and oy2 > y1:
+                    self.writeObject(obj, max(ox1, x1), max(oy1, y1), min(ox2, x2), min(oy2, y2))
+
+    def writeObject(self, obj, x1, y1, x2, y2):
+        """
+        Writes the tiles of an object that fall inside a rect
+        """
+        objdata = obj.objdata
+        if not objdata:
+            return
+
+        objectDefinitions = globals.ObjectDefinitions
+
+        exists = True
+        try:
+            if objectDefinitions[obj.tileset] is None:
+                exists = False
+            elif objectDefinitions[obj.tileset][obj.type] is None:
+                exists = False
+        except (IndexError, TypeError):
+            exists = False
+
+        itemTile = ItemTiles.get(obj.data)
+        if itemTile is not None:
+            itemTile += 0x800
+
+        tiles = self.tiles
+        objx = obj.objx
+        objy = obj.objy
+
+        for y in range(y1, min(y2, objy + len(objdata))):
+            row = objdata[y - objy]
+            pos = y * MapWidth
+
+            for x in range(x1, min(x2, objx + len(row))):
+                tile = row[x - objx]
+                if tile > 0:
+                    tiles[pos + x] = tile if itemTile is None else itemTile
+
+                elif not exists:
+                    tiles[pos + x] = TILE_UNKNOWN
+
+    def row(self, y, x1, x2):
+        """
+        Returns the cells of a row between x1 and x2
+        """
+        pos = y * MapWidth
+        return self.tiles[pos + x1:pos + x2]
+
+
+class TileChunk:
+    """
+    A rendered chunk of a tilemap.
+    While tilesets are animating, animated tiles are left out of the
+    pixmap and listed in animCells as (x, y, tile), so the chunk stays
+    valid across animation frames and they are drawn on top of it.
+    """
+    __slots__ = ('pixmap', 'version', 'state', 'animCells', 'size')
+
+    def __init__(self, pixmap, version, state, animCells):
+        self.pixmap = pixmap
+        self.version = version
+        self.state = state
+        self.animCells = animCells
+        self.size = 0 if pixmap is None else pixmap.width() * pixmap.height() * 4
+
+
+class TileChunkCache:
+    """
+    LRU cache of pre-rendered ChunkSize x ChunkSize tile chunks, so the
+    level canvas is drawn with one drawPixmap call per chunk
+    """
+
+    def __init__(self, budget):
+        """
+        budget: maximum amount of memory used by the chunk pixmaps, in MB
+        """
+        self.budget = budget * 1024 * 1024
+        self.used = 0
+        self.chunks = OrderedDict()
+
+        # (tilemap, cx, cy) -> (version, layer, animCells) of every chunk
+        # that had animated tiles when it was last rendered
+        self.animated = {}
+
+    def setBudget(self, budget):
+        """
+        Changes the memory budget, in MB
+        """
+        self.budget = budget * 1024 * 1024
+        self.evict()
+
+    def clear(self):
+        """
+        Frees all the rendered chunks
+        """
+        self.chunks.clear()
+        self.animated.clear()
+        self.used = 0
+
+    def evict(self):
+        """
+        Frees the least recently used chunks until the budget is respected
+        """
+        chunks = self.chunks
+        while self.used > self.budget and chunks:
+            _, chunk = chunks.popitem(False)
+            self.used -= chunk.size
+
+    def get(self, tilemap, idx, cx, cy, lod):
+        """
+        Returns a chunk, rendering it if needed
+        """
+        key = (tilemap, cx, cy, lod)
+        version = tilemap.chunkVersions[cy * ChunksX + cx]
+        state = (globals.TilesetsAnimating, globals.CollisionsShown)
+
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            if chunk.version == version and chunk.state == state:
+                self.chunks.move_to_end(key)
+                return chunk
+
+            del self.chunks[key]
+            self.used -= chunk.size
+
+        chunk = self.render(tilemap, idx, cx, cy, lod, version, state)
+        self.chunks[key] = chunk
+        self.used += chunk.size
+        self.evict()
+
+        if chunk.animCells:
+            self.animated[(tilemap, cx, cy)] = (version, idx, chunk.animCells)
+        else:
+            self.animated.pop((tilemap, cx, cy), None)
+
+        return chunk
+
+    def animatedRects(self, tilemaps, shown, rect):
+        """
+        Returns the scene rects of the chunks intersecting rect
+        whose animated tiles are visible
+        """
+        tileWidth = globals.TileWidth
+        chunkWidth = ChunkSize * tileWidth
+        rects = []
+
+        for (tilemap, cx, cy), (version, idx, cells) in self.animated.items():
+            if not shown[idx] or tilemaps[idx] is not tilemap:
+                continue
+
+            if tilemap.chunkVersions[cy * ChunksX + cx] != version:
+                continue
+
+            if not rect.intersects(QtCore.QRectF(cx * chunkWidth, cy * chunkWidth, chunkWidth, chunkWidth)):
+                continue
+
+            # Only the part of the chunk covered by animated tiles
+            x1 = min(cell[0] for cell in cells)
+            y1 = min(cell[1] for cell in cells)
+            x2 = max(cell[0] for cell in cells) + 1
+            y2 = max(cell[1] for cell in cells) + 1
+
+            rects.append(QtCore.QRectF(x1 * tileWidth, y1 * tileWidth,
+                                       (x2 - x1) * tileWidth, (y2 - y1) * tileWidth))
+
+        return rects
+
+    def render(self, tilemap, idx, cx, cy, lod, version, state):
+        """
+        Renders a chunk of a tilemap at a level of detail
+        """
+        x1 = cx * ChunkSize
+        y1 = cy * ChunkSize
+        rows = [tilemap.row(y, x1, x1 + ChunkSize) for y in range(y1, y1 + ChunkSize)]
+
+        if all(row.count(TILE_EMPTY) == ChunkSize for row in rows):
+            return TileChunk(None, version, state, ())
+
+        tiles = globals.Tiles
+        tileWidth = globals.TileWidth
+        onLayer1 = idx == 1
+        animating = state[0]
+        animCells = []
+
+        size = (ChunkSize * tileWidth) >> lod
+        pixmap = QtGui.QPixmap(size, size)
+        pixmap.fill(Qt.transparent)
+
+        painter = QtGui.QPainter(pixmap)
+        if lod:
+            painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+            painter.scale(1 / (1 << lod), 1 / (1 << lod))
+
+        drawPixmap = painter.drawPixmap
+        desty = 0
+        for y, row in enumerate(rows, y1):
+            destx = 0
+            for x, tile in enumerate(row, x1):
+                if tile == TILE_UNKNOWN:
+                    # Draw unknown tiles
+                    drawPixmap(destx, desty, tiles[0x800].getCurrentTile())
+                elif tile != TILE_EMPTY:
+                    tileObj = tiles[tile]
+                    if animating and tileObj.isAnimated:
+                        animCells.append((x, y, tile))
+                    else:
+                        drawPixmap(destx, desty, tileObj.getCurrentTile(onLayer1))
+
+                destx += tileWidth
+            desty += tileWidth
+
+        painter.end()
+
+        return TileChunk(pixmap, version, state, tuple(animCells))
+
+
+def ChunkLOD(scale):
+    """
+    Returns the level of detail chunks should be rendered at for a view scale
+    """
+    lod = 0
+    while lod < MaxChunkLOD and scale <= 1 / (2 << lod):
+        lod += 1
+
+    return lod
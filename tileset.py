@@ -27,11 +27,13 @@
 
 ############ Imports ############
 
+from array import array
 import json
 import os
 import platform
 import struct
 import subprocess
+import tempfile
 import zlib
 
 from PyQt5 import QtCore, QtGui, QtWidgets
@@ -52,6 +54,29 @@ if globals.cython_available:
 #################################
 
 
+class AtlasTile:
+    """
+    A 60x60 tile of a decoded tileset texture that has not been turned into
+    a pixmap yet. Only the tiles that get drawn are ever copied out of the texture.
+    """
+    __slots__ = ('atlas', 'x', 'y')
+
+    def __init__(self, atlas, x, y):
+        """
+        atlas: QImage of the whole texture
+        x, y: top left corner of the tile in the texture
+        """
+        self.atlas = atlas
+        self.x = x
+        self.y = y
+
+    def pixmap(self):
+        """
+        Returns the tile as a QPixmap
+        """
+        return QtGui.QPixmap.fromImage(self.atlas.copy(self.x, self.y, 60, 60))
+
+
 class TilesetTile:
     """
     Class that represents a single tile in a tileset
@@ -62,6 +87,7 @@ class TilesetTile:
     def __init__(self, main=None, nml=None):
         """
         Initializes the TilesetTile
+        main and nml can also be AtlasTiles, which are turned into pixmaps when first used
         """
         if not main:
             main = QtGui.QPixmap(60, 60)
@@ -81,6 +107,28 @@ class TilesetTile:
         self.setCollisions(0)
         self.collOverlay = None
 
+    @property
+    def main(self):
+        if isinstance(self._main, AtlasTile):
+            self._main = self._main.pixmap()
+
+        return self._main
+
+    @main.setter
+    def main(self, main):
+        self._main = main
+
+    @property
+    def nml(self):
+        if isinstance(self._nml, AtlasTile):
+            self._nml = self._nml.pixmap()
+
+        return self._nml
+
+    @nml.setter
+    def nml(self, nml):
+        self._nml = nml
+
     def imgWithCollisions(self, img):
         """
         Return a copy of "img" with self.collOverlay applied.
@@ -113,6 +161,7 @@ class TilesetTile:
 
         self.animTiles = animTiles
         self.isAnimated = True
+        globals.AnimatedTiles = None
 
     def addConveyorAnimationData(self, data, x, reverse=False):
         """
@@ -130,6 +179,7 @@ class TilesetTile:
 
         self.animTiles = animTiles
         self.isAnimated = True
+        globals.AnimatedTiles = None
 
     def nextFrame(self):
         """
@@ -1100,6 +1150,7 @@ def HandleTilesetEdited(soft=False):
         globals.TilesetEdited = True
 
     mainWindow = globals.mainWindow
+    mainWindow.scene.chunkCache.clear()
     mainWindow.objPicker.clearSelection()
     mainWindow.objPicker.LoadFromTilesets()
     mainWindow.updateNumUsedTilesLabel()
@@ -1211,177 +1262,166 @@ def DeleteObject(idx, objNum, soft=False):
             globals.mainWindow.clipboard = globals.mainWindow.encodeObjects(objects, sprites)
 
 
-def _compressBC3_nvcompress(tex, tile_path, nml):
+def _compressBC3_nvcompress(tex, nml):
     """
-    RGBA8 QPixmap -> BC3 DDS
-    Uses `nvcompress`
+    RGBA8 QImage -> BC3 data of every mipmap level
+    Uses `nvcompress`, in a temporary folder of its own
     """
-    if platform.system() == 'Darwin':
-        raise NotImplementedError("MacOSX is not supported yet!")
+    if platform.system() == 'Windows':
+        tile_path = globals.miyamoto_path + '/Tools'
+
+    elif platform.system() == 'Linux':
+        tile_path = globals.miyamoto_path + '/linuxTools'
 
-    tex.save(tile_path + '/tmp.png')
+    else:
+        raise NotImplementedError("MacOSX is not supported yet!")
 
-    os.chdir(tile_path)
+    with tempfile.TemporaryDirectory(dir=tile_path) as tmp_path:
+        tex.save(tmp_path + '/tmp.png')
 
-    if platform.system() == 'Windows':
-        if nml:
-            os.system('nvcompress.exe -normal -alpha -mipfilter box -bc3 tmp.png tmp.dds')
+        if platform.system() == 'Windows':
+            subprocess.call([tile_path + '/nvcompress.exe', '-normal' if nml else '-color',
+                             '-alpha', '-mipfilter', 'box', '-bc3', 'tmp.png', 'tmp.dds'], cwd=tmp_path)
 
         else:
-            os.system('nvcompress.exe -color -alpha -mipfilter box -bc3 tmp.png tmp.dds')
+            os.chmod(tile_path + '/nvcompress.elf', 0o755)
+            subprocess.call([tile_path + '/nvcompress.elf', '-bc3', 'tmp.png', 'tmp.dds'], cwd=tmp_path)
 
-    else:
-        os.system('chmod +x nvcompress.elf')
-        os.system('./nvcompress.elf -bc3 tmp.png tmp.dds')
+        if not os.path.isfile(tmp_path + '/tmp.dds'):
+            raise RuntimeError("nvcompress failed to compress the texture")
+
+        width, height, _, _, _, _, numMips, data = dds.readDDS(tmp_path + '/tmp.dds')
 
-    os.chdir(globals.miyamoto_path)
+    mipmaps = []
+    for mipLevel in range(numMips + 1):
+        offset, size = gtx.getCurrentMipOffset_Size(width, height, 4, 4, 16, mipLevel)
+        mipmaps.append(data[offset:offset + size])
 
-    os.remove(tile_path + '/tmp.png')
+    return mipmaps
 
 
-def _compressBC3_libtxc_dxtn(tex, tile_path):
+def _compressBC3(tex, quality=None):
     """
-    RGBA8 QPixmap -> BC3 DDS
+    RGBA8 QImage -> BC3 data of every mipmap level
     Uses our port of `libtxc_dxtn` (or Wexos's Compressor if Cython is not available)
     """
-    data = tex.bits()
-    data.setsize(tex.byteCount())
-    data = data.asstring()
+    if quality is None:
+        quality = globals.BC3Quality
 
-    dataList = []
-    dataList.append(bc3.compress(data, 2048, 512))
+    if tex.format() != QtGui.QImage.Format_RGBA8888:
+        tex = tex.convertToFormat(QtGui.QImage.Format_RGBA8888)
 
-    for i in range(1, 12):
-        mipTex = QtGui.QImage(tex).scaledToWidth(max(1, 2048 >> i), Qt.SmoothTransformation)
-        mipTex = mipTex.convertToFormat(QtGui.QImage.Format_RGBA8888)
+    width = tex.width()
+    height = tex.height()
 
-        mipData = mipTex.bits()
-        mipData.setsize(mipTex.byteCount())
-        mipData = mipData.asstring()
+    # Build the mipmap chain in memory, each level from the one before it
+    levels = []
+    mipTex = tex
+    for i in range(12):
+        if i:
+            mipTex = mipTex.scaled(max(1, width >> i), max(1, height >> i),
+                                   Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            mipTex = mipTex.convertToFormat(QtGui.QImage.Format_RGBA8888)
 
-        dataList.append(
-            bc3.compress(mipData, max(1, 2048 >> i), max(1, 512 >> i)))
+        data = mipTex.constBits()
+        data.setsize(mipTex.byteCount())
+        levels.append((data.asstring(), mipTex.width(), mipTex.height()))
 
-    with open(tile_path + '/tmp.dds', 'wb+') as out:
-        out.write(dds.generateHeader(2048, 512, 0x33, 12))
-        for data in dataList:
-            out.write(data)
+    return bc3.compressMipmaps(levels, quality)
 
 
 def writeGTX(tex, idx, nml=False):
     """
     Generates a GTX file from a QImage
     """
-    if platform.system() == 'Windows':
-        tile_path = globals.miyamoto_path + '/Tools'
-
-    elif platform.system() == 'Linux':
-        tile_path = globals.miyamoto_path + '/linuxTools'
-
-    else:
-        tile_path = globals.miyamoto_path + '/macTools'
+    if tex.format() != QtGui.QImage.Format_RGBA8888:
+        tex = tex.convertToFormat(QtGui.QImage.Format_RGBA8888)
 
     if idx != 0 and not globals.UseRGBA8:  # Save as DXT5/BC3
-        if platform.system() == 'Darwin':
-            _compressBC3_libtxc_dxtn(tex, tile_path)
+        mipmaps = None
 
-        else:
+        # nvcompress is only preferred over our own compressor when that runs in pure Python
+        if not bc3.accelerated and platform.system() != 'Darwin':
             try:
-                _compressBC3_nvcompress(tex, tile_path, nml)
+                mipmaps = _compressBC3_nvcompress(tex, nml)
 
             except:
                 pass
 
-            if not os.path.isfile(tile_path + '/tmp.dds'):
-                _compressBC3_libtxc_dxtn(tex, tile_path)
-
-    else:  # Save as RGBA8
-        data = tex.bits()
-        data.setsize(tex.byteCount())
-        data = data.asstring()
+        if mipmaps is None:
+            mipmaps = _compressBC3(tex)
 
-        with open(tile_path + '/tmp.dds', 'wb+') as out:
-            hdr = dds.generateHeader(2048, 512, 0x1a)
-            out.write(hdr)
-            out.write(data)
+        return gtx.buildGTX(tex.width(), tex.height(), 0x33, mipmaps)
 
-    gtxdata = gtx.DDStoGTX(tile_path + '/tmp.dds')
-
-    os.remove(tile_path + '/tmp.dds')
+    # Save as RGBA8
+    data = tex.constBits()
+    data.setsize(tex.byteCount())
 
-    return gtxdata
+    return gtx.buildGTX(tex.width(), tex.height(), 0x1a, [data.asstring()])
 
 
-def PackTexture(idx, nml=False):
+def PackTileAtlas(pixmaps, columns, rows):
     """
-    Packs the tiles into a GTX file
+    Packs 60x60 tile pixmaps into an RGBA8 atlas of 64x64 cells,
+    clamping the edges of every tile into its 2-pixel gutter
     """
-    tex = QtGui.QImage(2048, 512, QtGui.QImage.Format_RGBA8888)
+    width = columns * 64
+    height = rows * 64
+
+    tex = QtGui.QImage(width, height, QtGui.QImage.Format_RGBA8888)
     tex.fill(Qt.transparent)
     painter = QtGui.QPainter(tex)
 
-    tileoffset = idx * 256
-    x = 0
-    y = 0
-
-    for z in range(tileoffset, tileoffset + 256):
-        tile = QtGui.QImage(64, 64, QtGui.QImage.Format_RGBA8888)
-        tile.fill(Qt.transparent)
-        tilePainter = QtGui.QPainter(tile)
+    for i, pixmap in enumerate(pixmaps):
+        x = i % columns * 64
+        y = i // columns * 64
 
-        tilePainter.drawPixmap(2, 2, globals.Tiles[z].nml if nml else globals.Tiles[z].main)
-        tilePainter.end()
+        painter.setClipRect(x, y, 64, 64)
+        painter.drawPixmap(x + 2, y + 2, pixmap)
 
-        for i in range(2, 62):
-            color = tile.pixel(i, 2)
-            for pix in range(0, 2):
-                tile.setPixel(i, pix, color)
-
-            color = tile.pixel(2, i)
-            for p in range(0, 2):
-                tile.setPixel(p, i, color)
-
-            color = tile.pixel(i, 61)
-            for p in range(62, 64):
-                tile.setPixel(i, p, color)
+    painter.end()
 
-            color = tile.pixel(61, i)
-            for p in range(62, 64):
-                tile.setPixel(p, i, color)
+    data = tex.constBits()
+    data.setsize(tex.byteCount())
 
-        color = tile.pixel(2, 2)
-        for a in range(0, 2):
-            for b in range(0, 2):
-                tile.setPixel(a, b, color)
+    pixels = array('I')
+    pixels.frombytes(data.asstring())
 
-        color = tile.pixel(61, 2)
-        for a in range(62, 64):
-            for b in range(0, 2):
-                tile.setPixel(a, b, color)
+    # Clamp the left and right edges, one strided column of the atlas at a time
+    for x in range(0, width, 64):
+        for dst, src in ((x, x + 2), (x + 1, x + 2), (x + 62, x + 61), (x + 63, x + 61)):
+            pixels[dst::width] = pixels[src::width]
 
-        color = tile.pixel(2, 61)
-        for a in range(0, 2):
-            for b in range(62, 64):
-                tile.setPixel(a, b, color)
+    # Clamp the top and bottom edges, one row of the atlas at a time
+    # (the clamped columns are copied along, which fills the corners)
+    for y in range(0, height, 64):
+        for dst, src in ((y, y + 2), (y + 1, y + 2), (y + 62, y + 61), (y + 63, y + 61)):
+            pixels[dst * width:(dst + 1) * width] = pixels[src * width:(src + 1) * width]
 
-        color = tile.pixel(61, 61)
-        for a in range(62, 64):
-            for b in range(62, 64):
-                tile.setPixel(a, b, color)
+    # Tiles used to be clamped in their own image, which was then drawn onto
+    # the atlas. Compositing the clamped tiles once more keeps the rounding of
+    # semi-transparent pixels, and thus the output, byte-identical.
+    tiles = QtGui.QImage(pixels.tobytes(), width, height, QtGui.QImage.Format_RGBA8888)
 
-        painter.drawImage(x, y, tile)
+    tex = QtGui.QImage(width, height, QtGui.QImage.Format_RGBA8888)
+    tex.fill(Qt.transparent)
+    painter = QtGui.QPainter(tex)
+    painter.drawImage(0, 0, tiles)
+    painter.end()
 
-        x += 64
+    return tex
 
-        if x >= 2048:
-            x = 0
-            y += 64
 
-    painter.end()
+def PackTexture(idx, nml=False):
+    """
+    Packs the tiles into a GTX file
+    """
+    tileoffset = idx * 256
+    tiles = globals.Tiles[tileoffset:tileoffset + 256]
 
-    outData = writeGTX(tex, idx, nml)
+    tex = PackTileAtlas([tile.nml if nml else tile.main for tile in tiles], 32, 8)
 
-    return outData
+    return writeGTX(tex, idx, nml)
 
 
 def SaveTileset(idx):
@@ -1489,6 +1529,7 @@ def _loadGTX_addrlib(width, height, format_, use, tileMode, swizzle_, data):
 def _loadGTX_gtx_extract(gtxdata):
     """
     Use `gtx_extract` to decode the texture
+    Every call uses its own temporary files, so it can run in several threads at once.
     """
     if platform.system() == 'Windows':
         tile_path = globals.miyamoto_path + '/Tools'
@@ -1499,31 +1540,37 @@ def _loadGTX_gtx_extract(gtxdata):
     else:
         tile_path = globals.miyamoto_path + '/macTools'
 
-    with open(tile_path + '/texture.gtx', 'wb') as binfile:
+    fd, gtx_path = tempfile.mkstemp('.gtx', 'texture_', tile_path)
+    with os.fdopen(fd, 'wb') as binfile:
         binfile.write(gtxdata)
 
-    os.chdir(tile_path)
+    gtx_name = os.path.basename(gtx_path)
+    bmp_path = gtx_path[:-4] + '.bmp'
 
-    if platform.system() == 'Windows':
-        # https://stackoverflow.com/a/7006424/4797683
-        DETACHED_PROCESS = 0x00000008
-        subprocess.call('gtx_extract_bmp.exe texture.gtx', creationflags=DETACHED_PROCESS)
+    try:
+        if platform.system() == 'Windows':
+            # https://stackoverflow.com/a/7006424/4797683
+            DETACHED_PROCESS = 0x00000008
+            subprocess.call([tile_path + '/gtx_extract_bmp.exe', gtx_name], cwd=tile_path, creationflags=DETACHED_PROCESS)
 
-    elif platform.system() == 'Linux':
-        os.system('chmod +x ./gtx_extract.elf')
-        os.system('./gtx_extract.elf texture.gtx texture.bmp')
+        elif platform.system() == 'Linux':
+            os.chmod(tile_path + '/gtx_extract.elf', 0o755)
+            subprocess.call([tile_path + '/gtx_extract.elf', gtx_name, os.path.basename(bmp_path)], cwd=tile_path)
 
-    else:
-        os.system('chmod +x ./gtx_extract_bmp')
-        os.system('./gtx_extract_bmp texture.gtx')
+        else:
+            os.chmod(tile_path + '/gtx_extract_bmp', 0o755)
+            subprocess.call([tile_path + '/gtx_extract_bmp', gtx_name], cwd=tile_path)
 
-    os.chdir(globals.miyamoto_path)
+        if not os.path.isfile(bmp_path):
+            raise RuntimeError("gtx_extract failed to decode the texture")
 
-    # Return as a QImage
-    img = QtGui.QImage(tile_path + '/texture.bmp')
+        # Return as a QImage
+        img = QtGui.QImage(bmp_path)
 
-    os.remove(tile_path + '/texture.bmp')
-    os.remove(tile_path + '/texture.gtx')
+    finally:
+        os.remove(gtx_path)
+        if os.path.isfile(bmp_path):
+            os.remove(bmp_path)
 
     return img
 
@@ -1625,15 +1672,56 @@ def SortTilesetNames_Category(cat):
     return tuple(new)
 
 
+def AnimatedTiles():
+    """
+    Returns the (index, tile) pairs of the animated tiles in globals.Tiles
+    """
+    tiles = globals.Tiles
+    animated = globals.AnimatedTiles
+
+    if animated is not None:
+        # Tiles may have been replaced since the list was built
+        count = len(tiles)
+        for i, tile in animated:
+            if i >= count or tiles[i] is not tile:
+                animated = None
+                break
+
+    if animated is None:
+        animated = [(i, tile) for i, tile in enumerate(tiles) if tile is not None and tile.isAnimated]
+        globals.AnimatedTiles = animated
+
+    return animated
+
+
 def IncrementTilesetFrame():
     """
     Moves each tileset to the next frame
     """
     if not globals.TilesetsAnimating: return
-    for tile in globals.Tiles:
-        if tile is not None: tile.nextFrame()
-    globals.mainWindow.scene.update()
-    globals.mainWindow.objPicker.update()
+    animated = AnimatedTiles()
+    for _, tile in animated:
+        tile.nextFrame()
+    globals.TilesetAnimFrame += 1
+
+    if not animated:
+        return
+
+    mainWindow = globals.mainWindow
+    mainWindow.objPicker.UpdateAnimatedTiles()
+
+    area = globals.Area
+    if not hasattr(area, 'tilemaps'):
+        return
+
+    # Only repaint the visible parts of the level that have animated tiles
+    view = mainWindow.view
+    scene = mainWindow.scene
+    visible = view.mapToScene(view.viewport().rect()).boundingRect()
+    shown = (globals.Layer0Shown, globals.Layer1Shown, globals.Layer2Shown)
+
+    for rect in scene.chunkCache.animatedRects(area.tilemaps, shown, visible):
+        scene.update(rect)
 
 
 def UnloadTileset(idx):
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# tilesetcache.py
+# Persistent on-disk cache of decoded tilesets
+
+
+################################################################
+################################################################
+
+############ Imports ############
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import struct
+import tempfile
+
+from PyQt5 import QtGui
+
+import globals
+
+#################################
+
+
+CacheVersion = 1
+CacheMagic = b'MTSC'
+
+CacheHeader = struct.Struct('<4sII')
+CacheEntryHeader = struct.Struct('<HIII')
+
+# Entries are written on their own thread, so opening a level never waits for them
+CacheWriter = ThreadPoolExecutor(max_workers=1)
+
+
+def CacheFolder():
+    """
+    Returns the folder decoded tilesets are cached in
+    """
+    return os.path.join(globals.miyamoto_path, 'cache', 'tilesets')
+
+
+def TilesetCacheKey(idx, name, sarcdata):
+    """
+    Returns the cache key of a tileset archive.
+    Slot 0 tilesets also hold the animation textures, so the slot type is part of the key.
+    """
+    h = hashlib.sha1()
+    h.update(b'%d:%d:%s\0' % (CacheVersion, idx == 0, name.encode('utf-8')))
+    h.update(sarcdata)
+
+    return h.hexdigest()
+
+
+def _imageToRGBA8(img):
+    """
+    Returns the pixels of a QImage as RGBA8 bytes
+    """
+    if img.format() != QtGui.QImage.Format_RGBA8888:
+        img = img.convertToFormat(QtGui.QImage.Format_RGBA8888)
+
+    data = img.constBits()
+    data.setsize(img.byteCount())
+
+    return img.width(), img.height(), data.asstring()
+
+
+def LoadCachedTileset(key):
+    """
+    Loads a decoded tileset from the cache.
+    Returns (files, img, nml, anime), or None on a miss.
+    Safe to run in a worker thread.
+    """
+    if not globals.TilesetCacheSize:
+        return None
+
+    path = os.path.join(CacheFolder(), key + '.bin')
+
+    try:
+        with open(path, 'rb') as inf:
+            magic, version, count = CacheHeader.unpack(inf.read(CacheHeader.size))
+            if magic != CacheMagic or version != CacheVersion:
+                return None
+
+            entries = {}
+            for _ in range(count):
+                nameLen, width, height, size = CacheEntryHeader.unpack(inf.read(CacheEntryHeader.size))
+                name = inf.read(nameLen).decode('utf-8')
+
+                if width:
+                    # Read the pixels straight into the image's own buffer
+                    img = QtGui.QImage(width, height, QtGui.QImage.Format_RGBA8888)
+                    if img.byteCount() != size:
+                        return None
+
+                    bits = img.bits()
+                    bits.setsize(size)
+                    if inf.readinto(memoryview(bits)) != size:
+                        return None
+
+                    entries[name] = img
+
+                else:
+                    data = inf.read(size)
+                    if len(data) != size:
+                        return None
+
+                    entries[name] = data
+
+        # Mark the entry as recently used
+        os.utime(path)
+
+    except (OSError, ValueError, struct.error):
+        return None
+
+    try:
+        files = {
+            'chk': entries.pop('chk'),
+            'hd': entries.pop('hd'),
+            'unt': entries.pop('unt'),
+            'anime': {},
+        }
+
+        img = entries.pop('tex')
+        nml = entries.pop('nml')
+
+    except KeyError:
+        return None
+
+    return files, img, nml, entries
+
+
+def StoreCachedTileset(key, files, img, nml, anime):
+    """
+    Stores a decoded tileset in the cache, then trims the cache to its size limit.
+    Safe to run in a worker thread.
+    """
+    if not globals.TilesetCacheSize:
+        return
+
+    entries = [
+        ('tex', ) + _imageToRGBA8(img),
+        ('nml', ) + _imageToRGBA8(nml),
+        ('chk', 0, 0, files['chk']),
+        ('hd', 0, 0, files['hd']),
+        ('unt', 0, 0, files['unt']),
+    ]
+
+    for animName, animImg in anime.items():
+        entries.append((animName, ) + _imageToRGBA8(animImg))
+
+    folder = CacheFolder()
+
+    try:
+        os.makedirs(folder, exist_ok=True)
+
+        # Write to a temporary file first, so a partial entry is never read
+        fd, tmp_path = tempfile.mkstemp('.tmp', key, folder)
+        with os.fdopen(fd, 'wb') as out:
+            out.write(CacheHeader.pack(CacheMagic, CacheVersion, len(entries)))
+            for name, width, height, data in entries:
+                name = name.encode('utf-8')
+                out.write(CacheEntryHeader.pack(len(name), width, height, len(data)))
+                out.write(name)
+                out.write(data)
+
+        os.replace(tmp_path, os.path.join(folder, key + '.bin'))
+
+    except OSError:
+        return
+
+    TrimTilesetCache()
+
+
+def StoreCachedTilesetLater(key, files, img, nml, anime):
+    """
+    Stores a decoded tileset in the cache on the cache writer thread, see StoreCachedTileset()
+    """
+    if not globals.TilesetCacheSize:
+        return
+
+    # Hand over copies, so the editor can change its images while they are written
+    anime = {animName: QtGui.QImage(animImg) for animName, animImg in anime.items()}
+    CacheWriter.submit(StoreCachedTileset, key, files, QtGui.QImage(img), QtGui.QImage(nml), anime)
+
+
+def TrimTilesetCache():
+    """
+    Deletes the least recently used entries until the cache fits in its size limit
+    """
+    folder = CacheFolder()
+    limit = globals.TilesetCacheSize * 1024 * 1024
+
+    try:
+        entries = []
+        for entry in os.scandir(folder):
+            if entry.name.endswith('.bin'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    except OSError:
+        return
+
+    total = sum(size for _, size, _ in entries)
+    entries.sort()
+
+    for _, size, path in entries:
+        if total <= limit:
+            break
+
+        try:
+            os.remove(path)
+
+        except OSError:
+            continue
+
+        total -= size
@@ -38,6 +38,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 Qt = QtCore.Qt
 
 import globals
+import loadprofile
 
 from items import ObjectItem, ZoneItem, LocationItem, SpriteItem
 from items import EntranceItem, PathItem, NabbitPathItem
@@ -1577,6 +1578,13 @@ class ObjectPickerWidget(QtWidgets.QListView):
         self.m0.LoadFromTileset(0)
         self.objTS123Tab.LoadFromTilesets()
 
+    def UpdateAnimatedTiles(self):
+        """
+        Repaints the shown object previews that use animated tiles
+        """
+        if self.isVisible():
+            self.model().UpdateAnimatedPreviews(self)
+
     def ShowTileset(self, id):
         """
         Shows a specific tileset in the picker
@@ -1876,6 +1884,7 @@ class ObjectPickerWidget(QtWidgets.QListView):
             self.items = []
             self.ritems = []
             self.itemsize = []
+            self.animated = []
 
             for i in range(256):
                 self.items.append(None)
@@ -1918,6 +1927,7 @@ class ObjectPickerWidget(QtWidgets.QListView):
             self.ritems = []
             self.itemsize = []
             self.tooltips = []
+            self.animated = []
 
             self.beginResetModel()
 
@@ -1944,34 +1954,9 @@ class ObjectPickerWidget(QtWidgets.QListView):
                     obj = RenderObject(idx, i, defs[i].width, defs[i].height, True)
                     self.items.append(obj)
 
-                    pm = QtGui.QPixmap(defs[i].width * globals.TileWidth, defs[i].height * globals.TileWidth)
-                    pm.fill(Qt.transparent)
-                    p = QtGui.QPainter()
-                    p.begin(pm)
-                    y = 0
-                    isAnim = False
-
-                    for row in obj:
-                        x = 0
-                        for tile in row:
-                            if tile != -1:
-                                try:
-                                    if isinstance(globals.Tiles[tile].main, QtGui.QImage):
-                                        p.drawImage(x, y, globals.Tiles[tile].main)
-                                    else:
-                                        p.drawPixmap(x, y, globals.Tiles[tile].main)
-                                except AttributeError:
-                                    break
-                                if isinstance(globals.Tiles[tile], TilesetTile) and globals.Tiles[tile].isAnimated: isAnim = True
-                            x += globals.TileWidth
-                        y += globals.TileWidth
-                    p.end()
-
-                    pm = pm.scaledToWidth(round(pm.width() * 32 / globals.TileWidth), Qt.SmoothTransformation)
-                    if pm.width() > 256:
-                        pm = pm.scaledToWidth(256, Qt.SmoothTransformation)
-                    if pm.height() > 256:
-                        pm = pm.scaledToHeight(256, Qt.SmoothTransformation)
+                    pm, isAnim = self.RenderPreview(obj, defs[i].width, defs[i].height)
+                    if isAnim:
+                        self.animated.append(len(self.ritems))
 
                     self.ritems.append(pm)
                     self.itemsize.append(QtCore.QSize(pm.width() + 4, pm.height() + 4))
@@ -1990,6 +1975,65 @@ class ObjectPickerWidget(QtWidgets.QListView):
 
             self.endResetModel()
 
+        @staticmethod
+        def RenderPreview(obj, width, height):
+            """
+            Renders the preview of a rendered object.
+            Returns (pixmap, True if it uses animated tiles).
+            """
+            pm = QtGui.QPixmap(width * globals.TileWidth, height * globals.TileWidth)
+            pm.fill(Qt.transparent)
+            p = QtGui.QPainter()
+            p.begin(pm)
+            y = 0
+            isAnim = False
+
+            for row in obj:
+                x = 0
+                for tile in row:
+                    if tile != -1:
+                        tileObj = globals.Tiles[tile]
+                        try:
+                            main = tileObj.main
+                        except AttributeError:
+                            break
+
+                        if isinstance(tileObj, TilesetTile) and tileObj.isAnimated:
+                            isAnim = True
+                            if globals.TilesetsAnimating:
+                                main = tileObj.animTiles[tileObj.animFrame]
+
+                        if isinstance(main, QtGui.QImage):
+                            p.drawImage(x, y, main)
+                        else:
+                            p.drawPixmap(x, y, main)
+                    x += globals.TileWidth
+                y += globals.TileWidth
+            p.end()
+
+            pm = pm.scaledToWidth(round(pm.width() * 32 / globals.TileWidth), Qt.SmoothTransformation)
+            if pm.width() > 256:
+                pm = pm.scaledToWidth(256, Qt.SmoothTransformation)
+            if pm.height() > 256:
+                pm = pm.scaledToHeight(256, Qt.SmoothTransformation)
+
+            return pm, isAnim
+
+        def UpdateAnimatedPreviews(self, view):
+            """
+            Re-renders the previews with animated tiles that are visible in
+            a view, and invalidates only their items
+            """
+            visible = view.viewport().rect()
+            for n in self.animated:
+                index = self.index(n)
+                if not view.visualRect(index).intersects(visible):
+                    continue
+
+                obj = self.items[n]
+                self.ritems[n] = self.RenderPreview(obj, len(obj[0]), len(obj))[0]
+                self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
         def LoadFromFolder(self):
             """
             Renders all the object previews for the model from a folder
@@ -2002,6 +2046,7 @@ class ObjectPickerWidget(QtWidgets.QListView):
             self.ritems = []
             self.itemsize = []
             self.tooltips = []
+            self.animated = []
 
             self.beginResetModel()
 
@@ -5840,3 +5885,93 @@ class IconsOnlyTabBar(QtWidgets.QTabBar):
             res.setWidth(res.height() * 2)
 
         return res
+
+
+class LoadProfileWidget(QtWidgets.QWidget):
+    """
+    Widget that shows the timings of the last level load
+    """
+
+    def __init__(self):
+        """
+        Creates and initializes the widget
+        """
+        super().__init__()
+
+        self.enabledCheck = QtWidgets.QCheckBox(globals.trans.string('LoadProfile', 0))
+        self.enabledCheck.setChecked(loadprofile.Enabled)
+        self.enabledCheck.toggled.connect(self.HandleEnabledToggled)
+
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setColumnCount(3)
+        self.tree.setHeaderLabels([globals.trans.string('LoadProfile', 1),
+                                   globals.trans.string('LoadProfile', 2),
+                                   globals.trans.string('LoadProfile', 3)])
+
+        self.exportButton = QtWidgets.QPushButton(globals.trans.string('LoadProfile', 4))
+        self.exportButton.clicked.connect(self.HandleExport)
+        self.exportButton.setEnabled(False)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(self.enabledCheck)
+        layout.addWidget(self.tree)
+        layout.addWidget(self.exportButton)
+        self.setLayout(layout)
+
+    def HandleEnabledToggled(self, checked):
+        """
+        Handles the recording checkbox being toggled
+        """
+        loadprofile.Enabled = checked
+        setSetting('LoadProfiling', checked)
+
+    def Refresh(self):
+        """
+        Shows the events of the last level load
+        """
+        self.tree.clear()
+
+        def addItem(parent, event, children):
+            args = dict(event['args'])
+            blocks = args.pop('blocks', 0)
+
+            name = event['name']
+            if args:
+                name += ' (%s)' % ', '.join('%s: %s' % item for item in args.items())
+
+            item = QtWidgets.QTreeWidgetItem(parent, [name, '%.2f' % (event['dur'] / 1000), str(blocks)])
+            item.setTextAlignment(1, Qt.AlignRight)
+            item.setTextAlignment(2, Qt.AlignRight)
+
+            for child in children:
+                addItem(item, *child)
+
+        for i, (tid, roots) in enumerate(loadprofile.EventTree()):
+            if i == 0:
+                name = globals.trans.string('LoadProfile', 6)
+            else:
+                name = globals.trans.string('LoadProfile', 7, '[num]', i)
+
+            threadItem = QtWidgets.QTreeWidgetItem(self.tree, [name])
+            for root in roots:
+                addItem(threadItem, *root)
+
+            # Only expand the main thread, worker threads have many short phases
+            if i == 0:
+                threadItem.setExpanded(True)
+                for j in range(threadItem.childCount()):
+                    threadItem.child(j).setExpanded(True)
+
+        self.tree.resizeColumnToContents(0)
+        self.exportButton.setEnabled(bool(loadprofile.Events))
+
+    def HandleExport(self):
+        """
+        Exports the events of the last level load as a Chrome trace
+        """
+        fn = QtWidgets.QFileDialog.getSaveFileName(self, globals.trans.string('LoadProfile', 4), 'trace.json',
+                                                   globals.trans.string('LoadProfile', 5) + ' (*.json)')[0]
+        if not fn:
+            return
+
+        loadprofile.ExportChromeTrace(fn)
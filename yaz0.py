@@ -28,9 +28,7 @@
 ################################################################
 ################################################################
 
-import os
-import platform
-import subprocess
+import struct
 
 import globals
 
@@ -45,87 +43,217 @@ if globals.cython_available:
     else:
         globals.libyaz0_available = True
 
+    try:
+        import yaz0_cy
+
+    except:
+        yaz0_cy = None
+
+else:
+    yaz0_cy = None
+
+
+YAZ0_HEADER = struct.Struct('>4sI4x4x')
+
 
 def determineCompressionMethod():
     if globals.libyaz0_available:
         return compressLIBYAZ0, decompressLIBYAZ0
 
     else:
-        return compressWSZST, decompressWSZST
+        return compressBuiltin, decompressBuiltin
+
+
+def getSearchRange(level):
+    """
+    Returns the look-behind window used by a compression level (0-9)
+    """
+    if level <= 0:
+        return 0
+
+    return min(0x10E0 * min(level, 9) // 9 - 0xE0, 0x1000)
 
 
-def compressWSZST(inb, outf, level=9):
+def _decompress(data):
     """
-    Compress the file using WSZST
+    Pure-Python Yaz0 decompressor
     """
-    inf = os.path.join(globals.miyamoto_path, 'tmp.tmp')
-    with open(inf, "wb+") as out:
-        out.write(inb)
+    magic, size = YAZ0_HEADER.unpack_from(data, 0)
+    if magic != b'Yaz0':
+        raise ValueError("Invalid Yaz0 header!")
 
-    if os.path.isfile(outf):
-        os.remove(outf)
+    src = memoryview(data)
+    srcSize = len(src)
+    srcPos = YAZ0_HEADER.size
 
-    if platform.system() == 'Windows':
-        os.chdir(globals.miyamoto_path + '/Tools')
-        subprocess.call('wszst.exe COMPRESS "' + inf + '" --dest "' + outf + '"', creationflags=0x8)
+    dest = bytearray()
+    code = 0
+    bits = 0
 
-    elif platform.system() == 'Linux':
-        os.chdir(globals.miyamoto_path + '/linuxTools')
-        os.system('chmod +x ./wszst_linux.elf')
-        os.system('./wszst_linux.elf COMPRESS "' + inf + '" --dest "' + outf + '"')
+    while len(dest) < size and srcPos < srcSize:
+        if not bits:
+            code = src[srcPos]
+            srcPos += 1
+            bits = 8
 
-    else:
-        os.chdir(globals.miyamoto_path + '/macTools')
-        os.system('chmod +x ./wszst_mac')
-        os.system('./wszst_mac COMPRESS "' + inf + '" --dest "' + outf + '"')
+        if code & 0x80:
+            dest.append(src[srcPos])
+            srcPos += 1
 
-    os.chdir(globals.miyamoto_path)
+        else:
+            b1 = src[srcPos]
+            b2 = src[srcPos + 1]
+            srcPos += 2
 
-    if not os.path.isfile(outf):
-        return False
+            dist = ((b1 & 0xF) << 8 | b2) + 1
+            length = b1 >> 4
+            if length:
+                length += 2
+
+            else:
+                length = src[srcPos] + 0x12
+                srcPos += 1
+
+            start = len(dest) - dist
+            if start < 0:
+                raise ValueError("Invalid Yaz0 back-reference!")
 
-    return True
+            if dist >= length:
+                dest += dest[start:start + length]
 
+            else:
+                # Overlapping copy, i.e. a repeating run of the last `dist` bytes
+                chunk = dest[start:]
+                dest += (chunk * (length // dist + 1))[:length]
 
-def decompressWSZST(inb):
+        code <<= 1
+        bits -= 1
+
+    if len(dest) != size:
+        raise ValueError("Yaz0 data is incomplete!")
+
+    return bytes(dest)
+
+
+def _compress(data, level=1):
     """
-    Deompress the data using WSZST
+    Pure-Python Yaz0 compressor
+    Matches are located with `bytes.rfind` over the look-behind window,
+    so the inner search runs at C speed.
     """
-    inf = os.path.join(globals.miyamoto_path, 'tmp.tmp')
-    outf = os.path.join(globals.miyamoto_path, 'tmp2.tmp')
+    data = bytes(data)
+    size = len(data)
+    searchRange = getSearchRange(level)
 
-    with open(inf, "wb+") as out:
-        out.write(inb)
+    output = bytearray(YAZ0_HEADER.pack(b'Yaz0', size))
 
-    if os.path.isfile(outf):
-        os.remove(outf)
+    pos = 0
+    while pos < size:
+        codePos = len(output)
+        output.append(0)
+        code = 0
 
-    if platform.system() == 'Windows':
-        os.chdir(globals.miyamoto_path + '/Tools')
-        subprocess.call('wszst.exe DECOMPRESS "' + inf + '" --dest "' + outf + '"', creationflags=0x8)
+        for bit in range(8):
+            if pos >= size:
+                break
 
-    elif platform.system() == 'Linux':
-        os.chdir(globals.miyamoto_path + '/linuxTools')
-        os.system('chmod +x ./wszst_linux.elf')
-        os.system('./wszst_linux.elf DECOMPRESS "' + inf + '" --dest "' + outf + '"')
+            maxLen = min(0x111, size - pos)
+            start = max(0, pos - searchRange)
+            matchPos = -1
+            matchLen = 0
 
-    else:
-        os.chdir(globals.miyamoto_path + '/macTools')
-        os.system('chmod +x ./wszst_mac')
-        os.system('./wszst_mac DECOMPRESS "' + inf + '" --dest "' + outf + '"')
+            if searchRange and maxLen >= 3:
+                found = data.rfind(data[pos:pos + 3], start, pos + 2)
+                if found != -1:
+                    matchPos = found
+                    matchLen = 3
 
-    os.remove(inf)
-    os.chdir(globals.miyamoto_path)
+                    while True:
+                        while matchLen < maxLen and data[matchPos + matchLen] == data[pos + matchLen]:
+                            matchLen += 1
+
+                        if matchLen == maxLen:
+                            break
+
+                        found = data.rfind(data[pos:pos + matchLen + 1], start, pos + matchLen)
+                        if found == -1:
+                            break
+
+                        matchPos = found
+                        matchLen += 1
+
+            if matchLen < 3:
+                code |= 0x80 >> bit
+                output.append(data[pos])
+                pos += 1
+
+            else:
+                dist = pos - matchPos - 1
+                if matchLen < 0x12:
+                    output.append((matchLen - 2) << 4 | dist >> 8)
+                    output.append(dist & 0xFF)
+
+                else:
+                    output.append(dist >> 8)
+                    output.append(dist & 0xFF)
+                    output.append(matchLen - 0x12)
+
+                pos += matchLen
+
+        output[codePos] = code
+
+    return bytes(output)
 
-    if not os.path.isfile(outf):
-        return None
 
-    with open(outf, "rb") as inf_:
-        data = inf_.read()
+def decompressBuffer(data):
+    """
+    Decompress Yaz0 data in memory
+    """
+    if yaz0_cy is not None:
+        return yaz0_cy.decompress(bytes(data))
+
+    return _decompress(data)
+
+
+def compressBuffer(data, level=1):
+    """
+    Compress data to Yaz0 in memory
+    """
+    if yaz0_cy is not None:
+        return yaz0_cy.compress(bytes(data), level)
+
+    return _compress(data, level)
 
-    os.remove(outf)
 
-    return data
+def compressBuiltin(inb, outf, level=1):
+    """
+    Compress the file using the built-in codec
+    """
+    try:
+        data = compressBuffer(inb, level)
+
+        with open(outf, "wb+") as out:
+            out.write(data)
+
+    except:
+        return False
+
+    else:
+        return True
+
+
+def decompressBuiltin(inb):
+    """
+    Decompress the data using the built-in codec
+    """
+    try:
+        data = decompressBuffer(inb)
+
+    except:
+        return None
+
+    else:
+        return data
 
 
 def compressLIBYAZ0(inb, outf, level=1):
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+#cython: language_level=3
+# -*- coding: utf-8 -*-
+
+# Miyamoto! Level Editor - New Super Mario Bros. U Level Editor
+# Copyright (C) 2009-2021 Treeki, Tempus, angelsl, JasonP27, Kinnay,
+# MalStar1000, RoadrunnerWMC, MrRean, Grop, AboodXD, Gota7, John10v10,
+# mrbengtsson
+
+# This file is part of Miyamoto!.
+
+# Miyamoto! is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Miyamoto! is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Miyamoto!.  If not, see <http://www.gnu.org/licenses/>.
+
+# yaz0_cy.pyx
+# A Yaz0 (de)compressor in Cython
+
+
+################################################################
+################################################################
+
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
+
+
+ctypedef unsigned char u8
+ctypedef unsigned int u32
+
+
+cdef u32 getSearchRange(int level):
+    if level <= 0:
+        return 0
+
+    if level > 9:
+        level = 9
+
+    return 0x10E0 * level // 9 - 0xE0
+
+
+cpdef bytes decompress(bytes data):
+    cdef:
+        const u8 *src = data
+        u32 srcSize = len(data)
+        u32 srcPos = 16
+
+        u32 size, destPos = 0
+        u8 *dest
+
+        u8 code = 0, bits = 0, b1, b2
+        u32 dist, length, copySrc, i
+
+    if srcSize < 16 or data[:4] != b'Yaz0':
+        raise ValueError("Invalid Yaz0 header!")
+
+    size = src[4] << 24 | src[5] << 16 | src[6] << 8 | src[7]
+    dest = <u8 *>malloc(max(size, 1))
+    if dest == NULL:
+        raise MemoryError()
+
+    try:
+        while destPos < size and srcPos < srcSize:
+            if not bits:
+                code = src[srcPos]
+                srcPos += 1
+                bits = 8
+
+            if code & 0x80:
+                if srcPos >= srcSize:
+                    break
+
+                dest[destPos] = src[srcPos]
+                destPos += 1
+                srcPos += 1
+
+            else:
+                if srcPos + 1 >= srcSize:
+                    break
+
+                b1 = src[srcPos]
+                b2 = src[srcPos + 1]
+                srcPos += 2
+
+                dist = ((b1 & 0xF) << 8 | b2) + 1
+                length = b1 >> 4
+                if length:
+                    length += 2
+
+                else:
+                    if srcPos >= srcSize:
+                        break
+
+                    length = src[srcPos] + 0x12
+                    srcPos += 1
+
+                if dist > destPos:
+                    raise ValueError("Invalid Yaz0 back-reference!")
+
+                if length > size - destPos:
+                    length = size - destPos
+
+                copySrc = destPos - dist
+                for i in range(length):
+                    dest[destPos + i] = dest[copySrc + i]
+
+                destPos += length
+
+            code <<= 1
+            bits -= 1
+
+        if destPos != size:
+            raise ValueError("Yaz0 data is incomplete!")
+
+        return bytes(<u8[:size]>dest) if size else b''
+
+    finally:
+        free(dest)
+
+
+cpdef bytes compress(bytes data, int level=1):
+    cdef:
+        const u8 *src = data
+        u32 size = len(data)
+        u32 searchRange = getSearchRange(level)
+
+        # Worst case: every byte is a literal, plus one code byte per 8
+        u32 outCapacity = 16 + size + (size + 7) // 8
+        u8 *output = <u8 *>malloc(outCapacity)
+        u32 outPos = 16
+
+        u32 pos = 0, codePos, start, cand, length, maxLen
+        u32 matchPos, matchLen, dist
+        u8 code, bit
+
+    if output == NULL:
+        raise MemoryError()
+
+    memset(output, 0, 16)
+    output[0] = 0x59; output[1] = 0x61; output[2] = 0x7A; output[3] = 0x30
+    output[4] = (size >> 24) & 0xFF
+    output[5] = (size >> 16) & 0xFF
+    output[6] = (size >> 8) & 0xFF
+    output[7] = size & 0xFF
+
+    try:
+        while pos < size:
+            codePos = outPos
+            outPos += 1
+            code = 0
+
+            for bit in range(8):
+                if pos >= size:
+                    break
+
+                maxLen = min(0x111, size - pos)
+                start = pos - searchRange if pos > searchRange else 0
+                matchPos = 0
+                matchLen = 0
+
+                if searchRange and maxLen >= 3:
+                    # Walk backwards so the nearest match wins ties
+                    cand = pos
+                    while cand > start:
+                        cand -= 1
+                        if src[cand] != src[pos] or src[cand + matchLen] != src[pos + matchLen]:
+                            continue
+
+                        length = 1
+                        while length < maxLen and src[cand + length] == src[pos + length]:
+                            length += 1
+
+                        if length > matchLen:
+                            matchLen = length
+                            matchPos = cand
+
+                            if length == maxLen:
+                                break
+
+                if matchLen < 3:
+                    code |= 0x80 >> bit
+                    output[outPos] = src[pos]
+                    outPos += 1
+                    pos += 1
+
+                else:
+                    dist = pos - matchPos - 1
+                    if matchLen < 0x12:
+                        output[outPos] = (matchLen - 2) << 4 | dist >> 8
+                        output[outPos + 1] = dist & 0xFF
+                        outPos += 2
+
+                    else:
+                        output[outPos] = dist >> 8
+                        output[outPos + 1] = dist & 0xFF
+                        output[outPos + 2] = matchLen - 0x12
+                        outPos += 3
+
+                    pos += matchLen
+
+            output[codePos] = code
+
+        return bytes(<u8[:outPos]>output)
+
+    finally:
+        free(output)